@@ -0,0 +1,97 @@
+"""Token minting: three serialisations per token vs one canonical byte buffer.
+
+The old path built the canonical JSON string three times per token (payload,
+signature, and the signature again inside ``make_demo_token``) and re-encoded
+each to UTF-8. ``make_signed_token`` serialises once and reuses the bytes.
+
+    python benchmarks/bench_canonical.py [--number 20000]
+"""
+from __future__ import annotations
+
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import sys
+import timeit
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from icnp import runtime  # noqa: E402
+from icnp.runtime import make_binding_hashes, make_signed_token, new_uuid  # noqa: E402
+
+SECRET = b"bench-secret"
+
+
+def _legacy_canonical_json(obj: Any) -> str:
+    return json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+def _legacy_sign(body: Dict[str, Any]) -> str:
+    sig = hmac.new(SECRET, _legacy_canonical_json(body).encode("utf-8"), hashlib.sha256).digest()
+    return base64.b64encode(sig).decode("ascii")
+
+
+def legacy_mint(body: Dict[str, Any]) -> tuple:
+    """The mint path before canonical_json_bytes: three serialisations."""
+    payload = base64.urlsafe_b64encode(_legacy_canonical_json(body).encode("utf-8")).decode("ascii").rstrip("=")
+    token = f"demo.{payload}.{_legacy_sign(body)}"
+    return token, _legacy_sign(body)
+
+
+def token_body(n_capabilities: int = 5) -> Dict[str, Any]:
+    intent = {"action": "analyze", "goals": [{"id": "g1", "priority": "high"}]}
+    contract = {"contract_id": new_uuid(), "agreed_actions": [{"capability_id": new_uuid(), "approved": True}]}
+    capabilities = [
+        {"id": new_uuid(), "action": "analyze", "scope": "text", "confidence": 0.9} for _ in range(n_capabilities)
+    ]
+    return {
+        "token_id": new_uuid(),
+        "contract_id": contract["contract_id"],
+        "validity": {
+            "not_before": "2026-01-01T00:00:00Z",
+            "not_after": "2026-01-01T00:10:00Z",
+            "max_invocations": 1,
+        },
+        "binding": make_binding_hashes(intent, contract, capabilities),
+        "enforcement": {"mode": "strict", "violation_action": "abort_and_rollback", "alert_on_violation": True},
+    }
+
+
+def per_call_us(fn: Callable[[], Any], number: int) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--number", type=int, default=20_000)
+    ap.add_argument("--capabilities", type=int, default=5)
+    args = ap.parse_args()
+
+    body = token_body(args.capabilities)
+    token, signature = make_signed_token(body, secret=SECRET)
+    assert (token, signature) == legacy_mint(body), "paths disagree"
+
+    def mint() -> Any:
+        return make_signed_token(body, secret=SECRET)
+
+    print(f"token body: {len(runtime.canonical_json_bytes(body))} bytes, {args.number} mints per sample")
+    print(f"{'legacy (3 x json.dumps)':28s} {per_call_us(lambda: legacy_mint(body), args.number):8.2f} us")
+    orjson = runtime._orjson
+    runtime._orjson = None
+    try:
+        print(f"{'make_signed_token, stdlib':28s} {per_call_us(mint, args.number):8.2f} us")
+    finally:
+        runtime._orjson = orjson
+    if orjson is not None:
+        print(f"{'make_signed_token, orjson':28s} {per_call_us(mint, args.number):8.2f} us")
+    else:
+        print(f"{'make_signed_token, orjson':28s} (orjson not installed)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,57 @@
+"""InvocationLedger memory under a long stream of short-lived tokens.
+
+Drives the ledger with ``--tokens`` distinct tokens (default 2M), each valid
+for ``--ttl`` seconds of a simulated clock that advances one second per
+``--rate`` tokens, so about ``ttl * rate`` tokens are live at any moment.
+Expired entries should be evicted as the clock moves, keeping memory flat
+instead of growing with the total number of tokens ever seen.
+
+    python benchmarks/bench_ledger_memory.py [--tokens 2000000]
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from icnp.ledger import InvocationLedger  # noqa: E402
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--tokens", type=int, default=2_000_000)
+    ap.add_argument("--rate", type=int, default=1000, help="Tokens issued per simulated second.")
+    ap.add_argument("--ttl", type=int, default=10, help="Token lifetime in simulated seconds.")
+    ap.add_argument("--samples", type=int, default=10)
+    args = ap.parse_args()
+
+    now = [0.0]
+    ledger = InvocationLedger(clock=lambda: now[0])
+    every = max(1, args.tokens // args.samples)
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    print(f"{'tokens':>10} {'live':>8} {'current MiB':>12} {'peak MiB':>9}")
+    for i in range(1, args.tokens + 1):
+        now[0] = i / args.rate
+        token_id = f"tok-{i}"
+        ledger.try_acquire(token_id, max_invocations=2, not_after=int(now[0]) + args.ttl)
+        ledger.try_acquire(token_id, max_invocations=2, not_after=int(now[0]) + args.ttl)
+        if i % every == 0:
+            current, peak = tracemalloc.get_traced_memory()
+            print(f"{i:>10} {len(ledger):>8} {current / 2**20:>12.2f} {peak / 2**20:>9.2f}")
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"peak traced memory {peak / 2**20:.2f} MiB over {args.tokens} tokens "
+          f"({2 * args.tokens / elapsed:,.0f} acquires/s under tracemalloc)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,97 @@
+"""Token size and agent-side verification: capability hash list vs Merkle root.
+
+For each contract size, builds a token bound with ``capability_hashes`` and one
+bound with ``capability_root``, then times what an agent does before running:
+the HMAC over the token body plus checking its own capability is bound (a list
+membership test, or the inclusion proof). The Merkle figures use the longest
+proof in the tree.
+
+    python benchmarks/bench_merkle_binding.py [--sizes 5,50,500,5000]
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import timeit
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from icnp.merkle import make_merkle_binding, verify_capability_proof  # noqa: E402
+from icnp.runtime import (  # noqa: E402
+    canonical_json_bytes,
+    make_binding_hashes,
+    make_signed_token,
+    new_uuid,
+    sha256_hex,
+    verify_token_hmac,
+)
+
+SECRET = b"bench-secret"
+
+
+def token_body(binding: Dict[str, Any], contract_id: str) -> Dict[str, Any]:
+    return {
+        "token_id": new_uuid(),
+        "contract_id": contract_id,
+        "validity": {
+            "not_before": "2026-01-01T00:00:00Z",
+            "not_after": "2026-01-01T00:10:00Z",
+            "max_invocations": 1,
+        },
+        "binding": binding,
+        "enforcement": {"mode": "strict", "violation_action": "abort_and_rollback", "alert_on_violation": True},
+    }
+
+
+def per_call_us(fn: Callable[[], Any], number: int) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--sizes", default="5,50,500,5000", help="Comma-separated capability counts.")
+    ap.add_argument("--number", type=int, default=2000)
+    args = ap.parse_args()
+
+    print(f"{'n':>6} {'hashes: token':>14} {'verify':>9}   {'merkle: token':>14} {'proof':>8} {'verify':>9}")
+    for n in (int(s) for s in args.sizes.split(",")):
+        intent = {"action": "analyze", "goals": [{"id": "g1", "priority": "high"}]}
+        contract = {"contract_id": new_uuid(), "agreed_actions": [{"capability_id": new_uuid(), "approved": True}]}
+        capabilities: List[Dict[str, Any]] = [
+            {"id": f"cap-{i}", "action": "analyze", "scope": "text", "confidence": 0.9} for i in range(n)
+        ]
+
+        hashes_body = token_body(make_binding_hashes(intent, contract, capabilities), contract["contract_id"])
+        hashes_token, hashes_sig = make_signed_token(hashes_body, secret=SECRET)
+        last = capabilities[-1]
+
+        def verify_hashes() -> bool:
+            return verify_token_hmac(hashes_body, hashes_sig, secret=SECRET) and (
+                f"sha256:{sha256_hex(last)}" in hashes_body["binding"]["capability_hashes"]
+            )
+
+        binding, tree = make_merkle_binding(intent, contract, capabilities)
+        merkle_body = token_body(binding, contract["contract_id"])
+        merkle_token, merkle_sig = make_signed_token(merkle_body, secret=SECRET)
+        leaf = max(range(n), key=lambda i: len(tree.proof(i)))
+        proof = tree.proof(leaf)
+
+        def verify_merkle() -> bool:
+            return verify_token_hmac(merkle_body, merkle_sig, secret=SECRET) and verify_capability_proof(
+                capabilities[leaf], proof, binding["capability_root"]
+            )
+
+        assert verify_hashes() and verify_merkle()
+        number = max(1, args.number * 5 // max(n, 5))
+        print(
+            f"{n:>6} {len(hashes_token):>12} B {per_call_us(verify_hashes, number):>6.0f} us"
+            f"   {len(merkle_token):>12} B {len(canonical_json_bytes(proof)):>6} B"
+            f" {per_call_us(verify_merkle, number):>6.0f} us"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
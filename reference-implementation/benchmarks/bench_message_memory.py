@@ -0,0 +1,101 @@
+"""Memory held by message envelopes: builder dicts vs typed slotted messages.
+
+Holds ``--count`` envelopes (default 100k) that share one payload, as an
+orchestrator does when it keeps many messages about the same intent or
+contract, and reports what tracemalloc sees per envelope. Also times
+re-hashing an unchanged contract with the stdlib encoder: a dict is
+re-serialised every time, a typed message reuses its cached canonical form.
+
+    python benchmarks/bench_message_memory.py [--count 100000]
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import sys
+import timeit
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from icnp import runtime  # noqa: E402
+from icnp.messages import ContractNegotiation, IntentDeclaration  # noqa: E402
+from icnp.runtime import (  # noqa: E402
+    make_contract_message,
+    make_intent_message,
+    new_uuid,
+    sha256_hex,
+    utc_now_iso,
+)
+
+INTENT = {
+    "action": "analyze",
+    "target": {"type": "text", "identifier": "doc-1"},
+    "goals": [{"id": "g1", "description": "Summarise the document", "priority": "high"}],
+    "context": {"urgency": "soon"},
+}
+SENDER = {"id": "orchestrator", "type": "agent", "trust_level": "verified"}
+AGREED = [{"capability_id": "cap-analyze", "approved": True, "max_invocations": 1}]
+CONSTRAINTS = {"max_duration_seconds": 300, "sandbox": True}
+
+
+def traced_mib(build: Callable[[], List[Any]]) -> float:
+    gc.collect()
+    tracemalloc.start()
+    held = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del held
+    return current / 2**20
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--count", type=int, default=100_000)
+    ap.add_argument("--number", type=int, default=20_000)
+    args = ap.parse_args()
+    n = args.count
+
+    # Ids are generated before tracing so only the envelopes are measured.
+    ids = [new_uuid() for _ in range(n)]
+    now = utc_now_iso()
+    intent_dict = make_intent_message(intent=INTENT, sender=SENDER)
+    contract_dict = make_contract_message(contract_id="", agreed_actions=AGREED, execution_constraints=CONSTRAINTS)
+    builders = {
+        "intent": (
+            lambda: [dict(intent_dict, message_id=i, timestamp=now) for i in ids],
+            lambda: [IntentDeclaration(intent=INTENT, sender=SENDER, message_id=i, timestamp=now) for i in ids],
+        ),
+        "contract": (
+            lambda: [dict(contract_dict, contract_id=i) for i in ids],
+            lambda: [
+                ContractNegotiation(contract_id=i, agreed_actions=AGREED, execution_constraints=CONSTRAINTS)
+                for i in ids
+            ],
+        ),
+    }
+    print(f"{n} envelopes with a shared payload")
+    print(f"{'message':10s} {'dict MiB':>9} {'typed MiB':>10} {'dict B/msg':>11} {'typed B/msg':>12}")
+    for name, (as_dicts, as_typed) in builders.items():
+        d, t = traced_mib(as_dicts), traced_mib(as_typed)
+        print(f"{name:10s} {d:>9.1f} {t:>10.1f} {d * 2**20 / n:>11.0f} {t * 2**20 / n:>12.0f}")
+
+    contract_id = new_uuid()
+    as_dict = make_contract_message(contract_id=contract_id, agreed_actions=AGREED, execution_constraints=CONSTRAINTS)
+    typed = ContractNegotiation(contract_id=contract_id, agreed_actions=AGREED, execution_constraints=CONSTRAINTS)
+    assert sha256_hex(as_dict) == sha256_hex(typed)
+    orjson = runtime._orjson
+    runtime._orjson = None
+    try:
+        for name, msg in (("dict", as_dict), ("typed", typed)):
+            us = min(timeit.repeat(lambda: sha256_hex(msg), number=args.number, repeat=5)) / args.number * 1e6
+            print(f"re-hash unchanged contract, {name:5s} (stdlib): {us:.1f} us")
+    finally:
+        runtime._orjson = orjson
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
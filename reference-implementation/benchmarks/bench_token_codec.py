@@ -0,0 +1,83 @@
+"""Execution token size and parse time: ``demo.<base64 JSON>.<sig>`` vs binary.
+
+Parsing the string form means splitting it, base64-decoding the payload and
+``json.loads``; the binary form is :func:`icnp.token_codec.decode_binary_token`.
+Both yield the same body dict and signature.
+
+    python benchmarks/bench_token_codec.py [--number 20000]
+"""
+from __future__ import annotations
+
+import argparse
+import base64
+import json
+import sys
+import timeit
+from pathlib import Path
+from typing import Any, Callable, Dict, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from icnp.merkle import make_merkle_binding  # noqa: E402
+from icnp.runtime import make_binding_hashes, make_signed_token, new_uuid  # noqa: E402
+from icnp.token_codec import decode_binary_token, encode_binary_token  # noqa: E402
+
+SECRET = b"bench-secret"
+
+
+def token_body(binding: Dict[str, Any], contract_id: str) -> Dict[str, Any]:
+    return {
+        "token_id": new_uuid(),
+        "contract_id": contract_id,
+        "validity": {
+            "not_before": "2026-01-01T00:00:00Z",
+            "not_after": "2026-01-01T00:10:00Z",
+            "max_invocations": 1,
+        },
+        "binding": binding,
+        "enforcement": {"mode": "strict", "violation_action": "abort_and_rollback", "alert_on_violation": True},
+    }
+
+
+def parse_demo_token(token: str) -> Tuple[Dict[str, Any], str]:
+    _, payload, signature = token.split(".")
+    body = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    return body, signature
+
+
+def per_call_us(fn: Callable[[], Any], number: int) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--number", type=int, default=20_000)
+    args = ap.parse_args()
+
+    intent = {"action": "analyze", "goals": [{"id": "g1", "priority": "high"}]}
+    contract = {"contract_id": new_uuid(), "agreed_actions": [{"capability_id": new_uuid(), "approved": True}]}
+
+    def caps(n: int) -> list:
+        return [{"id": f"cap-{i}", "action": "analyze", "scope": "text"} for i in range(n)]
+
+    cases = {
+        "merkle root": make_merkle_binding(intent, contract, caps(5))[0],
+        "5 capability hashes": make_binding_hashes(intent, contract, caps(5)),
+        "50 capability hashes": make_binding_hashes(intent, contract, caps(50)),
+    }
+    print(f"{'binding':22s} {'JSON token':>11} {'binary':>8} {'JSON parse':>11} {'binary parse':>13}")
+    for name, binding in cases.items():
+        body = token_body(binding, contract["contract_id"])
+        token, signature = make_signed_token(body, secret=SECRET)
+        data = encode_binary_token(body, signature)
+        assert parse_demo_token(token) == decode_binary_token(data) == (body, signature)
+        print(
+            f"{name:22s} {len(token):>9} B {len(data):>6} B"
+            f" {per_call_us(lambda: parse_demo_token(token), args.number):>8.1f} us"
+            f" {per_call_us(lambda: decode_binary_token(data), args.number):>10.1f} us"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,36 +1,41 @@
 from __future__ import annotations
 
 import argparse
+import asyncio
 import json
 from dataclasses import dataclass
-from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Union
 
 from icnp.runtime import (
     Responder,
     SchemaRegistry,
     Sender,
-    make_binding_hashes,
+    as_message_dict,
     make_capability_message,
-    make_contract_message,
-    make_demo_token,
-    make_execution_token_message,
-    make_intent_message,
     new_uuid,
-    sign_token_hmac,
+    sha256_hex,
     utc_now_iso,
-    verify_token_hmac,
 )
-from icnp.ollama import OllamaClient
-
-
-def jprint(title: str, msg: Dict[str, Any]) -> None:
-    print("\n" + "=" * 90)
-    print(title)
-    print("-" * 90)
-    print(json.dumps(msg, indent=2, ensure_ascii=False))
-    print("=" * 90 + "\n")
+from icnp.admission import AdmissionQueue, AdmissionRefused
+from icnp.contract import CompiledContract, compile_contract
+from icnp.ledger import InvocationLedger, LedgerBackend
+from icnp.llm_cache import ResponseCache
+from icnp.merkle import verify_capability_in_proofs
+from icnp.messages import Message
+from icnp.negotiation import NegotiationSession
+from icnp.ollama import AsyncOllamaClient, ChatMetrics, OllamaClient
+from icnp.pipeline import Stage, run_pipeline
+from icnp.scheduler import ModelScheduler
+from icnp.tokens import Keyring, TokenIssuer, TokenVerificationError, TokenVerifier
+
+
+def jprint(title: str, msg: Union[Dict[str, Any], Message]) -> None:
+    # One write per message so output from concurrent stages does not interleave.
+    print(
+        "\n" + "=" * 90 + "\n" + title + "\n" + "-" * 90 + "\n"
+        + json.dumps(as_message_dict(msg), indent=2, ensure_ascii=False) + "\n" + "=" * 90 + "\n"
+    )
 
 
 @dataclass
@@ -48,10 +53,13 @@ class ICNPAgent:
         action: str,
         model: str,
         system_prompt: str,
-        secret: bytes,
+        secret: Union[bytes, Keyring],
         dry_run: bool,
         schema: SchemaRegistry,
-        ollama: Optional[OllamaClient] = None,
+        ollama: Optional[Union[OllamaClient, ModelScheduler]] = None,
+        async_ollama: Optional[AsyncOllamaClient] = None,
+        ledger: Optional[LedgerBackend] = None,
+        refresh_cache: bool = False,
     ):
         self.responder = responder
         self.system_prompt = system_prompt
@@ -60,12 +68,16 @@ class ICNPAgent:
         self.dry_run = dry_run
         self.schema = schema
         self.ollama = ollama
-        self.invocations_by_token: Dict[str, int] = {}
+        self.async_ollama = async_ollama
+        self.refresh_cache = refresh_cache
+        self.token_verifier = TokenVerifier(secret)
+        # Share a cross-process ledger when the agent runs as several workers.
+        self.ledger: LedgerBackend = ledger if ledger is not None else InvocationLedger()
 
         self.capability = Capability(capability_id=new_uuid(), action=action, scope="text")
 
-    def capability_message(self, intent_id: str) -> Dict[str, Any]:
-        cap = {
+    def capability_record(self) -> Dict[str, Any]:
+        return {
             "id": self.capability.capability_id,
             "action": self.capability.action,
             "scope": self.capability.scope,
@@ -73,9 +85,11 @@ class ICNPAgent:
             "requires_approval": False,
             "side_effects": "none",
         }
+
+    def capability_message(self, intent_id: str) -> Dict[str, Any]:
         msg = make_capability_message(
             in_reply_to=intent_id,
-            capabilities=[cap],
+            capabilities=[self.capability_record()],
             responder=self.responder.to_dict(),
             resource_requirements={
                 "compute": {"cpu_cores": 1, "memory_gb": 2},
@@ -87,45 +101,93 @@ class ICNPAgent:
             raise ValueError(f"Capability message schema errors: {errors}")
         return msg
 
+    def authorize(
+        self,
+        *,
+        token_meta: Dict[str, Any],
+        contract_obj: Union[Dict[str, Any], CompiledContract],
+    ) -> Optional[Dict[str, Any]]:
+        """Check token and contract; returns a denial result, or None if execution may proceed.
+
+        Pass a ``CompiledContract`` to keep the contract checks constant-time.
+        """
+        try:
+            token = self.token_verifier.verify(
+                token_meta["body"], token_meta["signature"], key_id=token_meta.get("key_id")
+            )
+        except TokenVerificationError as e:
+            return self.execution_error(str(e))
+
+        cap = self.capability
+        binding = token.body["binding"]
+        if "capability_root" in binding:
+            bound = verify_capability_in_proofs(
+                self.capability_record(), token_meta.get("capability_proofs", []), binding["capability_root"]
+            )
+        else:
+            bound = f"sha256:{sha256_hex(self.capability_record())}" in binding.get("capability_hashes", [])
+        if not bound:
+            return self.execution_error("Capability not bound to token")
+
+        contract = compile_contract(contract_obj)
+        denial = contract.denial(cap.capability_id, cap.action, cap.scope)
+        if denial is not None:
+            return self.execution_error(denial)
+
+        # Checked last so a denied call does not consume an invocation.
+        limit = contract.invocation_limit(cap.capability_id)
+        max_invocations = token.max_invocations if limit is None else min(limit, token.max_invocations)
+        if not self.ledger.try_acquire(token.token_id, max_invocations=max_invocations, not_after=token.not_after):
+            return self.execution_error("Invocation limit exceeded")
+        return None
+
     def verify_and_execute(
         self,
         *,
         action: str,
         parameters: Dict[str, Any],
         token_meta: Dict[str, Any],
-        contract_obj: Dict[str, Any],
+        contract_obj: Union[Dict[str, Any], CompiledContract],
+        on_chunk: Optional[Callable[[str], None]] = None,
     ) -> Dict[str, Any]:
-        token_body = token_meta["body"]
-        signature = token_meta["signature"]
-        if not verify_token_hmac(token_body, signature, secret=self.secret):
-            return self.execution_error("Token signature invalid")
-
-        validity = token_body["validity"]
-        now = datetime.now(timezone.utc)
-        nb = datetime.fromisoformat(validity["not_before"].replace("Z", "+00:00"))
-        na = datetime.fromisoformat(validity["not_after"].replace("Z", "+00:00"))
-        if not (nb <= now < na):
-            return self.execution_error("Token expired or not yet valid")
-
-        token_id = token_body["token_id"]
-        max_invocations = validity.get("max_invocations", 1)
-        self.invocations_by_token.setdefault(token_id, 0)
-        self.invocations_by_token[token_id] += 1
-        if self.invocations_by_token[token_id] > max_invocations:
-            return self.execution_error("Invocation limit exceeded")
+        denied = self.authorize(token_meta=token_meta, contract_obj=contract_obj)
+        if denied is not None:
+            return denied
 
-        permitted = any(
-            aa["capability_id"] == self.capability.capability_id and aa.get("approved") is True
-            for aa in contract_obj["agreed_actions"]
-        )
-        if not permitted:
-            return self.execution_error("Capability not approved in contract")
+        metrics = ChatMetrics() if on_chunk is not None else None
+        started_at = utc_now_iso()
+        output_text = self.perform_action(action, parameters, on_chunk=on_chunk, metrics=metrics)
+        ended_at = utc_now_iso()
+        return self.execution_result(action, started_at, ended_at, output_text, metrics)
+
+    async def verify_and_execute_async(
+        self,
+        *,
+        action: str,
+        parameters: Dict[str, Any],
+        token_meta: Dict[str, Any],
+        contract_obj: Union[Dict[str, Any], CompiledContract],
+        on_chunk: Optional[Callable[[str], None]] = None,
+    ) -> Dict[str, Any]:
+        denied = self.authorize(token_meta=token_meta, contract_obj=contract_obj)
+        if denied is not None:
+            return denied
 
+        metrics = ChatMetrics() if on_chunk is not None else None
         started_at = utc_now_iso()
-        output_text = self.perform_action(action, parameters)
+        output_text = await self.perform_action_async(action, parameters, on_chunk=on_chunk, metrics=metrics)
         ended_at = utc_now_iso()
+        return self.execution_result(action, started_at, ended_at, output_text, metrics)
 
-        return {
+    def execution_result(
+        self,
+        action: str,
+        started_at: str,
+        ended_at: str,
+        output_text: str,
+        metrics: Optional[ChatMetrics] = None,
+    ) -> Dict[str, Any]:
+        result = {
             "agent_id": self.responder.id,
             "capability_id": self.capability.capability_id,
             "action": action,
@@ -134,26 +196,99 @@ class ICNPAgent:
             "ended_at": ended_at,
             "output": {"text": output_text},
         }
+        if metrics is not None and metrics.total_s is not None:
+            result["metrics"] = metrics.to_dict()
+        return result
 
     def execution_error(self, message: str) -> Dict[str, Any]:
         return {"agent_id": self.responder.id, "status": "denied", "error": message}
 
-    def perform_action(self, action: str, parameters: Dict[str, Any]) -> str:
+    def perform_action(
+        self,
+        action: str,
+        parameters: Dict[str, Any],
+        *,
+        on_chunk: Optional[Callable[[str], None]] = None,
+        metrics: Optional[ChatMetrics] = None,
+    ) -> str:
         if self.dry_run or self.ollama is None:
-            return f"[dry-run:{self.responder.id}] Completed {action} with parameters={parameters!r}"
+            text = f"[dry-run:{self.responder.id}] Completed {action} with parameters={parameters!r}"
+            if on_chunk is not None:
+                on_chunk(text)
+            return text
+
+        return self.ollama.chat(
+            self.model,
+            self.chat_messages(action, parameters),
+            on_chunk=on_chunk,
+            metrics=metrics,
+            bypass_cache=self.refresh_cache,
+        )
+
+    async def perform_action_async(
+        self,
+        action: str,
+        parameters: Dict[str, Any],
+        *,
+        on_chunk: Optional[Callable[[str], None]] = None,
+        metrics: Optional[ChatMetrics] = None,
+    ) -> str:
+        if self.dry_run or self.async_ollama is None:
+            return await asyncio.to_thread(
+                self.perform_action, action, parameters, on_chunk=on_chunk, metrics=metrics
+            )
+        return await self.async_ollama.chat(
+            self.model,
+            self.chat_messages(action, parameters),
+            on_chunk=on_chunk,
+            metrics=metrics,
+            bypass_cache=self.refresh_cache,
+        )
 
+    def chat_messages(self, action: str, parameters: Dict[str, Any]) -> List[Dict[str, str]]:
         user_prompt = parameters.get("prompt", f"Perform action: {action}. Parameters: {json.dumps(parameters)}")
-        messages = [
+        return [
             {"role": "system", "content": self.system_prompt},
             {"role": "user", "content": user_prompt},
         ]
-        return self.ollama.chat(self.model, messages)
 
 
 def main() -> int:
     ap = argparse.ArgumentParser()
     ap.add_argument("--ollama-url", default="http://localhost:11434")
     ap.add_argument("--dry-run", action="store_true")
+    ap.add_argument("--stream", action="store_true", help="Stream agent output as it is generated.")
+    ap.add_argument(
+        "--disclosure-deadline",
+        type=float,
+        default=5.0,
+        help="Seconds to wait for capability disclosures before negotiating with those received.",
+    )
+    ap.add_argument(
+        "--binding",
+        choices=("merkle", "hashes"),
+        default="merkle",
+        help="Bind capabilities into the token as a Merkle root (default) or a list of hashes.",
+    )
+    ap.add_argument(
+        "--response-cache",
+        default=None,
+        metavar="PATH",
+        help="SQLite file caching model replies; identical prompts are answered from it on later runs.",
+    )
+    ap.add_argument("--refresh-cache", action="store_true", help="Ignore cached replies but store fresh ones.")
+    ap.add_argument(
+        "--max-loaded-models",
+        type=int,
+        default=1,
+        help="Models Ollama may keep loaded at once; requests are grouped by model to avoid swaps.",
+    )
+    ap.add_argument(
+        "--max-queue-depth",
+        type=int,
+        default=16,
+        help="Executions allowed to wait; beyond this, lower-priority work is refused with ICNP-003.",
+    )
     ap.add_argument("--model", default=None, help="Default model for all agents (unless overridden).")
     ap.add_argument("--model-planner", default=None)
     ap.add_argument("--model-writer", default=None)
@@ -164,8 +299,21 @@ def main() -> int:
     base = Path(__file__).resolve().parent
     schema = SchemaRegistry(str((base.parent / "schemas").resolve()))
 
-    secret = b"icnp-demo-secret"
-    ollama = None if args.dry_run else OllamaClient(args.ollama_url)
+    # Agents share the keyring, so a new key can be activated without restarting them.
+    secret = Keyring({"demo-1": b"icnp-demo-secret"})
+    issuer = TokenIssuer(secret)
+    cache = ResponseCache(args.response_cache) if args.response_cache and not args.dry_run else None
+    # Agents on different models share one scheduler so Ollama swaps weights as rarely as possible.
+    scheduler = (
+        None
+        if args.dry_run
+        else ModelScheduler(OllamaClient(args.ollama_url, cache=cache), max_loaded_models=args.max_loaded_models)
+    )
+
+    def print_chunk(chunk: str) -> None:
+        print(chunk, end="", flush=True)
+
+    on_chunk = print_chunk if args.stream else None
 
     def choose_model(override: Optional[str]) -> str:
         return override or args.model or "llama3.1:8b"
@@ -181,7 +329,8 @@ def main() -> int:
             secret=secret,
             dry_run=args.dry_run,
             schema=schema,
-            ollama=ollama,
+            ollama=scheduler,
+            refresh_cache=args.refresh_cache,
         ),
         ICNPAgent(
             responder=Responder(id="agent-writer", version="1.0"),
@@ -191,7 +340,8 @@ def main() -> int:
             secret=secret,
             dry_run=args.dry_run,
             schema=schema,
-            ollama=ollama,
+            ollama=scheduler,
+            refresh_cache=args.refresh_cache,
         ),
         ICNPAgent(
             responder=Responder(id="agent-reviewer", version="1.0"),
@@ -201,7 +351,8 @@ def main() -> int:
             secret=secret,
             dry_run=args.dry_run,
             schema=schema,
-            ollama=ollama,
+            ollama=scheduler,
+            refresh_cache=args.refresh_cache,
         ),
         ICNPAgent(
             responder=Responder(id="agent-summariser", version="1.0"),
@@ -211,7 +362,8 @@ def main() -> int:
             secret=secret,
             dry_run=args.dry_run,
             schema=schema,
-            ollama=ollama,
+            ollama=scheduler,
+            refresh_cache=args.refresh_cache,
         ),
     ]
 
@@ -237,24 +389,28 @@ def main() -> int:
         "context": {"environment": "development", "urgency": "soon"},
     }
 
-    intent_msg = make_intent_message(intent=intent, sender=orchestrator.to_dict())
-    ok, errors = schema.validate("intent.schema.json", intent_msg)
-    if not ok:
-        raise ValueError(f"Intent schema errors: {errors}")
+    session = NegotiationSession(
+        schema=schema, issuer=issuer, sender=orchestrator.to_dict(), binding=args.binding
+    )
+    intent_msg = session.declare(intent)
     jprint("SEND -> INTENT_DECLARATION (orchestrator -> broadcast)", intent_msg)
 
-    cap_msgs: List[Dict[str, Any]] = []
-    capability_records: List[Dict[str, Any]] = []
-    for ag in agents:
-        cap_msg = ag.capability_message(intent_msg["message_id"])
-        cap_msgs.append(cap_msg)
-        capability_records.extend(cap_msg["capabilities"])
-        jprint(f"RECV <- CAPABILITY_DISCLOSURE ({ag.responder.id} -> orchestrator)", cap_msg)
+    # All agents are asked at once; one that misses the deadline is left out of the contract.
+    disclosures = session.gather(
+        {ag.responder.id: ag.capability_message for ag in agents},
+        deadline_s=args.disclosure_deadline,
+        quorum=1,
+    )
+    for agent_id, cap_msg in disclosures.received.items():
+        jprint(f"RECV <- CAPABILITY_DISCLOSURE ({agent_id} -> orchestrator)", cap_msg)
+    for agent_id in disclosures.late:
+        print(f"No capability disclosure from {agent_id} within {args.disclosure_deadline}s")
+    for agent_id, exc in disclosures.failed.items():
+        print(f"Capability disclosure from {agent_id} failed: {exc}")
 
-    contract_id = new_uuid()
     agreed_actions = [
-        {"capability_id": ag.capability.capability_id, "approved": True, "max_invocations": 1}
-        for ag in agents
+        {"capability_id": cap["id"], "approved": True, "max_invocations": 1}
+        for cap in disclosures.capabilities
     ]
     execution_constraints = {
         "audit_level": "standard",
@@ -267,53 +423,19 @@ def main() -> int:
         {"action": "delete", "scope": "any", "reason": "Safety"},
     ]
 
-    contract_obj = make_contract_message(
-        contract_id=contract_id,
+    contract_obj = session.propose(
         agreed_actions=agreed_actions,
         execution_constraints=execution_constraints,
         forbidden_actions=forbidden_actions,
         signatures={"initiator": "demo-signature", "responder": "demo-signature"},
     )
-    ok, errors = schema.validate("contract.schema.json", contract_obj)
-    if not ok:
-        raise ValueError(f"Contract schema errors: {errors}")
     jprint("SEND -> CONTRACT_NEGOTIATION (orchestrator -> participants)", contract_obj)
 
-    binding = make_binding_hashes(intent_msg["intent"], contract_obj, capability_records)
-
-    not_before = datetime.now(timezone.utc).replace(microsecond=0)
-    not_after = not_before + timedelta(minutes=10)
-    validity = {
-        "not_before": not_before.isoformat().replace("+00:00", "Z"),
-        "not_after": not_after.isoformat().replace("+00:00", "Z"),
-        "max_invocations": 1,
-    }
-    enforcement = {"mode": "strict", "violation_action": "abort_and_rollback", "alert_on_violation": True}
-
-    token_id = new_uuid()
-    token_body = {
-        "token_id": token_id,
-        "contract_id": contract_id,
-        "validity": validity,
-        "binding": binding,
-        "enforcement": enforcement,
-    }
-    token_signature = sign_token_hmac(token_body, secret=secret)
-    token = make_demo_token(token_body, secret=secret)
-    token_msg = make_execution_token_message(
-        token_id=token_id,
-        contract_id=contract_id,
-        token=token,
-        validity=validity,
-        binding=binding,
-        enforcement=enforcement,
-    )
-    ok, errors = schema.validate("execution-token.schema.json", token_msg)
-    if not ok:
-        raise ValueError(f"Token schema errors: {errors}")
-    jprint("SEND -> EXECUTION_TOKEN (issuer -> participants)", token_msg)
+    grant = session.issue_token(disclosures.capabilities, ttl_s=600, max_invocations=1)
+    jprint("SEND -> EXECUTION_TOKEN (issuer -> participants)", grant.message)
 
-    token_meta = {"body": token_body, "signature": token_signature}
+    token_meta = grant.token_meta()
+    compiled_contract = CompiledContract.from_message(contract_obj)
 
     goal_note = (
         f"Intent: {intent_goal}\n"
@@ -326,27 +448,60 @@ def main() -> int:
         "agent-summariser": "Summarise the final content into a concise 120-160 word explanation.",
     }
 
-    outputs: Dict[str, str] = {}
-
-    for ag in agents:
-        prompt = prompts[ag.responder.id]
-        if ag.responder.id == "agent-writer":
-            prompt += "\n\nOUTLINE:\n" + outputs.get("agent-planner", "[outline missing]")
-        if ag.responder.id == "agent-reviewer":
-            prompt += "\n\nDRAFT:\n" + outputs.get("agent-writer", "[draft missing]")
-        if ag.responder.id == "agent-summariser":
-            prompt += "\n\nDRAFT:\n" + outputs.get("agent-writer", "") + "\n\nREVIEW:\n" + outputs.get("agent-reviewer", "")
-
-        params = {"prompt": goal_note + prompt}
-        result = ag.verify_and_execute(
-            action=ag.capability.action,
-            parameters=params,
-            token_meta=token_meta,
-            contract_obj=contract_obj,
-        )
-        jprint(f"EXECUTION_RESULT ({ag.responder.id})", result)
-        if result.get("status") == "success":
-            outputs[ag.responder.id] = result["output"]["text"]
+    # Each stage consumes the outputs of the stages it names, under a prompt label.
+    stage_inputs: Dict[str, Dict[str, str]] = {
+        "agent-planner": {},
+        "agent-writer": {"agent-planner": "OUTLINE"},
+        "agent-reviewer": {"agent-writer": "DRAFT"},
+        "agent-summariser": {"agent-writer": "DRAFT", "agent-reviewer": "REVIEW"},
+    }
+
+    def make_stage(ag: ICNPAgent) -> Stage:
+        labelled_inputs = stage_inputs[ag.responder.id]
+
+        def run(upstream: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+            prompt = prompts[ag.responder.id]
+            for dep, label in labelled_inputs.items():
+                text = upstream[dep].get("output", {}).get("text", f"[{label.lower()} missing]")
+                prompt += f"\n\n{label}:\n{text}"
+
+            params = {"prompt": goal_note + prompt}
+
+            def execute() -> Dict[str, Any]:
+                return ag.verify_and_execute(
+                    action=ag.capability.action,
+                    parameters=params,
+                    token_meta=token_meta,
+                    contract_obj=compiled_contract,
+                    on_chunk=on_chunk,
+                )
+
+            try:
+                result = admission.submit(execute, intent=intent, contract=contract_obj).result()
+            except AdmissionRefused as e:
+                result = {"agent_id": ag.responder.id, **e.to_dict()}
+            if on_chunk is not None:
+                print()
+            jprint(f"EXECUTION_RESULT ({ag.responder.id})", result)
+            return result
+
+        return Stage(ag.responder.id, run, tuple(labelled_inputs))
+
+    # Executions run in order of goal priority, urgency and expected duration.
+    with AdmissionQueue(max_depth=args.max_queue_depth, workers=len(agents)) as admission:
+        run = run_pipeline([make_stage(ag) for ag in agents])
+    for name, exc in run.errors.items():
+        print(f"Stage {name} failed: {exc!r}")
+    outputs: Dict[str, str] = {
+        name: result["output"]["text"]
+        for name, result in run.outputs.items()
+        if result.get("status") == "success"
+    }
+
+    print("\n" + "#" * 90)
+    print("PIPELINE TIMING")
+    print("#" * 90)
+    print(run.summary())
 
     print("\n" + "#" * 90)
     print("FINAL ARTEFACTS")
@@ -356,6 +511,12 @@ def main() -> int:
     print(f"\n--- review ---\n{outputs.get('agent-reviewer', '')}")
     print(f"\n--- summary ---\n{outputs.get('agent-summariser', '')}")
 
+    if scheduler is not None:
+        print(f"\nModel scheduler: {scheduler.stats.to_dict()}")
+    if cache is not None:
+        print(f"\nResponse cache: {cache.stats()}")
+        cache.close()
+
     return 0
 
 
@@ -1,35 +1,37 @@
 from __future__ import annotations
 
 import argparse
+import asyncio
 import json
 from dataclasses import dataclass
-from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Union
 
 from icnp.runtime import (
     Responder,
     SchemaRegistry,
     Sender,
-    make_binding_hashes,
+    as_message_dict,
     make_capability_message,
-    make_contract_message,
-    make_demo_token,
-    make_execution_token_message,
-    make_intent_message,
     new_uuid,
-    sign_token_hmac,
     utc_now_iso,
-    verify_token_hmac,
 )
-from icnp.ollama import OllamaClient
-
-
-def jprint(title: str, msg: Dict[str, Any]) -> None:
+from icnp.capability_index import CapabilityIndex
+from icnp.contract import CompiledContract, compile_contract
+from icnp.ledger import InvocationLedger, LedgerBackend
+from icnp.llm_cache import ResponseCache
+from icnp.messages import Message
+from icnp.negotiation import NegotiationSession
+from icnp.ollama import AsyncOllamaClient, ChatMetrics, OllamaClient
+from icnp.ranking import CapabilityRanker
+from icnp.tokens import Keyring, TokenIssuer, TokenVerificationError, TokenVerifier
+
+
+def jprint(title: str, msg: Union[Dict[str, Any], Message]) -> None:
     print("\n" + "=" * 90)
     print(title)
     print("-" * 90)
-    print(json.dumps(msg, indent=2, ensure_ascii=False))
+    print(json.dumps(as_message_dict(msg), indent=2, ensure_ascii=False))
     print("=" * 90 + "\n")
 
 
@@ -58,10 +60,13 @@ class ICNPAgent:
         scope: str,
         model: str,
         system_prompt: str,
-        secret: bytes,
+        secret: Union[bytes, Keyring],
         dry_run: bool,
         schema: SchemaRegistry,
         ollama: Optional[OllamaClient] = None,
+        async_ollama: Optional[AsyncOllamaClient] = None,
+        ledger: Optional[LedgerBackend] = None,
+        refresh_cache: bool = False,
     ):
         self.responder = responder
         self.system_prompt = system_prompt
@@ -70,7 +75,11 @@ class ICNPAgent:
         self.dry_run = dry_run
         self.schema = schema
         self.ollama = ollama
-        self.invocations_by_token: Dict[str, int] = {}
+        self.async_ollama = async_ollama
+        self.refresh_cache = refresh_cache
+        self.token_verifier = TokenVerifier(secret)
+        # Share a cross-process ledger when the agent runs as several workers.
+        self.ledger: LedgerBackend = ledger if ledger is not None else InvocationLedger()
 
         self.capability = Capability(capability_id=new_uuid(), action=action, scope=scope)
 
@@ -93,95 +102,180 @@ class ICNPAgent:
             raise ValueError(f"Capability message schema errors: {errors}")
         return msg
 
+    def authorize(
+        self,
+        *,
+        token_meta: Dict[str, Any],
+        contract_obj: Union[Dict[str, Any], CompiledContract],
+    ) -> Optional[Dict[str, Any]]:
+        """Check token and contract; returns a denial result, or None if execution may proceed.
+
+        Pass a ``CompiledContract`` to keep the contract checks constant-time.
+        """
+        try:
+            token = self.token_verifier.verify(
+                token_meta["body"], token_meta["signature"], key_id=token_meta.get("key_id")
+            )
+        except TokenVerificationError as e:
+            return self.execution_error(str(e))
+
+        contract = compile_contract(contract_obj)
+        cap = self.capability
+        denial = contract.denial(cap.capability_id, cap.action, cap.scope)
+        if denial is not None:
+            return self.execution_error(denial)
+
+        # Checked last so a denied call does not consume an invocation.
+        limit = contract.invocation_limit(cap.capability_id)
+        max_invocations = token.max_invocations if limit is None else min(limit, token.max_invocations)
+        if not self.ledger.try_acquire(token.token_id, max_invocations=max_invocations, not_after=token.not_after):
+            return self.execution_error("Invocation limit exceeded")
+        return None
+
     def verify_and_execute(
         self,
         *,
         parameters: Dict[str, Any],
         token_meta: Dict[str, Any],
-        contract_obj: Dict[str, Any],
+        contract_obj: Union[Dict[str, Any], CompiledContract],
+        on_chunk: Optional[Callable[[str], None]] = None,
     ) -> Dict[str, Any]:
-        token_body = token_meta["body"]
-        signature = token_meta["signature"]
-        if not verify_token_hmac(token_body, signature, secret=self.secret):
-            return self.execution_error("Token signature invalid")
-
-        validity = token_body["validity"]
-        now = datetime.now(timezone.utc)
-        nb = datetime.fromisoformat(validity["not_before"].replace("Z", "+00:00"))
-        na = datetime.fromisoformat(validity["not_after"].replace("Z", "+00:00"))
-        if not (nb <= now < na):
-            return self.execution_error("Token expired or not yet valid")
-
-        token_id = token_body["token_id"]
-        max_invocations = validity.get("max_invocations", 1)
-        self.invocations_by_token.setdefault(token_id, 0)
-        self.invocations_by_token[token_id] += 1
-        if self.invocations_by_token[token_id] > max_invocations:
-            return self.execution_error("Invocation limit exceeded")
+        denied = self.authorize(token_meta=token_meta, contract_obj=contract_obj)
+        if denied is not None:
+            return denied
 
-        permitted = any(
-            aa["capability_id"] == self.capability.capability_id and aa.get("approved") is True
-            for aa in contract_obj["agreed_actions"]
-        )
-        if not permitted:
-            return self.execution_error("Capability not approved in contract")
+        metrics = ChatMetrics() if on_chunk is not None else None
+        started_at = utc_now_iso()
+        output_text = self.perform_action(self.capability.action, parameters, on_chunk=on_chunk, metrics=metrics)
+        ended_at = utc_now_iso()
+        return self.execution_result(self.capability.action, started_at, ended_at, output_text, metrics)
 
+    async def verify_and_execute_async(
+        self,
+        *,
+        parameters: Dict[str, Any],
+        token_meta: Dict[str, Any],
+        contract_obj: Union[Dict[str, Any], CompiledContract],
+        on_chunk: Optional[Callable[[str], None]] = None,
+    ) -> Dict[str, Any]:
+        denied = self.authorize(token_meta=token_meta, contract_obj=contract_obj)
+        if denied is not None:
+            return denied
+
+        metrics = ChatMetrics() if on_chunk is not None else None
         started_at = utc_now_iso()
-        output_text = self.perform_action(self.capability.action, parameters)
+        output_text = await self.perform_action_async(self.capability.action, parameters, on_chunk=on_chunk, metrics=metrics)
         ended_at = utc_now_iso()
+        return self.execution_result(self.capability.action, started_at, ended_at, output_text, metrics)
 
-        return {
+    def execution_result(
+        self,
+        action: str,
+        started_at: str,
+        ended_at: str,
+        output_text: str,
+        metrics: Optional[ChatMetrics] = None,
+    ) -> Dict[str, Any]:
+        result = {
             "agent_id": self.responder.id,
             "capability_id": self.capability.capability_id,
-            "action": self.capability.action,
+            "action": action,
             "status": "success",
             "started_at": started_at,
             "ended_at": ended_at,
             "output": {"text": output_text},
         }
+        if metrics is not None and metrics.total_s is not None:
+            result["metrics"] = metrics.to_dict()
+        return result
 
     def execution_error(self, message: str) -> Dict[str, Any]:
         return {"agent_id": self.responder.id, "status": "denied", "error": message}
 
-    def perform_action(self, action: str, parameters: Dict[str, Any]) -> str:
+    def perform_action(
+        self,
+        action: str,
+        parameters: Dict[str, Any],
+        *,
+        on_chunk: Optional[Callable[[str], None]] = None,
+        metrics: Optional[ChatMetrics] = None,
+    ) -> str:
         if self.dry_run or self.ollama is None:
-            return f"[dry-run:{self.responder.id}] Completed {action} with parameters={parameters!r}"
+            text = f"[dry-run:{self.responder.id}] Completed {action} with parameters={parameters!r}"
+            if on_chunk is not None:
+                on_chunk(text)
+            return text
+
+        return self.ollama.chat(
+            self.model,
+            self.chat_messages(action, parameters),
+            on_chunk=on_chunk,
+            metrics=metrics,
+            bypass_cache=self.refresh_cache,
+        )
+
+    async def perform_action_async(
+        self,
+        action: str,
+        parameters: Dict[str, Any],
+        *,
+        on_chunk: Optional[Callable[[str], None]] = None,
+        metrics: Optional[ChatMetrics] = None,
+    ) -> str:
+        if self.dry_run or self.async_ollama is None:
+            return await asyncio.to_thread(
+                self.perform_action, action, parameters, on_chunk=on_chunk, metrics=metrics
+            )
+        return await self.async_ollama.chat(
+            self.model,
+            self.chat_messages(action, parameters),
+            on_chunk=on_chunk,
+            metrics=metrics,
+            bypass_cache=self.refresh_cache,
+        )
 
+    def chat_messages(self, action: str, parameters: Dict[str, Any]) -> List[Dict[str, str]]:
         user_prompt = parameters.get("prompt", f"Perform action: {action}. Parameters: {json.dumps(parameters)}")
-        messages = [
+        return [
             {"role": "system", "content": self.system_prompt},
             {"role": "user", "content": user_prompt},
         ]
-        return self.ollama.chat(self.model, messages)
-
-
-def match_capability(
-    agents: List[ICNPAgent],
-    *,
-    required_action: str,
-    required_scope: str,
-) -> Tuple[List[ICNPAgent], List[ICNPAgent]]:
-    matches = [
-        ag
-        for ag in agents
-        if ag.capability.action == required_action and ag.capability.scope == required_scope
-    ]
-    non_matches = [ag for ag in agents if ag not in matches]
-    return matches, non_matches
 
 
 def main() -> int:
     ap = argparse.ArgumentParser()
     ap.add_argument("--ollama-url", default="http://localhost:11434")
     ap.add_argument("--dry-run", action="store_true")
+    ap.add_argument("--stream", action="store_true", help="Stream agent output as it is generated.")
+    ap.add_argument(
+        "--disclosure-deadline",
+        type=float,
+        default=5.0,
+        help="Seconds to wait for capability disclosures before negotiating with those received.",
+    )
+    ap.add_argument(
+        "--response-cache",
+        default=None,
+        metavar="PATH",
+        help="SQLite file caching model replies; identical prompts are answered from it on later runs.",
+    )
+    ap.add_argument("--refresh-cache", action="store_true", help="Ignore cached replies but store fresh ones.")
     ap.add_argument("--model", default=None, help="Default model for all agents.")
     args = ap.parse_args()
 
     base = Path(__file__).resolve().parent
     schema = SchemaRegistry(str((base.parent / "schemas").resolve()))
 
-    secret = b"icnp-demo-secret"
-    ollama = None if args.dry_run else OllamaClient(args.ollama_url)
+    # Agents share the keyring, so a new key can be activated without restarting them.
+    secret = Keyring({"demo-1": b"icnp-demo-secret"})
+    issuer = TokenIssuer(secret)
+    cache = ResponseCache(args.response_cache) if args.response_cache and not args.dry_run else None
+    ollama = None if args.dry_run else OllamaClient(args.ollama_url, cache=cache)
+
+    def print_chunk(chunk: str) -> None:
+        print(chunk, end="", flush=True)
+
+    on_chunk = print_chunk if args.stream else None
 
     def choose_model(override: Optional[str]) -> str:
         return override or args.model or "llama3.1:8b"
@@ -211,6 +305,7 @@ def main() -> int:
             dry_run=args.dry_run,
             schema=schema,
             ollama=ollama,
+            refresh_cache=args.refresh_cache,
         )
         for profile in profiles
     ]
@@ -227,36 +322,44 @@ def main() -> int:
         "context": {"environment": "development", "urgency": "soon"},
     }
 
-    intent_msg = make_intent_message(intent=intent, sender=orchestrator.to_dict())
-    ok, errors = schema.validate("intent.schema.json", intent_msg)
-    if not ok:
-        raise ValueError(f"Intent schema errors: {errors}")
+    session = NegotiationSession(schema=schema, issuer=issuer, sender=orchestrator.to_dict())
+    intent_msg = session.declare(intent)
     jprint("SEND -> INTENT_DECLARATION (orchestrator -> broadcast)", intent_msg)
 
-    cap_msgs: List[Dict[str, Any]] = []
-    capability_records: List[Dict[str, Any]] = []
-    for ag in agents:
-        cap_msg = ag.capability_message(intent_msg["message_id"])
-        cap_msgs.append(cap_msg)
-        capability_records.extend(cap_msg["capabilities"])
-        jprint(f"RECV <- CAPABILITY_DISCLOSURE ({ag.responder.id} -> orchestrator)", cap_msg)
+    # All agents are asked at once; one that misses the deadline is simply not a candidate.
+    agents_by_id = {ag.responder.id: ag for ag in agents}
+    disclosures = session.gather(
+        {agent_id: ag.capability_message for agent_id, ag in agents_by_id.items()},
+        deadline_s=args.disclosure_deadline,
+        quorum=1,
+    )
+    cap_msgs = disclosures.messages
+    index: CapabilityIndex[ICNPAgent] = CapabilityIndex()
+    for agent_id, cap_msg in disclosures.received.items():
+        index.add_disclosure(agents_by_id[agent_id], cap_msg)
+        jprint(f"RECV <- CAPABILITY_DISCLOSURE ({agent_id} -> orchestrator)", cap_msg)
+    for agent_id in disclosures.late:
+        print(f"No capability disclosure from {agent_id} within {args.disclosure_deadline}s")
+    for agent_id, exc in disclosures.failed.items():
+        print(f"Capability disclosure from {agent_id} failed: {exc}")
 
     required_action = "transform"
     required_scope = "text"
-    matches, _ = match_capability(agents, required_action=required_action, required_scope=required_scope)
-    if len(matches) != 1:
+    matches = {ag.responder.id: ag for ag in index.match(required_action, required_scope)}
+    ranked = CapabilityRanker(cap_msgs).top_k(intent, 3, action=required_action, scope=required_scope)
+    if not ranked:
         raise ValueError(
-            f"Expected exactly one agent matching action '{required_action}' and scope '{required_scope}', "
-            f"found {len(matches)}."
+            f"No agent matches action '{required_action}' and scope '{required_scope}'."
         )
-    selected_agent = matches[0]
+    selected_agent = matches[ranked[0].responder_id]
 
     print("\n" + "#" * 90)
     print("CAPABILITY MATCH")
     print("#" * 90)
+    for rc in ranked:
+        print(f"Candidate {rc.responder_id}: score={rc.score:.3f}")
     print(f"Selected agent: {selected_agent.responder.id}")
 
-    contract_id = new_uuid()
     agreed_actions = [
         {
             "capability_id": selected_agent.capability.capability_id,
@@ -275,56 +378,22 @@ def main() -> int:
         {"action": "delete", "scope": "any", "reason": "Safety"},
     ]
 
-    contract_obj = make_contract_message(
-        contract_id=contract_id,
+    contract_obj = session.propose(
         agreed_actions=agreed_actions,
         execution_constraints=execution_constraints,
         forbidden_actions=forbidden_actions,
         signatures={"initiator": "demo-signature", "responder": "demo-signature"},
     )
-    ok, errors = schema.validate("contract.schema.json", contract_obj)
-    if not ok:
-        raise ValueError(f"Contract schema errors: {errors}")
     jprint("SEND -> CONTRACT_NEGOTIATION (orchestrator -> translator)", contract_obj)
 
     agreed_capabilities = [
-        cap for cap in capability_records if cap["id"] == selected_agent.capability.capability_id
+        cap for cap in disclosures.capabilities if cap["id"] == selected_agent.capability.capability_id
     ]
-    binding = make_binding_hashes(intent_msg["intent"], contract_obj, agreed_capabilities)
-
-    not_before = datetime.now(timezone.utc).replace(microsecond=0)
-    not_after = not_before + timedelta(minutes=10)
-    validity = {
-        "not_before": not_before.isoformat().replace("+00:00", "Z"),
-        "not_after": not_after.isoformat().replace("+00:00", "Z"),
-        "max_invocations": 1,
-    }
-    enforcement = {"mode": "strict", "violation_action": "abort_and_rollback", "alert_on_violation": True}
-
-    token_id = new_uuid()
-    token_body = {
-        "token_id": token_id,
-        "contract_id": contract_id,
-        "validity": validity,
-        "binding": binding,
-        "enforcement": enforcement,
-    }
-    token_signature = sign_token_hmac(token_body, secret=secret)
-    token = make_demo_token(token_body, secret=secret)
-    token_msg = make_execution_token_message(
-        token_id=token_id,
-        contract_id=contract_id,
-        token=token,
-        validity=validity,
-        binding=binding,
-        enforcement=enforcement,
-    )
-    ok, errors = schema.validate("execution-token.schema.json", token_msg)
-    if not ok:
-        raise ValueError(f"Token schema errors: {errors}")
-    jprint("SEND -> EXECUTION_TOKEN (issuer -> translator)", token_msg)
+    grant = session.issue_token(agreed_capabilities, ttl_s=600, max_invocations=1)
+    jprint("SEND -> EXECUTION_TOKEN (issuer -> translator)", grant.message)
 
-    token_meta = {"body": token_body, "signature": token_signature}
+    token_meta = grant.token_meta()
+    compiled_contract = CompiledContract.from_message(contract_obj)
 
     source_text = (
         "The verification team will review the model tomorrow. "
@@ -339,8 +408,11 @@ def main() -> int:
     result = selected_agent.verify_and_execute(
         parameters=params,
         token_meta=token_meta,
-        contract_obj=contract_obj,
+        contract_obj=compiled_contract,
+        on_chunk=on_chunk,
     )
+    if on_chunk is not None:
+        print()
     jprint(f"EXECUTION_RESULT ({selected_agent.responder.id})", result)
 
     print("\n" + "#" * 90)
@@ -349,6 +421,10 @@ def main() -> int:
     if result.get("status") == "success":
         print(result["output"].get("text", ""))
 
+    if cache is not None:
+        print(f"\nResponse cache: {cache.stats()}")
+        cache.close()
+
     return 0
 
 
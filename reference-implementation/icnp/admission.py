@@ -0,0 +1,225 @@
+"""Priority admission control for agent executions.
+
+Work is ordered by what the intent and contract say about it: the most
+important goal's ``priority``, the intent's ``context.urgency`` and the
+contract's ``max_duration_seconds`` (shorter work first among equals). Lower
+scores run first. Waiting work gains ``aging_per_s`` priority levels per second,
+so low-priority work still runs under a steady stream of critical work; since
+every queued item ages at the same rate, the order is fixed when an item is
+queued and a plain heap suffices.
+
+When ``max_depth`` items are waiting, new work is refused with an ICNP-003
+error, unless it outranks the lowest-ranked waiting item, which is shed in its
+place.
+"""
+from __future__ import annotations
+
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Mapping, Optional
+
+from .negotiation import NegotiationError
+
+PRIORITY_LEVELS: Dict[str, float] = {"critical": 0.0, "high": 1.0, "medium": 2.0, "low": 3.0}
+URGENCY_LEVELS: Dict[str, float] = {"immediate": 0.0, "soon": 0.5, "scheduled": 1.0, "background": 2.0}
+
+
+def priority_score(
+    intent: Mapping[str, Any],
+    contract: Optional[Mapping[str, Any]] = None,
+    *,
+    duration_scale_s: float = 3600.0,
+) -> float:
+    """Scheduling score for work under ``intent`` (the intent body) and ``contract``; lower runs first.
+
+    Goal priority counts one level per step, urgency half a level per step and
+    ``max_duration_seconds`` one level per ``duration_scale_s``. Intents without
+    goals or urgency count as ``medium`` / ``soon``.
+    """
+    goals = intent.get("goals") or []
+    goal = min((PRIORITY_LEVELS.get(g.get("priority"), 2.0) for g in goals), default=2.0)
+    urgency = URGENCY_LEVELS.get((intent.get("context") or {}).get("urgency"), 0.5)
+    duration = 0.0
+    if contract is not None:
+        max_duration = (contract.get("execution_constraints") or {}).get("max_duration_seconds")
+        if max_duration is not None:
+            duration = float(max_duration) / duration_scale_s
+    return goal + urgency + duration
+
+
+class AdmissionRefused(NegotiationError):
+    """Work was not admitted (or was shed) because the queue is full."""
+
+    def __init__(self, message: str, *, queue_depth: int, max_depth: int, score: float):
+        super().__init__("ICNP-003", message)
+        self.reason = message
+        self.queue_depth = queue_depth
+        self.max_depth = max_depth
+        self.score = score
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "status": "refused",
+            "error": {
+                "code": self.code,
+                "message": self.reason,
+                "queue_depth": self.queue_depth,
+                "max_depth": self.max_depth,
+                "priority_score": round(self.score, 3),
+            },
+        }
+
+
+@dataclass(order=True)
+class _Item:
+    key: float
+    seq: int
+    score: float = field(compare=False)
+    enqueued_s: float = field(compare=False)
+    fn: Callable[[], Any] = field(compare=False)
+    future: Future = field(compare=False)
+
+
+@dataclass
+class AdmissionStats:
+    admitted: int = 0
+    refused: int = 0
+    shed: int = 0
+    completed: int = 0
+    failed: int = 0
+    max_depth_seen: int = 0
+    max_wait_s: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.__dict__)
+
+
+class AdmissionQueue:
+    """Bounded priority queue of executions, run by ``workers`` threads.
+
+    ``submit`` returns a :class:`~concurrent.futures.Future` for the result of
+    ``fn()``; it raises :class:`AdmissionRefused` when the work is not admitted,
+    and a future whose work is shed later fails with the same error.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_depth: int = 64,
+        workers: int = 1,
+        aging_per_s: float = 1 / 60,
+        duration_scale_s: float = 3600.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if max_depth < 1 or workers < 1:
+            raise ValueError("max_depth and workers must be at least 1")
+        if aging_per_s < 0:
+            raise ValueError("aging_per_s must not be negative")
+        self.max_depth = max_depth
+        self.aging_per_s = aging_per_s
+        self.duration_scale_s = duration_scale_s
+        self.stats = AdmissionStats()
+        self._clock = clock
+        self._heap: List[_Item] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._threads = [
+            threading.Thread(target=self._work, name=f"icnp-admission-{i}", daemon=True) for i in range(workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._heap)
+
+    @property
+    def depth(self) -> int:
+        return len(self)
+
+    def __enter__(self) -> "AdmissionQueue":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.shutdown()
+
+    def submit(
+        self,
+        fn: Callable[[], Any],
+        *,
+        intent: Mapping[str, Any],
+        contract: Optional[Mapping[str, Any]] = None,
+    ) -> Future:
+        score = priority_score(intent, contract, duration_scale_s=self.duration_scale_s)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("AdmissionQueue is shut down")
+            now = self._clock()
+            # Ordering by score - aging * (now - enqueued) at any later time is
+            # the same as ordering by score + aging * enqueued.
+            item = _Item(score + self.aging_per_s * now, next(self._seq), score, now, fn, Future())
+            if len(self._heap) >= self.max_depth:
+                worst = max(range(len(self._heap)), key=self._heap.__getitem__)
+                if self._heap[worst] <= item:
+                    self.stats.refused += 1
+                    raise AdmissionRefused(
+                        f"Admission queue full ({len(self._heap)} waiting); work not admitted",
+                        queue_depth=len(self._heap),
+                        max_depth=self.max_depth,
+                        score=score,
+                    )
+                victim = self._heap[worst]
+                self._heap[worst] = self._heap[-1]
+                self._heap.pop()
+                heapq.heapify(self._heap)
+                self.stats.shed += 1
+                if not victim.future.cancelled():
+                    victim.future.set_exception(
+                        AdmissionRefused(
+                            "Shed from a full admission queue for higher-priority work",
+                            queue_depth=len(self._heap) + 1,
+                            max_depth=self.max_depth,
+                            score=victim.score,
+                        )
+                    )
+            heapq.heappush(self._heap, item)
+            self.stats.admitted += 1
+            self.stats.max_depth_seen = max(self.stats.max_depth_seen, len(self._heap))
+            self._cond.notify()
+        return item.future
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                while not self._heap and not self._closed:
+                    self._cond.wait()
+                if not self._heap:
+                    return
+                item = heapq.heappop(self._heap)
+                self.stats.max_wait_s = max(self.stats.max_wait_s, self._clock() - item.enqueued_s)
+            if not item.future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = item.fn()
+            except BaseException as e:
+                item.future.set_exception(e)
+                with self._cond:
+                    self.stats.failed += 1
+            else:
+                item.future.set_result(result)
+                with self._cond:
+                    self.stats.completed += 1
+
+    def shutdown(self, *, wait: bool = True) -> None:
+        """Stop accepting work; queued work still runs."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if wait:
+            for t in self._threads:
+                t.join()
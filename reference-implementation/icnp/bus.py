@@ -0,0 +1,465 @@
+"""Asyncio publish/subscribe bus for ICNP phase messages.
+
+Subscribers filter on ``phase`` and on the addressing fields the protocol
+already has: ``message_id`` (intents), ``in_reply_to`` (capability
+disclosures) and ``contract_id`` (contracts and tokens). Each subscriber gets
+a bounded queue, so a slow agent either pushes back on the publisher
+(``overflow="block"``) or loses messages it could not keep up with
+(``overflow="drop"``) instead of growing without limit.
+
+A broadcast is delivered in one pass: subscribers with room are filled
+without awaiting, and :meth:`MessageBus.publish_batch` hands each subscriber
+its share of a batch in a single wake-up.
+
+Messages travel through a :class:`Transport`. :class:`InProcessTransport`
+passes objects straight to the local subscribers; :class:`SocketTransport`
+sends length-prefixed canonical JSON frames to a :class:`SocketHub` over a
+Unix or TCP socket, so agents can move into separate processes without
+changing how they publish or subscribe.
+"""
+from __future__ import annotations
+
+import abc
+import asyncio
+import json
+import struct
+from collections import deque
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+from .runtime import PHASE_SCHEMAS, as_message_dict, canonical_json_bytes
+
+Deliver = Callable[[List[Any]], Awaitable[None]]
+Address = Union[str, Tuple[str, int]]
+
+_FRAME = struct.Struct(">I")
+MAX_FRAME_BYTES = 16 * 1024 * 1024
+
+
+class BusClosed(RuntimeError):
+    """The bus or subscription was closed."""
+
+
+class Subscription:
+    """Bounded queue of the messages matching one subscriber's filter."""
+
+    def __init__(
+        self,
+        bus: "MessageBus",
+        *,
+        phases: Optional[Iterable[str]] = None,
+        message_id: Optional[str] = None,
+        in_reply_to: Optional[str] = None,
+        contract_id: Optional[str] = None,
+        maxsize: int = 256,
+        overflow: str = "block",
+    ):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        if overflow not in ("block", "drop"):
+            raise ValueError("overflow must be 'block' or 'drop'")
+        self.phases = frozenset(phases) if phases is not None else None
+        unknown = (self.phases or frozenset()) - set(PHASE_SCHEMAS)
+        if unknown:
+            raise ValueError(f"Unknown ICNP phases: {sorted(unknown)}")
+        self.message_id = message_id
+        self.in_reply_to = in_reply_to
+        self.contract_id = contract_id
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.delivered = 0
+        self.dropped = 0
+        self._bus = bus
+        self._buf: Deque[Any] = deque()
+        self._closed = False
+        self._readable = asyncio.Event()
+        self._writable = asyncio.Event()
+        self._writable.set()
+
+        # Fields to compare beyond the phase, as (index into _route(), value).
+        self._checks = tuple(
+            (i, value) for i, value in enumerate((message_id, in_reply_to, contract_id), 1) if value is not None
+        )
+
+    def matches(self, msg: Any) -> bool:
+        return self._accepts(_route(msg))
+
+    def _accepts(self, route: Tuple[Any, ...]) -> bool:
+        if self.phases is not None and route[0] not in self.phases:
+            return False
+        for i, value in self._checks:
+            if route[i] != value:
+                return False
+        return True
+
+    def qsize(self) -> int:
+        return len(self._buf)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def _offer(self, msgs: List[Any]) -> List[Any]:
+        """Queue what fits without waiting; returns the rest (empty when dropping)."""
+        buf = self._buf
+        room = self.maxsize - len(buf)
+        if room >= len(msgs):
+            taken, rest = msgs, []
+        else:
+            taken, rest = msgs[: max(room, 0)], msgs[max(room, 0) :]
+        if taken:
+            buf.extend(taken)
+            self.delivered += len(taken)
+            if not self._readable.is_set():
+                self._readable.set()
+        if len(buf) >= self.maxsize:
+            self._writable.clear()
+        if rest and self.overflow == "drop":
+            self.dropped += len(rest)
+            return []
+        return rest
+
+    async def _put(self, msgs: List[Any]) -> None:
+        while msgs and not self._closed:
+            await self._writable.wait()
+            msgs = self._offer(msgs)
+
+    def _taken(self) -> None:
+        if not self._buf:
+            self._readable.clear()
+        self._writable.set()
+
+    async def get(self) -> Any:
+        """Next message; raises :class:`BusClosed` once closed and drained."""
+        while not self._buf:
+            if self._closed:
+                raise BusClosed("Subscription closed")
+            await self._readable.wait()
+        msg = self._buf.popleft()
+        self._taken()
+        return msg
+
+    async def get_batch(self, max_items: Optional[int] = None) -> List[Any]:
+        """Wait for at least one message, then return everything queued (up to ``max_items``)."""
+        while not self._buf:
+            if self._closed:
+                raise BusClosed("Subscription closed")
+            await self._readable.wait()
+        n = len(self._buf) if max_items is None else min(max_items, len(self._buf))
+        batch = [self._buf.popleft() for _ in range(n)]
+        self._taken()
+        return batch
+
+    def get_nowait(self) -> Any:
+        if not self._buf:
+            raise BusClosed("Subscription closed") if self._closed else asyncio.QueueEmpty()
+        msg = self._buf.popleft()
+        self._taken()
+        return msg
+
+    def close(self) -> None:
+        """Stop receiving; queued messages can still be read."""
+        self._closed = True
+        self._readable.set()
+        self._writable.set()
+        self._bus._discard(self)
+
+    def __aiter__(self) -> AsyncIterator[Any]:
+        return self._iter()
+
+    async def _iter(self) -> AsyncIterator[Any]:
+        while True:
+            try:
+                yield await self.get()
+            except BusClosed:
+                return
+
+
+def _route(msg: Any) -> Tuple[Any, ...]:
+    get = msg.get
+    return get("phase"), get("message_id"), get("in_reply_to"), get("contract_id")
+
+
+class Transport(abc.ABC):
+    """Carries published batches to every bus attached to it, including the sender's."""
+
+    @abc.abstractmethod
+    async def start(self, deliver: Deliver) -> None:
+        ...
+
+    @abc.abstractmethod
+    async def send(self, batch: List[Any]) -> None:
+        ...
+
+    async def close(self) -> None:
+        pass
+
+
+class InProcessTransport(Transport):
+    """Hands message objects straight to the local bus; nothing is serialised."""
+
+    def __init__(self) -> None:
+        self._deliver: Optional[Deliver] = None
+
+    async def start(self, deliver: Deliver) -> None:
+        self._deliver = deliver
+
+    async def send(self, batch: List[Any]) -> None:
+        if self._deliver is None:
+            raise BusClosed("Transport not started")
+        await self._deliver(batch)
+
+
+def encode_frame(batch: List[Any]) -> bytes:
+    body = canonical_json_bytes([as_message_dict(m) for m in batch])
+    if len(body) > MAX_FRAME_BYTES:
+        raise ValueError(f"Batch of {len(body)} bytes exceeds the {MAX_FRAME_BYTES}-byte frame limit")
+    return _FRAME.pack(len(body)) + body
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Optional[bytes]:
+    """Next frame body, or None at a clean end of stream."""
+    try:
+        header = await reader.readexactly(_FRAME.size)
+    except asyncio.IncompleteReadError as e:
+        if e.partial:
+            raise ValueError("Truncated frame header") from None
+        return None
+    (size,) = _FRAME.unpack(header)
+    if size > MAX_FRAME_BYTES:
+        raise ValueError(f"Frame of {size} bytes exceeds the {MAX_FRAME_BYTES}-byte limit")
+    return await reader.readexactly(size)
+
+
+async def _open(address: Address) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    if isinstance(address, str):
+        return await asyncio.open_unix_connection(address)
+    host, port = address
+    return await asyncio.open_connection(host, port)
+
+
+class SocketHub:
+    """Relays every frame it receives to all connected :class:`SocketTransport` clients.
+
+    ``address`` is a Unix socket path, or ``(host, port)`` for TCP (port 0
+    picks a free port; read it back from :attr:`address` after :meth:`start`).
+    """
+
+    def __init__(self, address: Address):
+        self.address = address
+        self.frames = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._clients: Set[asyncio.StreamWriter] = set()
+
+    async def start(self) -> "SocketHub":
+        if isinstance(self.address, str):
+            self._server = await asyncio.start_unix_server(self._serve, path=self.address)
+        else:
+            host, port = self.address
+            self._server = await asyncio.start_server(self._serve, host, port)
+            self.address = self._server.sockets[0].getsockname()[:2]
+        return self
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._clients.add(writer)
+        try:
+            while True:
+                body = await read_frame(reader)
+                if body is None:
+                    break
+                self.frames += 1
+                frame = _FRAME.pack(len(body)) + body
+                for client in list(self._clients):
+                    client.write(frame)
+                # Back-pressure: a slow client slows down the publisher, not the hub's memory.
+                await asyncio.gather(*(c.drain() for c in list(self._clients)), return_exceptions=True)
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._clients.discard(writer)
+            writer.close()
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._clients):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+
+
+class SocketTransport(Transport):
+    """Publishes through a :class:`SocketHub`; messages arrive as plain dicts."""
+
+    def __init__(self, address: Address):
+        self.address = address
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+
+    async def start(self, deliver: Deliver) -> None:
+        reader, self._writer = await _open(self.address)
+        self._reader_task = asyncio.create_task(self._read(reader, deliver))
+
+    async def _read(self, reader: asyncio.StreamReader, deliver: Deliver) -> None:
+        while True:
+            body = await read_frame(reader)
+            if body is None:
+                return
+            await deliver(json.loads(body))
+
+    async def send(self, batch: List[Any]) -> None:
+        if self._writer is None:
+            raise BusClosed("Transport not started")
+        self._writer.write(encode_frame(batch))
+        await self._writer.drain()
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            try:
+                await self._reader_task
+            except (asyncio.CancelledError, ConnectionError):
+                pass
+            self._reader_task = None
+
+
+class MessageBus:
+    """Routes ICNP messages (dicts or :mod:`icnp.messages` objects) to subscribers.
+
+    Use as ``async with MessageBus() as bus:`` or call :meth:`start` and
+    :meth:`close` yourself.
+    """
+
+    def __init__(
+        self,
+        transport: Optional[Transport] = None,
+        *,
+        maxsize: int = 256,
+        overflow: str = "block",
+    ):
+        self.transport = transport or InProcessTransport()
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.published = 0
+        self._by_phase: Dict[Optional[str], List[Subscription]] = {}
+        self._started = False
+        self._closed = False
+
+    async def start(self) -> "MessageBus":
+        if not self._started:
+            await self.transport.start(self._deliver)
+            self._started = True
+        return self
+
+    async def __aenter__(self) -> "MessageBus":
+        return await self.start()
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.close()
+
+    def subscribe(
+        self,
+        *,
+        phases: Optional[Iterable[str]] = None,
+        message_id: Optional[str] = None,
+        in_reply_to: Optional[str] = None,
+        contract_id: Optional[str] = None,
+        maxsize: Optional[int] = None,
+        overflow: Optional[str] = None,
+    ) -> Subscription:
+        """Receive messages matching every given field; omitted fields match anything."""
+        if self._closed:
+            raise BusClosed("Bus closed")
+        sub = Subscription(
+            self,
+            phases=phases,
+            message_id=message_id,
+            in_reply_to=in_reply_to,
+            contract_id=contract_id,
+            maxsize=self.maxsize if maxsize is None else maxsize,
+            overflow=overflow or self.overflow,
+        )
+        for phase in sub.phases if sub.phases is not None else (None,):
+            self._by_phase.setdefault(phase, []).append(sub)
+        return sub
+
+    def _discard(self, sub: Subscription) -> None:
+        for subs in self._by_phase.values():
+            if sub in subs:
+                subs.remove(sub)
+
+    @property
+    def subscriptions(self) -> List[Subscription]:
+        seen: Dict[int, Subscription] = {}
+        for subs in self._by_phase.values():
+            for sub in subs:
+                seen.setdefault(id(sub), sub)
+        return list(seen.values())
+
+    async def publish(self, message: Any) -> None:
+        await self.publish_batch([message])
+
+    async def publish_batch(self, messages: Iterable[Any]) -> None:
+        """Publish several messages; each subscriber receives its share in one wake-up."""
+        if self._closed:
+            raise BusClosed("Bus closed")
+        if not self._started:
+            await self.start()
+        batch = list(messages)
+        for msg in batch:
+            if msg.get("phase") not in PHASE_SCHEMAS:
+                raise ValueError(f"Unknown ICNP phase: {msg.get('phase')!r}")
+        if batch:
+            self.published += len(batch)
+            await self.transport.send(batch)
+
+    async def _deliver(self, batch: List[Any]) -> None:
+        by_phase = self._by_phase
+        wildcard = by_phase.get(None, [])
+        waiting = []
+        if len(batch) == 1:
+            route = _route(batch[0])
+            for subs in (by_phase.get(route[0], ()), wildcard):
+                for sub in subs:
+                    if sub._accepts(route):
+                        rest = sub._offer(batch)
+                        if rest:
+                            waiting.append(sub._put(rest))
+        else:
+            shares: Dict[Subscription, List[Any]] = {}
+            for msg in batch:
+                route = _route(msg)
+                for subs in (by_phase.get(route[0], ()), wildcard):
+                    for sub in subs:
+                        if sub._accepts(route):
+                            shares.setdefault(sub, []).append(msg)
+            # Fill everyone with room first; only full subscribers are awaited, concurrently.
+            for sub, msgs in shares.items():
+                rest = sub._offer(msgs)
+                if rest:
+                    waiting.append(sub._put(rest))
+        if waiting:
+            await asyncio.gather(*waiting)
+
+    async def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        for sub in self.subscriptions:
+            sub.close()
+        await self.transport.close()
@@ -0,0 +1,97 @@
+"""Inverted index from (action, scope) to the agents disclosing that capability."""
+from __future__ import annotations
+
+from typing import Any, Dict, Generic, Hashable, Iterable, List, Tuple, TypeVar
+
+Owner = TypeVar("Owner", bound=Hashable)
+
+
+def capability_scopes(capability: Dict[str, Any]) -> Tuple[str, ...]:
+    """Normalise ``scope`` (string or array per capability.schema.json) to a tuple."""
+    scope = capability["scope"]
+    if isinstance(scope, str):
+        return (scope,)
+    return tuple(dict.fromkeys(scope))
+
+
+class CapabilityIndex(Generic[Owner]):
+    """Indexes capability records by (action, scope) for O(1) lookup.
+
+    Owners are whatever identifies a responder (an agent object, a responder id);
+    they must be hashable. Capability ids are only unique per responder, so each
+    record is keyed by ``(owner, id)`` and can be added or removed incrementally
+    as agents join or leave.
+    """
+
+    def __init__(self) -> None:
+        # Dicts double as insertion-ordered sets so results follow join order.
+        self._owners: Dict[Owner, Dict[str, None]] = {}
+        self._capabilities: Dict[Tuple[Owner, str], Dict[str, Any]] = {}
+        self._by_pair: Dict[Tuple[str, str], Dict[Owner, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._capabilities)
+
+    def __contains__(self, key: object) -> bool:
+        """Whether ``(owner, capability_id)`` is indexed."""
+        return key in self._capabilities
+
+    @property
+    def owners(self) -> List[Owner]:
+        return list(self._owners)
+
+    def add(self, owner: Owner, capability: Dict[str, Any]) -> None:
+        capability_id = capability["id"]
+        if (owner, capability_id) in self._capabilities:
+            self.remove(owner, capability_id)
+        self._capabilities[(owner, capability_id)] = capability
+        self._owners.setdefault(owner, {})[capability_id] = None
+        for scope in capability_scopes(capability):
+            # Count per owner: one agent may disclose the same pair twice.
+            owners = self._by_pair.setdefault((capability["action"], scope), {})
+            owners[owner] = owners.get(owner, 0) + 1
+
+    def add_disclosure(self, owner: Owner, capability_msg: Dict[str, Any]) -> None:
+        """Index every capability in a ``capability_disclosure`` message."""
+        self._owners.setdefault(owner, {})
+        for cap in capability_msg["capabilities"]:
+            self.add(owner, cap)
+
+    def remove(self, owner: Owner, capability_id: str) -> None:
+        capability = self._capabilities.pop((owner, capability_id))
+        del self._owners[owner][capability_id]
+        for scope in capability_scopes(capability):
+            pair = (capability["action"], scope)
+            owners = self._by_pair[pair]
+            owners[owner] -= 1
+            if owners[owner] == 0:
+                del owners[owner]
+                if not owners:
+                    del self._by_pair[pair]
+
+    def remove_owner(self, owner: Owner) -> None:
+        """Drop an agent and all capabilities it disclosed."""
+        for capability_id in list(self._owners.get(owner, ())):
+            self.remove(owner, capability_id)
+        self._owners.pop(owner, None)
+
+    def match(self, action: str, scope: str) -> List[Owner]:
+        """Owners with a capability for ``(action, scope)``, in join order."""
+        return list(self._by_pair.get((action, scope), ()))
+
+    def partition(self, action: str, scope: str) -> Tuple[List[Owner], List[Owner]]:
+        """Split all owners into ``(matches, non_matches)`` in a single linear pass."""
+        matched = self._by_pair.get((action, scope), {})
+        matches: List[Owner] = []
+        non_matches: List[Owner] = []
+        for owner in self._owners:
+            (matches if owner in matched else non_matches).append(owner)
+        return matches, non_matches
+
+    def capabilities(self, action: str, scope: str) -> Iterable[Dict[str, Any]]:
+        """Capability records matching ``(action, scope)``."""
+        for owner in self._by_pair.get((action, scope), ()):
+            for capability_id in self._owners[owner]:
+                cap = self._capabilities[(owner, capability_id)]
+                if cap["action"] == action and scope in capability_scopes(cap):
+                    yield cap
@@ -0,0 +1,81 @@
+"""Contracts compiled once into constant-time permission checks."""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Dict, FrozenSet, Iterable, Mapping, Optional, Tuple, Union
+
+# Wildcards accepted in forbidden_actions entries.
+ANY = frozenset({"any", "*"})
+
+
+@dataclass(frozen=True)
+class CompiledContract:
+    """Read-only view of a ``contract_negotiation`` message built for fast checks.
+
+    Approved capability ids are a frozenset, per-capability ``max_invocations``
+    a mapping, and forbidden actions are indexed by ``(action, scope)`` with
+    ``"any"``/``"*"`` wildcards, so each check is a handful of hash lookups
+    regardless of contract size.
+    """
+
+    contract_id: str
+    approved: FrozenSet[str]
+    max_invocations: Mapping[str, int]
+    forbidden: Mapping[Tuple[str, str], str] = field(default_factory=dict)
+
+    @classmethod
+    def from_message(cls, contract_msg: Dict[str, Any]) -> "CompiledContract":
+        approved = set()
+        limits: Dict[str, int] = {}
+        for aa in contract_msg["agreed_actions"]:
+            if aa.get("approved") is not True:
+                continue
+            approved.add(aa["capability_id"])
+            if "max_invocations" in aa:
+                cap_id = aa["capability_id"]
+                limits[cap_id] = max(limits.get(cap_id, 0), aa["max_invocations"])
+
+        forbidden: Dict[Tuple[str, str], str] = {}
+        for fa in contract_msg.get("forbidden_actions", []):
+            action = "*" if fa["action"] in ANY else fa["action"]
+            scope = "*" if fa["scope"] in ANY else fa["scope"]
+            forbidden.setdefault((action, scope), fa.get("reason", ""))
+
+        return cls(
+            contract_id=contract_msg["contract_id"],
+            approved=frozenset(approved),
+            max_invocations=MappingProxyType(limits),
+            forbidden=MappingProxyType(forbidden),
+        )
+
+    def is_approved(self, capability_id: str) -> bool:
+        return capability_id in self.approved
+
+    def invocation_limit(self, capability_id: str) -> Optional[int]:
+        return self.max_invocations.get(capability_id)
+
+    def forbidden_reason(self, action: str, scope: Union[str, Iterable[str]]) -> Optional[str]:
+        """Reason from the matching forbidden_actions entry, or None if allowed."""
+        scopes = (scope,) if isinstance(scope, str) else tuple(scope)
+        for s in scopes:
+            for key in ((action, s), (action, "*"), ("*", s), ("*", "*")):
+                reason = self.forbidden.get(key)
+                if reason is not None:
+                    return reason
+        return None
+
+    def denial(self, capability_id: str, action: str, scope: Union[str, Iterable[str]]) -> Optional[str]:
+        """Error message if the capability may not run under this contract, else None."""
+        if capability_id not in self.approved:
+            return "Capability not approved in contract"
+        reason = self.forbidden_reason(action, scope)
+        if reason is not None:
+            return f"Action forbidden by contract: {reason}" if reason else "Action forbidden by contract"
+        return None
+
+
+def compile_contract(contract: Union[Dict[str, Any], CompiledContract]) -> CompiledContract:
+    if isinstance(contract, CompiledContract):
+        return contract
+    return CompiledContract.from_message(contract)
@@ -0,0 +1,123 @@
+"""Memoised ``sha256:`` digests of message fragments bound into tokens.
+
+Capability records, intents and contracts are often bound into many execution
+tokens unchanged. Freeze them once with :func:`freeze` and :class:`DigestCache`
+remembers their digests, keyed by identity: a frozen fragment cannot change, so
+a repeat binding is a dict lookup instead of canonical JSON plus SHA-256.
+
+Plain dicts and lists are hashed on every call. Keying them structurally (a
+hashable copy of their contents) was measured to cost as much as serialising
+them, so there is nothing to gain from caching them.
+"""
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, NoReturn, Tuple
+
+from .runtime import sha256_hex
+
+
+def _immutable(self: Any, *args: Any, **kwargs: Any) -> NoReturn:
+    raise TypeError(f"{type(self).__name__} is immutable")
+
+
+class FrozenDict(dict):
+    """A ``dict`` that cannot be modified; nested values are frozen on construction.
+
+    It stays a ``dict`` subclass so schema validation, ``.get`` and canonical
+    JSON treat it exactly like the message it was built from.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        dict.__init__(self, ((k, freeze(v)) for k, v in dict(*args, **kwargs).items()))
+
+    __setitem__ = __delitem__ = _immutable
+    clear = pop = popitem = setdefault = update = __ior__ = _immutable
+
+    def __copy__(self) -> "FrozenDict":
+        return self
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> "FrozenDict":
+        return self
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        return (FrozenDict, (dict(self),))
+
+
+class FrozenList(list):
+    """A ``list`` that cannot be modified; items are frozen on construction."""
+
+    __slots__ = ()
+
+    def __init__(self, items: Iterable[Any] = ()):
+        list.__init__(self, (freeze(v) for v in items))
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _immutable
+    append = extend = insert = pop = remove = clear = sort = reverse = _immutable
+
+    def __copy__(self) -> "FrozenList":
+        return self
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> "FrozenList":
+        return self
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        return (FrozenList, (list(self),))
+
+
+def freeze(obj: Any) -> Any:
+    """Deep, immutable copy of a JSON-like value (already-frozen parts are reused)."""
+    if isinstance(obj, (FrozenDict, FrozenList)):
+        return obj
+    if isinstance(obj, dict):
+        return FrozenDict(obj)
+    if isinstance(obj, (list, tuple)):
+        return FrozenList(obj)
+    return obj
+
+
+class DigestCache:
+    """LRU cache of ``sha256:<hex>`` digests of frozen fragments.
+
+    Each entry holds a reference to its fragment, so the id it is keyed by
+    cannot be reused by another object while the entry is cached.
+    """
+
+    def __init__(self, *, max_entries: int = 4096):
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self._max_entries = max_entries
+        self._entries: "OrderedDict[int, Tuple[Any, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def digest(self, obj: Any) -> str:
+        if not isinstance(obj, (FrozenDict, FrozenList)):
+            return f"sha256:{sha256_hex(obj)}"
+        key = id(obj)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        digest = f"sha256:{sha256_hex(obj)}"
+        with self._lock:
+            self._entries[key] = (obj, digest)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return digest
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,291 @@
+"""Invocation ledgers enforcing ``validity.max_invocations`` per execution token.
+
+:class:`InvocationLedger` is process-local. When an agent runs as several
+worker processes, share one of the cross-process backends instead:
+:class:`SQLiteInvocationLedger` (durable, WAL mode) or
+:class:`SharedMemoryInvocationLedger` (in-memory, same host). Both reserve
+invocations from the shared counter in leases of several at a time, so the
+shared limit is never exceeded while hot tokens with large ``max_invocations``
+do not pay a cross-process commit per call. By default the lease is an eighth
+of ``max_invocations`` (1 to 64); pass ``lease_size`` to fix it.
+"""
+from __future__ import annotations
+
+import abc
+import hashlib
+import heapq
+import os
+import sqlite3
+import struct
+import multiprocessing
+import threading
+import time
+from multiprocessing import shared_memory
+from multiprocessing.context import BaseContext
+from typing import Any, Callable, Dict, List, Optional, Protocol, Tuple
+
+
+class LedgerBackend(Protocol):
+    def try_acquire(self, token_id: str, *, max_invocations: int, not_after: int) -> bool:
+        ...
+
+
+class InvocationLedger:
+    """Thread-safe per-token invocation counter with expiry at ``not_after``.
+
+    Each token's entry lives in a dict plus a min-heap ordered by ``not_after``;
+    every call first pops entries whose token has expired, so memory tracks the
+    number of live tokens rather than every token ever seen.
+    """
+
+    def __init__(self, *, clock: Callable[[], float] = time.time):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._counts: Dict[str, int] = {}
+        self._expiry: List[Tuple[int, str]] = []
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def _evict(self, now: float) -> int:
+        evicted = 0
+        while self._expiry and self._expiry[0][0] <= now:
+            _, token_id = heapq.heappop(self._expiry)
+            if self._counts.pop(token_id, None) is not None:
+                evicted += 1
+        return evicted
+
+    def try_acquire(self, token_id: str, *, max_invocations: int, not_after: int) -> bool:
+        """Atomically count one invocation; False once ``max_invocations`` is used up."""
+        now = self._clock()
+        with self._lock:
+            self._evict(now)
+            used = self._counts.get(token_id)
+            if used is None:
+                if not_after <= now:
+                    return False
+                heapq.heappush(self._expiry, (not_after, token_id))
+                used = 0
+            if used >= max_invocations:
+                return False
+            self._counts[token_id] = used + 1
+            return True
+
+    def count(self, token_id: str) -> int:
+        with self._lock:
+            return self._counts.get(token_id, 0)
+
+    def evict_expired(self, now: Optional[float] = None) -> int:
+        with self._lock:
+            return self._evict(self._clock() if now is None else now)
+
+
+_MAX_AUTO_LEASE = 64
+
+
+def default_lease_size(max_invocations: int) -> int:
+    """Invocations reserved per round trip when ``lease_size`` is not fixed.
+
+    An eighth of the token's limit, so at most that much is stranded in a
+    process that exits, clamped to 1..64; tokens allowing fewer than 16
+    invocations are reserved one at a time.
+    """
+    return max(1, min(_MAX_AUTO_LEASE, max_invocations // 8))
+
+
+class _LeasedLedger(abc.ABC):
+    """Hands out invocations from per-process leases on a shared counter.
+
+    Subclasses implement :meth:`_reserve`, which atomically moves up to ``want``
+    invocations of a token from the shared pool to this process. Leased but
+    unused invocations are lost when the process exits, which can only
+    under-admit, never over-admit. ``lease_size=None`` sizes each lease with
+    :func:`default_lease_size`.
+    """
+
+    def __init__(self, *, lease_size: Optional[int], clock: Callable[[], float]):
+        if lease_size is not None and lease_size < 1:
+            raise ValueError("lease_size must be at least 1")
+        self.lease_size = lease_size
+        self._clock = clock
+        self._local_lock = threading.Lock()
+        self._leases: Dict[str, Tuple[int, int]] = {}
+
+    @abc.abstractmethod
+    def _reserve(self, token_id: str, want: int, *, max_invocations: int, not_after: int, now: float) -> int:
+        ...
+
+    def try_acquire(self, token_id: str, *, max_invocations: int, not_after: int) -> bool:
+        now = self._clock()
+        if not_after <= now:
+            return False
+        with self._local_lock:
+            remaining, lease_expiry = self._leases.get(token_id, (0, 0))
+            if remaining > 0 and lease_expiry > now:
+                self._leases[token_id] = (remaining - 1, lease_expiry)
+                return True
+            self._leases.pop(token_id, None)
+            if len(self._leases) > 4 * (self.lease_size or _MAX_AUTO_LEASE) + 1024:
+                self._leases = {k: v for k, v in self._leases.items() if v[1] > now}
+            want = self.lease_size or default_lease_size(max_invocations)
+            granted = self._reserve(token_id, want, max_invocations=max_invocations, not_after=not_after, now=now)
+            if granted <= 0:
+                return False
+            if granted > 1:
+                self._leases[token_id] = (granted - 1, not_after)
+            return True
+
+
+class SQLiteInvocationLedger(_LeasedLedger):
+    """Cross-process ledger in a SQLite database using WAL journaling.
+
+    Each reservation is one short ``BEGIN IMMEDIATE`` transaction. With
+    ``synchronous=NORMAL`` a WAL commit does not fsync; the log is synced in
+    batches at checkpoint time, so the write lock is held for microseconds
+    rather than a disk flush. Expired rows are purged every ``purge_every``
+    reservations.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        lease_size: Optional[int] = None,
+        purge_every: int = 1024,
+        clock: Callable[[], float] = time.time,
+    ):
+        super().__init__(lease_size=lease_size, clock=clock)
+        self.path = path
+        self.purge_every = purge_every
+        self._reservations = 0
+        self._pid = os.getpid()
+        self._conn = self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS invocations ("
+            " token_id TEXT PRIMARY KEY, used INTEGER NOT NULL, not_after INTEGER NOT NULL)"
+        )
+        return conn
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Worker processes reopen the database rather than sharing a connection.
+        return {"path": self.path, "lease_size": self.lease_size, "purge_every": self.purge_every}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(state["path"], lease_size=state["lease_size"], purge_every=state["purge_every"])
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def _reserve(self, token_id: str, want: int, *, max_invocations: int, not_after: int, now: float) -> int:
+        if os.getpid() != self._pid:
+            # A forked worker must not reuse the parent's connection.
+            self._pid = os.getpid()
+            self._conn = self._connect()
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT used, not_after FROM invocations WHERE token_id = ?", (token_id,)
+            ).fetchone()
+            used = row[0] if row is not None and row[1] > now else 0
+            granted = min(want, max_invocations - used)
+            if granted > 0:
+                conn.execute(
+                    "INSERT INTO invocations (token_id, used, not_after) VALUES (?, ?, ?)"
+                    " ON CONFLICT(token_id) DO UPDATE SET used = excluded.used, not_after = excluded.not_after",
+                    (token_id, used + granted, not_after),
+                )
+            self._reservations += 1
+            if self._reservations % self.purge_every == 0:
+                conn.execute("DELETE FROM invocations WHERE not_after <= ?", (int(now),))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return granted
+
+
+class SharedMemoryInvocationLedger(_LeasedLedger):
+    """Cross-process ledger in a ``multiprocessing.shared_memory`` hash table.
+
+    Slots hold a 16-byte digest of the token id, ``not_after`` and the used
+    count, with linear probing; slots of expired tokens are reused. A
+    process-shared lock makes each reservation an atomic read-modify-write.
+    Create it in the parent and pass it to worker processes (the lock is
+    inherited at process start); pass ``mp_context`` when the workers use a
+    non-default start method.
+    """
+
+    _SLOT = struct.Struct("<16sqq")
+    _EMPTY = bytes(16)
+
+    def __init__(
+        self,
+        capacity: int = 65536,
+        *,
+        lease_size: Optional[int] = None,
+        clock: Callable[[], float] = time.time,
+        mp_context: Optional[BaseContext] = None,
+        _name: Optional[str] = None,
+        _lock: Any = None,
+    ):
+        super().__init__(lease_size=lease_size, clock=clock)
+        self.capacity = capacity
+        if _name is None:
+            self._shm = shared_memory.SharedMemory(create=True, size=capacity * self._SLOT.size)
+            self._shm.buf[:] = bytes(len(self._shm.buf))
+            self._owner = True
+        else:
+            self._shm = shared_memory.SharedMemory(name=_name)
+            self._owner = False
+        if _lock is None:
+            _lock = (mp_context or multiprocessing.get_context()).Lock()
+        self._lock = _lock
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {"name": self._shm.name, "capacity": self.capacity, "lease_size": self.lease_size, "lock": self._lock}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(
+            state["capacity"], lease_size=state["lease_size"], _name=state["name"], _lock=state["lock"]
+        )
+
+    def close(self) -> None:
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+    def _reserve(self, token_id: str, want: int, *, max_invocations: int, not_after: int, now: float) -> int:
+        key = hashlib.blake2b(token_id.encode("utf-8"), digest_size=16).digest()
+        start = int.from_bytes(key[:8], "little") % self.capacity
+        buf = self._shm.buf
+        size = self._SLOT.size
+        with self._lock:
+            free: Optional[int] = None
+            slot: Optional[int] = None
+            used = 0
+            for probe in range(self.capacity):
+                i = (start + probe) % self.capacity
+                digest, slot_not_after, slot_used = self._SLOT.unpack_from(buf, i * size)
+                if digest == key:
+                    slot = i
+                    used = slot_used if slot_not_after > now else 0
+                    break
+                if digest == self._EMPTY:
+                    slot = free if free is not None else i
+                    break
+                if free is None and slot_not_after <= now:
+                    free = i
+            else:
+                slot = free
+            if slot is None:
+                raise RuntimeError("Shared invocation ledger is full")
+            granted = min(want, max_invocations - used)
+            if granted > 0:
+                self._SLOT.pack_into(buf, slot * size, key, not_after, used + granted)
+        return granted
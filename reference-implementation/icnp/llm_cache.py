@@ -0,0 +1,156 @@
+"""On-disk cache of LLM chat responses.
+
+Responses are stored in SQLite under a content address: the canonical SHA-256
+(:func:`icnp.runtime.sha256_hex`) of the model name and the chat messages, so
+the same system and user prompts sent to the same model hit the same entry in
+every run. Entries older than ``max_age_s`` are treated as misses and removed;
+once the stored text exceeds ``max_bytes`` (or the entry count exceeds
+``max_entries``) the least recently used entries are evicted.
+
+The cache is shared safely by threads in one process and, through SQLite's
+WAL mode, by several processes using the same file.
+"""
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from .runtime import sha256_hex
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+"""
+
+
+def response_key(model: str, messages: List[Dict[str, str]]) -> str:
+    """Cache key for a chat request; stable across runs and processes."""
+    return sha256_hex({"model": model, "messages": messages})
+
+
+class ResponseCache:
+    """SQLite-backed map from (model, messages) to the model's reply."""
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        *,
+        max_entries: Optional[int] = 10_000,
+        max_bytes: Optional[int] = 64 * 1024 * 1024,
+        max_age_s: Optional[float] = 7 * 24 * 3600,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self._clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.stores = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        if str(path) != ":memory:":
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self) -> "ResponseCache":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def get(self, model: str, messages: List[Dict[str, str]]) -> Optional[str]:
+        return self.get_key(response_key(model, messages))
+
+    def get_key(self, key: str) -> Optional[str]:
+        now = self._clock()
+        with self._lock:
+            row = self._db.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.max_age_s is not None and row[1] < now - self.max_age_s:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.evictions += 1
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, model: str, messages: List[Dict[str, str]], response: str) -> str:
+        """Store ``response`` and return its key."""
+        key = response_key(model, messages)
+        now = self._clock()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, len(response.encode("utf-8")), now, now),
+            )
+            self.stores += 1
+            self._evict(now)
+        return key
+
+    def note_bypass(self) -> None:
+        with self._lock:
+            self.bypassed += 1
+
+    def _evict(self, now: float) -> None:
+        db = self._db
+        if self.max_age_s is not None:
+            self.evictions += db.execute(
+                "DELETE FROM responses WHERE created < ?", (now - self.max_age_s,)
+            ).rowcount
+        count, total = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        over_entries = 0 if self.max_entries is None else count - self.max_entries
+        if over_entries <= 0 and (self.max_bytes is None or total <= self.max_bytes):
+            return
+        # Least recently used first, until both limits hold.
+        evict: List[str] = []
+        for key, size in db.execute("SELECT key, size FROM responses ORDER BY last_used"):
+            if over_entries <= 0 and (self.max_bytes is None or total <= self.max_bytes):
+                break
+            evict.append(key)
+            over_entries -= 1
+            total -= size
+        db.executemany("DELETE FROM responses WHERE key = ?", ((k,) for k in evict))
+        self.evictions += len(evict)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else None,
+        }
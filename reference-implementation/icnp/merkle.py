@@ -0,0 +1,130 @@
+"""Merkle-root binding of agreed capabilities into execution tokens.
+
+Instead of one ``capability_hashes`` entry per capability, the token carries
+``binding.capability_root``. Each agent is handed an inclusion proof for its
+own capability record, which it checks in O(log n) hashes, so token size and
+verification cost no longer grow with the number of agents in the contract.
+
+Leaves and interior nodes are hashed with distinct prefixes (as in RFC 6962) so
+an interior node can never be passed off as a leaf; an odd node at the end of
+a level is promoted to the next level unchanged.
+"""
+from __future__ import annotations
+
+import hashlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from .digests import DigestCache
+from .runtime import binding_digest, sha256_hex
+
+_LEAF = b"\x00"
+_NODE = b"\x01"
+
+
+def _leaf(capability_hex: str) -> bytes:
+    return hashlib.sha256(_LEAF + bytes.fromhex(capability_hex)).digest()
+
+
+def _node(left: bytes, right: bytes) -> bytes:
+    return hashlib.sha256(_NODE + left + right).digest()
+
+
+def _strip(digest: str) -> str:
+    if not digest.startswith("sha256:"):
+        raise ValueError(f"Unsupported digest: {digest!r}")
+    return digest[len("sha256:"):]
+
+
+class CapabilityMerkleTree:
+    """Merkle tree over capability records, in the order they were agreed."""
+
+    def __init__(self, capabilities: List[Dict[str, Any]], *, digests: Optional[DigestCache] = None):
+        if not capabilities:
+            raise ValueError("At least one capability is required")
+        if digests is not None:
+            leaves = [_leaf(_strip(digests.digest(cap))) for cap in capabilities]
+        else:
+            leaves = [_leaf(sha256_hex(cap)) for cap in capabilities]
+        self.levels: List[List[bytes]] = [leaves]
+        level = leaves
+        while len(level) > 1:
+            nxt = [_node(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+            if len(level) % 2:
+                nxt.append(level[-1])
+            self.levels.append(nxt)
+            level = nxt
+
+    def __len__(self) -> int:
+        return len(self.levels[0])
+
+    @property
+    def root(self) -> str:
+        return f"sha256:{self.levels[-1][0].hex()}"
+
+    def proof(self, index: int) -> List[Dict[str, str]]:
+        """Sibling hashes from leaf ``index`` up to the root."""
+        if not 0 <= index < len(self):
+            raise IndexError(f"Capability index out of range: {index}")
+        path: List[Dict[str, str]] = []
+        for level in self.levels[:-1]:
+            sibling = index ^ 1
+            if sibling < len(level):
+                side = "left" if sibling < index else "right"
+                path.append({"side": side, "hash": f"sha256:{level[sibling].hex()}"})
+            index //= 2
+        return path
+
+
+def verify_capability_proof(capability: Dict[str, Any], proof: List[Dict[str, str]], root: str) -> bool:
+    """True if ``capability`` is a leaf of the tree whose root is ``root``."""
+    try:
+        h = _leaf(sha256_hex(capability))
+        for step in proof:
+            sibling = bytes.fromhex(_strip(step["hash"]))
+            if step["side"] == "left":
+                h = _node(sibling, h)
+            elif step["side"] == "right":
+                h = _node(h, sibling)
+            else:
+                return False
+        return h.hex() == _strip(root)
+    except (KeyError, TypeError, ValueError):
+        return False
+
+
+def capability_proofs(tree: CapabilityMerkleTree, capabilities: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """One ``{"leaf_index", "capability_id", "proof"}`` entry per leaf, in leaf order.
+
+    Capability ids are only unique per responder, so entries are addressed by
+    leaf index rather than by id.
+    """
+    return [
+        {"leaf_index": i, "capability_id": cap["id"], "proof": tree.proof(i)} for i, cap in enumerate(capabilities)
+    ]
+
+
+def verify_capability_in_proofs(capability: Dict[str, Any], proofs: List[Dict[str, Any]], root: str) -> bool:
+    """True if any entry in ``proofs`` for ``capability``'s id proves it is a leaf under ``root``."""
+    return any(
+        entry.get("capability_id") == capability.get("id")
+        and verify_capability_proof(capability, entry.get("proof"), root)
+        for entry in proofs
+        if isinstance(entry, dict)
+    )
+
+
+def make_merkle_binding(
+    intent: Dict[str, Any],
+    contract: Dict[str, Any],
+    capabilities: List[Dict[str, Any]],
+    *,
+    digests: Optional[DigestCache] = None,
+) -> Tuple[Dict[str, Any], CapabilityMerkleTree]:
+    """Token binding with ``capability_root``, plus the tree to draw proofs from."""
+    tree = CapabilityMerkleTree(capabilities, digests=digests)
+    binding = {
+        "intent_hash": binding_digest(intent, digests),
+        "contract_hash": binding_digest(contract, digests),
+        "capability_root": tree.root,
+    }
+    return binding, tree
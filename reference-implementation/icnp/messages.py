@@ -0,0 +1,176 @@
+"""Typed, immutable messages for the four ICNP phases.
+
+Each class is a frozen, slotted dataclass that also reads like the dict the
+matching ``make_*_message`` builder returns (``msg["contract_id"]``,
+``msg.get("forbidden_actions", [])``), so code written against message dicts
+accepts either form. Nothing is materialised up front: :meth:`Message.to_dict`
+builds the dict on demand, and the canonical JSON used for hashing and signing
+is computed once and cached.
+
+Payload fields (``intent``, ``capabilities`` and so on) are held by reference
+and must not be mutated once the message exists, or the cached canonical form
+goes stale. :func:`icnp.digests.freeze` makes them read-only if needed.
+"""
+from __future__ import annotations
+
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from typing import Any, ClassVar, Dict, Iterator, List, Optional, Tuple, Type, Union
+
+from .runtime import PHASE_SCHEMAS, canonical_json_bytes, new_uuid, sha256_hex, utc_now_iso
+
+
+class Message(Mapping):
+    """Base class: read-only mapping view plus cached canonical JSON."""
+
+    __slots__ = ("_canonical",)
+
+    phase: ClassVar[str] = ""
+    # Keys in builder order; optional ones are omitted from the dict when falsy.
+    _KEYS: ClassVar[Tuple[str, ...]] = ()
+    _OPTIONAL: ClassVar[frozenset] = frozenset()
+
+    @property
+    def schema(self) -> str:
+        return PHASE_SCHEMAS[self.phase]
+
+    def _present(self, key: str) -> bool:
+        return key not in self._OPTIONAL or bool(getattr(self, key))
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "phase":
+            return self.phase
+        if key in self._KEYS and self._present(key):
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        yield "icnp_version"
+        yield "phase"
+        for key in self._KEYS:
+            if key != "icnp_version" and self._present(key):
+                yield key
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """A new (shallow) dict equal to what the ``make_*_message`` builder returns."""
+        return {key: self[key] for key in self}
+
+    def canonical_bytes(self) -> bytes:
+        try:
+            return self._canonical
+        except AttributeError:
+            data = canonical_json_bytes(self.to_dict())
+            object.__setattr__(self, "_canonical", data)
+            return data
+
+    def canonical_json(self) -> str:
+        return self.canonical_bytes().decode("utf-8")
+
+    def sha256_hex(self) -> str:
+        return sha256_hex(self)
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class IntentDeclaration(Message):
+    intent: Dict[str, Any]
+    sender: Dict[str, Any]
+    message_id: str = field(default_factory=new_uuid)
+    timestamp: str = field(default_factory=utc_now_iso)
+    icnp_version: str = "1.0"
+
+    phase: ClassVar[str] = "intent_declaration"
+    _KEYS: ClassVar[Tuple[str, ...]] = ("icnp_version", "message_id", "timestamp", "intent", "sender")
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class CapabilityDisclosure(Message):
+    in_reply_to: str
+    capabilities: List[Dict[str, Any]]
+    responder: Dict[str, Any]
+    limitations: Optional[List[Dict[str, Any]]] = None
+    resource_requirements: Optional[Dict[str, Any]] = None
+    icnp_version: str = "1.0"
+
+    phase: ClassVar[str] = "capability_disclosure"
+    _KEYS: ClassVar[Tuple[str, ...]] = (
+        "icnp_version",
+        "in_reply_to",
+        "capabilities",
+        "responder",
+        "limitations",
+        "resource_requirements",
+    )
+    _OPTIONAL: ClassVar[frozenset] = frozenset({"limitations", "resource_requirements"})
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class ContractNegotiation(Message):
+    contract_id: str
+    agreed_actions: List[Dict[str, Any]]
+    execution_constraints: Dict[str, Any]
+    forbidden_actions: Optional[List[Dict[str, Any]]] = None
+    approval_chain: Optional[List[Dict[str, Any]]] = None
+    signatures: Optional[Dict[str, Any]] = None
+    icnp_version: str = "1.0"
+
+    phase: ClassVar[str] = "contract_negotiation"
+    _KEYS: ClassVar[Tuple[str, ...]] = (
+        "icnp_version",
+        "contract_id",
+        "agreed_actions",
+        "execution_constraints",
+        "forbidden_actions",
+        "approval_chain",
+        "signatures",
+    )
+    _OPTIONAL: ClassVar[frozenset] = frozenset({"forbidden_actions", "approval_chain", "signatures"})
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class ExecutionToken(Message):
+    token_id: str
+    contract_id: str
+    token: str
+    validity: Dict[str, Any]
+    binding: Dict[str, Any]
+    enforcement: Dict[str, Any]
+    icnp_version: str = "1.0"
+
+    phase: ClassVar[str] = "execution_token"
+    _KEYS: ClassVar[Tuple[str, ...]] = (
+        "icnp_version",
+        "token_id",
+        "contract_id",
+        "token",
+        "validity",
+        "binding",
+        "enforcement",
+    )
+
+
+MESSAGE_TYPES: Dict[str, Type[Message]] = {
+    cls.phase: cls for cls in (IntentDeclaration, CapabilityDisclosure, ContractNegotiation, ExecutionToken)
+}
+
+
+def message_from_dict(msg: Union[Dict[str, Any], Message]) -> Message:
+    """Typed message for a received message dict, dispatched on its ``phase``.
+
+    Every field the phase requires must be present: ids and timestamps are only
+    generated when constructing a new message, never filled in for a dict.
+    """
+    if isinstance(msg, Message):
+        return msg
+    cls = MESSAGE_TYPES.get(msg.get("phase", ""))
+    if cls is None:
+        raise ValueError(f"Unknown ICNP phase: {msg.get('phase')!r}")
+    extra = set(msg) - set(cls._KEYS) - {"phase"}
+    if extra:
+        raise ValueError(f"Fields not defined for {cls.phase}: {sorted(extra)}")
+    missing = [key for key in cls._KEYS if key not in cls._OPTIONAL and key not in msg]
+    if missing:
+        raise ValueError(f"{cls.phase} is missing required fields: {missing}")
+    return cls(**{k: v for k, v in msg.items() if k != "phase"})
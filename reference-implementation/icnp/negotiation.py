@@ -0,0 +1,277 @@
+"""Orchestrator side of the intent -> capability -> contract -> token flow.
+
+:class:`NegotiationSession` declares an intent, broadcasts it to every
+participant at once and collects their capability disclosures on a thread
+pool with a deadline and a quorum, so a slow or hung agent costs at most the
+deadline instead of stalling the round (or process exit: workers are daemon
+threads). The contract and execution token are
+then built from whatever arrived in time.
+"""
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+from .digests import DigestCache
+from .merkle import capability_proofs, make_merkle_binding
+from .messages import ContractNegotiation, ExecutionToken, IntentDeclaration
+from .runtime import SchemaRegistry, make_binding_hashes, new_uuid
+from .tokens import TokenIssuer
+
+# participant id -> callable returning its capability_disclosure for an intent message_id.
+Participants = Mapping[str, Callable[[str], Dict[str, Any]]]
+
+DEFAULT_ENFORCEMENT: Dict[str, Any] = {
+    "mode": "strict",
+    "violation_action": "abort_and_rollback",
+    "alert_on_violation": True,
+}
+
+
+class NegotiationError(ValueError):
+    """A negotiation step failed; ``code`` is the ICNP error code (e.g. ``ICNP-002``)."""
+
+    def __init__(self, code: str, message: str):
+        super().__init__(f"{code}: {message}")
+        self.code = code
+
+
+@dataclass
+class DisclosureRound:
+    """Outcome of one capability fan-out, in participant order."""
+
+    received: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    failed: Dict[str, BaseException] = field(default_factory=dict)
+    late: List[str] = field(default_factory=list)
+    elapsed_s: float = 0.0
+
+    @property
+    def messages(self) -> List[Dict[str, Any]]:
+        return list(self.received.values())
+
+    @property
+    def capabilities(self) -> List[Dict[str, Any]]:
+        return [cap for msg in self.received.values() for cap in msg["capabilities"]]
+
+
+@dataclass(frozen=True)
+class TokenGrant:
+    """An issued execution token and what agents need to verify it."""
+
+    message: ExecutionToken
+    body: Dict[str, Any]
+    signature: str
+    key_id: str
+    capability_proofs: List[Dict[str, Any]]
+
+    def token_meta(self) -> Dict[str, Any]:
+        return {
+            "body": self.body,
+            "signature": self.signature,
+            "key_id": self.key_id,
+            "capability_proofs": self.capability_proofs,
+        }
+
+
+class NegotiationSession:
+    """One negotiation: :meth:`declare`, :meth:`gather`, :meth:`propose`, :meth:`issue_token`.
+
+    Every message is validated against its phase schema; disclosures are
+    validated on the worker that produced them.
+    """
+
+    def __init__(
+        self,
+        *,
+        schema: SchemaRegistry,
+        issuer: TokenIssuer,
+        sender: Dict[str, Any],
+        binding: str = "hashes",
+        digests: Optional[DigestCache] = None,
+        max_workers: int = 32,
+    ):
+        if binding not in ("hashes", "merkle"):
+            raise ValueError("binding must be 'hashes' or 'merkle'")
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        self.schema = schema
+        self.issuer = issuer
+        self.sender = sender
+        self.binding = binding
+        self.digests = digests
+        self.max_workers = max_workers
+        self.intent: Optional[IntentDeclaration] = None
+        self.contract: Optional[ContractNegotiation] = None
+
+    def _check(self, schema_filename: str, msg: Any, label: str) -> None:
+        ok, errors = self.schema.validate(schema_filename, msg)
+        if not ok:
+            raise ValueError(f"{label} schema errors: {errors}")
+
+    def declare(self, intent: Dict[str, Any]) -> IntentDeclaration:
+        msg = IntentDeclaration(intent=intent, sender=self.sender)
+        self._check("intent.schema.json", msg, "Intent")
+        self.intent = msg
+        return msg
+
+    def gather(
+        self,
+        participants: Participants,
+        *,
+        deadline_s: Optional[float] = None,
+        quorum: int = 1,
+        wait_for_all: bool = True,
+    ) -> DisclosureRound:
+        """Broadcast the intent and collect disclosures until the deadline.
+
+        Returns once every participant has answered, or once ``quorum`` valid
+        disclosures are in if ``wait_for_all`` is False, or when ``deadline_s``
+        passes. Raises :class:`NegotiationError` (ICNP-002) if fewer than
+        ``quorum`` valid disclosures arrived. At most ``max_workers`` participants
+        run at once; those still running or not yet started at the deadline are
+        reported in ``late`` and their results discarded.
+        """
+        if self.intent is None:
+            raise ValueError("declare() an intent before gathering capabilities")
+        if quorum < 0:
+            raise ValueError("quorum must not be negative")
+        intent_id = self.intent.message_id
+
+        def disclose(fn: Callable[[str], Dict[str, Any]]) -> Dict[str, Any]:
+            msg = fn(intent_id)
+            self._check("capability.schema.json", msg, "Capability message")
+            if msg["in_reply_to"] != intent_id:
+                raise ValueError("Capability message does not reply to this intent")
+            return msg
+
+        started = time.perf_counter()
+        deadline = None if deadline_s is None else started + deadline_s
+        todo: queue.SimpleQueue[Tuple[str, Callable[[str], Dict[str, Any]]]] = queue.SimpleQueue()
+        done: queue.SimpleQueue[Tuple[str, Optional[Dict[str, Any]], Optional[BaseException]]] = queue.SimpleQueue()
+        stop = threading.Event()
+        for item in participants.items():
+            todo.put(item)
+
+        def work() -> None:
+            while not stop.is_set():
+                try:
+                    pid, fn = todo.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    done.put((pid, disclose(fn), None))
+                except Exception as e:
+                    done.put((pid, None, e))
+
+        # Daemon threads: a participant that never returns must not block interpreter exit.
+        for n in range(min(self.max_workers, len(participants))):
+            threading.Thread(target=work, name=f"icnp-disclose-{n}", daemon=True).start()
+
+        results: Dict[str, Dict[str, Any]] = {}
+        result = DisclosureRound()
+        outstanding = len(participants)
+        try:
+            while outstanding and (wait_for_all or len(results) < quorum):
+                timeout = None if deadline is None else deadline - time.perf_counter()
+                if timeout is not None and timeout <= 0:
+                    break
+                try:
+                    pid, msg, exc = done.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                outstanding -= 1
+                if exc is not None:
+                    result.failed[pid] = exc
+                else:
+                    results[pid] = msg
+        finally:
+            # Participants not yet started are skipped; running ones are abandoned.
+            stop.set()
+
+        late = set(participants) - set(results) - set(result.failed)
+        result.received = {pid: results[pid] for pid in participants if pid in results}
+        result.late = [pid for pid in participants if pid in late]
+        result.elapsed_s = time.perf_counter() - started
+        if len(result.received) < quorum:
+            raise NegotiationError(
+                "ICNP-002",
+                f"{len(result.received)} of {len(participants)} participants disclosed capabilities "
+                f"in time; quorum is {quorum}",
+            )
+        return result
+
+    def propose(
+        self,
+        *,
+        agreed_actions: List[Dict[str, Any]],
+        execution_constraints: Dict[str, Any],
+        forbidden_actions: Optional[List[Dict[str, Any]]] = None,
+        signatures: Optional[Dict[str, Any]] = None,
+        contract_id: Optional[str] = None,
+    ) -> ContractNegotiation:
+        msg = ContractNegotiation(
+            contract_id=contract_id or new_uuid(),
+            agreed_actions=agreed_actions,
+            execution_constraints=execution_constraints,
+            forbidden_actions=forbidden_actions,
+            signatures=signatures,
+        )
+        self._check("contract.schema.json", msg, "Contract")
+        self.contract = msg
+        return msg
+
+    def issue_token(
+        self,
+        capabilities: List[Dict[str, Any]],
+        *,
+        ttl_s: int = 600,
+        max_invocations: int = 1,
+        enforcement: Optional[Dict[str, Any]] = None,
+    ) -> TokenGrant:
+        """Sign a token binding the intent, the contract and ``capabilities``."""
+        if self.intent is None or self.contract is None:
+            raise ValueError("declare() and propose() before issuing a token")
+        intent, contract = self.intent.intent, self.contract
+        if self.binding == "merkle":
+            # The token carries only the root; each agent gets a proof for its capability.
+            binding, tree = make_merkle_binding(intent, contract, capabilities, digests=self.digests)
+            proofs = capability_proofs(tree, capabilities)
+        else:
+            binding = make_binding_hashes(intent, contract, capabilities, digests=self.digests)
+            proofs = []
+
+        not_before = datetime.now(timezone.utc).replace(microsecond=0)
+        not_after = not_before + timedelta(seconds=ttl_s)
+        validity = {
+            "not_before": not_before.isoformat().replace("+00:00", "Z"),
+            "not_after": not_after.isoformat().replace("+00:00", "Z"),
+            "max_invocations": max_invocations,
+        }
+        body = {
+            "token_id": new_uuid(),
+            "contract_id": contract.contract_id,
+            "validity": validity,
+            "binding": binding,
+            "enforcement": dict(enforcement or DEFAULT_ENFORCEMENT),
+        }
+        issued = self.issuer.issue(body)
+        msg = ExecutionToken(
+            token_id=body["token_id"],
+            contract_id=body["contract_id"],
+            token=issued.token,
+            validity=validity,
+            binding=binding,
+            enforcement=body["enforcement"],
+        )
+        self._check("execution-token.schema.json", msg, "Token")
+        return TokenGrant(
+            message=msg,
+            body=body,
+            signature=issued.signature,
+            key_id=issued.key_id,
+            capability_proofs=proofs,
+        )
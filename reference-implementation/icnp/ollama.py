@@ -1,23 +1,319 @@
 \
 from __future__ import annotations
 
+import asyncio
+import contextvars
+import functools
+import json
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
 import requests
-from typing import Any, Dict, List
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .llm_cache import ResponseCache, response_key
+
+
+@dataclass
+class ChatMetrics:
+    """Latency figures for one streamed chat call (seconds)."""
+
+    model: str = ""
+    time_to_first_token_s: Optional[float] = None
+    total_s: Optional[float] = None
+    chunks: int = 0
+    eval_count: Optional[int] = None
+    eval_duration_s: Optional[float] = None
+    cached: bool = False
+
+    @property
+    def tokens_per_s(self) -> Optional[float]:
+        # Prefer Ollama's own eval counters; otherwise approximate one token
+        # per chunk over the time after the first token arrived.
+        if self.eval_count and self.eval_duration_s:
+            return self.eval_count / self.eval_duration_s
+        if self.total_s is None or self.time_to_first_token_s is None:
+            return None
+        generating_s = self.total_s - self.time_to_first_token_s
+        return self.chunks / generating_s if generating_s > 0 else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "time_to_first_token_s": self.time_to_first_token_s,
+            "total_s": self.total_s,
+            "tokens_per_s": self.tokens_per_s,
+            "cached": self.cached,
+        }
 
 
 class OllamaClient:
-    def __init__(self, base_url: str = "http://localhost:11434", timeout_s: int = 120):
+    """Ollama chat client over a pooled keep-alive connection.
+
+    One instance can be shared by every agent in a process: the urllib3
+    connection pool behind the adapter is thread-safe, and each thread gets its
+    own ``requests.Session`` mounted on that shared adapter.
+
+    With a :class:`~icnp.llm_cache.ResponseCache`, :meth:`chat` answers
+    repeated (model, messages) requests from disk instead of the model.
+    """
+
+    def __init__(
+        self,
+        base_url: str = "http://localhost:11434",
+        timeout_s: int = 120,
+        *,
+        connect_timeout_s: float = 5.0,
+        pool_size: int = 10,
+        retries: int = 3,
+        backoff_s: float = 0.5,
+        cache: Optional[ResponseCache] = None,
+    ):
+        self.cache = cache
         self.base_url = base_url.rstrip("/")
         self.timeout_s = timeout_s
+        self.connect_timeout_s = connect_timeout_s
+        # Only connection failures are retried: a read timeout may mean the
+        # model is still generating, and resending would duplicate the work.
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=0,
+            status=0,
+            backoff_factor=backoff_s,
+            raise_on_status=False,
+        )
+        self._adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True, max_retries=retry)
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        session: Optional[requests.Session] = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.headers["Connection"] = "keep-alive"
+            session.mount("http://", self._adapter)
+            session.mount("https://", self._adapter)
+            self._local.session = session
+        return session
+
+    def close(self) -> None:
+        self._adapter.close()
+
+    def __enter__(self) -> "OllamaClient":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def chat(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        *,
+        on_chunk: Optional[Callable[[str], None]] = None,
+        metrics: Optional[ChatMetrics] = None,
+        bypass_cache: bool = False,
+    ) -> str:
+        """Return the full completion.
+
+        Passing ``on_chunk`` or ``metrics`` switches to a streamed request: each
+        content chunk is forwarded to ``on_chunk`` as it arrives and ``metrics``
+        is filled in, but the assembled text is still returned.
+
+        A cached reply is returned without calling the model (``on_chunk``
+        receives it in one piece and ``metrics.cached`` is set).
+        ``bypass_cache`` skips the lookup but still stores the fresh reply.
+        """
+        if self.cache is not None:
+            if bypass_cache:
+                self.cache.note_bypass()
+            else:
+                cached = self.cached_reply(model, messages, on_chunk=on_chunk, metrics=metrics)
+                if cached is not None:
+                    return cached
+        return self.fetch(model, messages, on_chunk=on_chunk, metrics=metrics)
+
+    def cached_reply(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        *,
+        on_chunk: Optional[Callable[[str], None]] = None,
+        metrics: Optional[ChatMetrics] = None,
+    ) -> Optional[str]:
+        """The cached reply for this request, or None (also when there is no cache)."""
+        if self.cache is None:
+            return None
+        started = time.perf_counter()
+        text = self.cache.get_key(response_key(model, messages))
+        if text is None:
+            return None
+        if metrics is not None:
+            metrics.model = model
+            metrics.cached = True
+            metrics.chunks = 1
+            metrics.time_to_first_token_s = metrics.total_s = time.perf_counter() - started
+        if on_chunk is not None:
+            on_chunk(text)
+        return text
+
+    def fetch(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        *,
+        on_chunk: Optional[Callable[[str], None]] = None,
+        metrics: Optional[ChatMetrics] = None,
+    ) -> str:
+        """Ask the model without a cache lookup; the reply is still cached."""
+        text = self._chat(model, messages, on_chunk=on_chunk, metrics=metrics)
+        if self.cache is not None:
+            self.cache.put(model, messages, text)
+        return text
+
+    def _chat(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        *,
+        on_chunk: Optional[Callable[[str], None]] = None,
+        metrics: Optional[ChatMetrics] = None,
+    ) -> str:
+        if on_chunk is not None or metrics is not None:
+            parts = []
+            for chunk in self.stream_chat(model, messages, metrics=metrics):
+                if on_chunk is not None:
+                    on_chunk(chunk)
+                parts.append(chunk)
+            return "".join(parts)
 
-    def chat(self, model: str, messages: List[Dict[str, str]]) -> str:
         url = f"{self.base_url}/api/chat"
         payload: Dict[str, Any] = {
             "model": model,
             "messages": messages,
             "stream": False
         }
-        r = requests.post(url, json=payload, timeout=self.timeout_s)
+        r = self._session().post(url, json=payload, timeout=(self.connect_timeout_s, self.timeout_s))
         r.raise_for_status()
         data = r.json()
         return data.get("message", {}).get("content", "")
+
+    def stream_chat(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        *,
+        metrics: Optional[ChatMetrics] = None,
+    ) -> Iterator[str]:
+        """Yield content chunks from Ollama's NDJSON stream as they arrive."""
+        metrics = metrics if metrics is not None else ChatMetrics()
+        metrics.model = model
+        started = time.perf_counter()
+        url = f"{self.base_url}/api/chat"
+        payload: Dict[str, Any] = {"model": model, "messages": messages, "stream": True}
+        with self._session().post(
+            url, json=payload, stream=True, timeout=(self.connect_timeout_s, self.timeout_s)
+        ) as r:
+            r.raise_for_status()
+            for line in r.iter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                if "error" in data:
+                    raise RuntimeError(f"Ollama error: {data['error']}")
+                content = data.get("message", {}).get("content", "")
+                if content:
+                    if metrics.time_to_first_token_s is None:
+                        metrics.time_to_first_token_s = time.perf_counter() - started
+                    metrics.chunks += 1
+                    yield content
+                if data.get("done"):
+                    metrics.eval_count = data.get("eval_count")
+                    eval_ns = data.get("eval_duration")
+                    metrics.eval_duration_s = eval_ns / 1e9 if eval_ns else None
+                    break
+        metrics.total_s = time.perf_counter() - started
+
+
+class AsyncOllamaClient:
+    """Asyncio front end for :class:`OllamaClient` with bounded concurrency.
+
+    Requests run on worker threads over the pooled sync client, so no extra
+    HTTP dependency is needed. The per-client semaphore caps how many requests
+    are in flight at once, letting one event loop queue many agent calls
+    without oversubscribing a local Ollama. A slot is held until its worker
+    thread finishes, even if the awaiting task is cancelled first.
+    """
+
+    def __init__(
+        self,
+        base_url: str = "http://localhost:11434",
+        timeout_s: int = 120,
+        *,
+        max_concurrency: int = 4,
+        client: Optional[OllamaClient] = None,
+    ):
+        self.max_concurrency = max_concurrency
+        self._client = client or OllamaClient(base_url, timeout_s, pool_size=max_concurrency)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_concurrency, thread_name_prefix="icnp-ollama")
+
+    @property
+    def client(self) -> OllamaClient:
+        return self._client
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._client.close()
+
+    async def __aenter__(self) -> "AsyncOllamaClient":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        self.close()
+
+    async def chat(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        *,
+        on_chunk: Optional[Callable[[str], None]] = None,
+        metrics: Optional[ChatMetrics] = None,
+        bypass_cache: bool = False,
+    ) -> str:
+        """See :meth:`OllamaClient.chat`; ``on_chunk`` is called from a worker thread.
+
+        Cache hits are answered without taking a concurrency slot. The lookup
+        itself runs on a worker thread, since SQLite access can block behind a
+        write or an eviction in another thread.
+        """
+        if bypass_cache and self._client.cache is not None:
+            self._client.cache.note_bypass()
+        elif not bypass_cache and self._client.cache is not None:
+            cached = await asyncio.to_thread(
+                self._client.cached_reply, model, messages, on_chunk=on_chunk, metrics=metrics
+            )
+            if cached is not None:
+                return cached
+        await self._semaphore.acquire()
+        loop = asyncio.get_running_loop()
+        call = functools.partial(self._client.fetch, model, messages, on_chunk=on_chunk, metrics=metrics)
+        try:
+            future = self._executor.submit(contextvars.copy_context().run, call)
+        except BaseException:
+            self._semaphore.release()
+            raise
+
+        def release(_: Future) -> None:
+            # Runs when the request finishes, or is cancelled before it starts.
+            try:
+                loop.call_soon_threadsafe(self._semaphore.release)
+            except RuntimeError:  # event loop already closed
+                pass
+
+        future.add_done_callback(release)
+        return await asyncio.wrap_future(future)
@@ -0,0 +1,168 @@
+"""Dependency-graph executor for multi-agent pipelines.
+
+Stages declare the stages whose outputs they consume. Every stage whose inputs
+are ready runs on a shared thread pool, so independent agents execute
+concurrently; outputs are handed to downstream stages by reference.
+"""
+from __future__ import annotations
+
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+@dataclass(frozen=True)
+class Stage:
+    """A unit of work; ``fn`` receives ``{input name: upstream output}``."""
+
+    name: str
+    fn: Callable[[Dict[str, Any]], Any]
+    inputs: Tuple[str, ...] = ()
+
+
+@dataclass(frozen=True)
+class StageTiming:
+    started_s: float
+    ended_s: float
+
+    @property
+    def duration_s(self) -> float:
+        return self.ended_s - self.started_s
+
+
+@dataclass
+class PipelineResult:
+    outputs: Dict[str, Any] = field(default_factory=dict)
+    errors: Dict[str, BaseException] = field(default_factory=dict)
+    skipped: List[str] = field(default_factory=list)
+    timings: Dict[str, StageTiming] = field(default_factory=dict)
+    wall_s: float = 0.0
+    critical_path: List[str] = field(default_factory=list)
+    critical_path_s: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors and not self.skipped
+
+    def summary(self) -> str:
+        path = " -> ".join(self.critical_path) or "-"
+        return (
+            f"wall time {self.wall_s:.2f}s, critical path {self.critical_path_s:.2f}s ({path}), "
+            f"sum of stages {sum(t.duration_s for t in self.timings.values()):.2f}s"
+        )
+
+
+class Pipeline:
+    """A validated DAG of :class:`Stage` objects."""
+
+    def __init__(self, stages: Iterable[Stage]):
+        self.stages: Dict[str, Stage] = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError(f"Duplicate stage name: {stage.name}")
+            self.stages[stage.name] = stage
+        for stage in self.stages.values():
+            missing = [i for i in stage.inputs if i not in self.stages]
+            if missing:
+                raise ValueError(f"Stage {stage.name!r} depends on unknown stages: {missing}")
+        self.order = self._topological_order()
+
+    def _topological_order(self) -> List[str]:
+        indegree = {name: len(stage.inputs) for name, stage in self.stages.items()}
+        dependents = self.dependents()
+        ready = [name for name, n in indegree.items() if n == 0]
+        order: List[str] = []
+        while ready:
+            name = ready.pop(0)
+            order.append(name)
+            for child in dependents[name]:
+                indegree[child] -= 1
+                if indegree[child] == 0:
+                    ready.append(child)
+        if len(order) != len(self.stages):
+            cyclic = sorted(set(self.stages) - set(order))
+            raise ValueError(f"Pipeline has a dependency cycle among: {cyclic}")
+        return order
+
+    def dependents(self) -> Dict[str, List[str]]:
+        out: Dict[str, List[str]] = {name: [] for name in self.stages}
+        for stage in self.stages.values():
+            for dep in stage.inputs:
+                out[dep].append(stage.name)
+        return out
+
+    def critical_path(self, timings: Dict[str, StageTiming]) -> Tuple[List[str], float]:
+        """Longest chain of dependent stages by measured duration."""
+        best: Dict[str, Tuple[float, Optional[str]]] = {}
+        for name in self.order:
+            if name not in timings:
+                continue
+            prev: Tuple[float, Optional[str]] = (0.0, None)
+            for dep in self.stages[name].inputs:
+                if dep in best and best[dep][0] > prev[0]:
+                    prev = (best[dep][0], dep)
+            best[name] = (prev[0] + timings[name].duration_s, prev[1])
+        if not best:
+            return [], 0.0
+        end = max(best, key=lambda n: best[n][0])
+        total = best[end][0]
+        path: List[str] = []
+        cursor: Optional[str] = end
+        while cursor is not None:
+            path.append(cursor)
+            cursor = best[cursor][1]
+        return path[::-1], total
+
+    def run(self, *, max_workers: Optional[int] = None) -> PipelineResult:
+        result = PipelineResult()
+        dependents = self.dependents()
+        waiting = {name: set(stage.inputs) for name, stage in self.stages.items()}
+        t0 = time.perf_counter()
+
+        def execute(stage: Stage) -> Any:
+            started = time.perf_counter() - t0
+            try:
+                return stage.fn({dep: result.outputs[dep] for dep in stage.inputs})
+            finally:
+                result.timings[stage.name] = StageTiming(started, time.perf_counter() - t0)
+
+        def skip(name: str) -> None:
+            for child in dependents[name]:
+                if child in waiting:
+                    del waiting[child]
+                    result.skipped.append(child)
+                    skip(child)
+
+        workers = max_workers or max(1, len(self.stages))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="icnp-stage") as pool:
+            running: Dict[Future, str] = {}
+
+            def launch_ready() -> None:
+                for name in [n for n, deps in waiting.items() if not deps]:
+                    del waiting[name]
+                    running[pool.submit(execute, self.stages[name])] = name
+
+            launch_ready()
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    name = running.pop(fut)
+                    exc = fut.exception()
+                    if exc is not None:
+                        result.errors[name] = exc
+                        skip(name)
+                        continue
+                    result.outputs[name] = fut.result()
+                    for child in dependents[name]:
+                        if child in waiting:
+                            waiting[child].discard(name)
+                launch_ready()
+
+        result.wall_s = time.perf_counter() - t0
+        result.critical_path, result.critical_path_s = self.critical_path(result.timings)
+        return result
+
+
+def run_pipeline(stages: Sequence[Stage], *, max_workers: Optional[int] = None) -> PipelineResult:
+    return Pipeline(stages).run(max_workers=max_workers)
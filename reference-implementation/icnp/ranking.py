@@ -0,0 +1,154 @@
+"""Vectorised top-k ranking of disclosed capabilities against an intent.
+
+Disclosures are flattened once into NumPy column arrays
+(:class:`CapabilityRanker`); each query then scores every candidate with array
+arithmetic and selects the top-k with ``argpartition``, so ranking stays cheap
+at 100k+ candidates.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+SIDE_EFFECT_PENALTY = {"none": 0.0, "minimal": 0.25, "moderate": 0.5, "significant": 1.0}
+
+# Intent resource limits and the capability requirement they bound.
+RESOURCE_LIMITS = (
+    ("max_cpu_cores", "cpu_cores"),
+    ("max_memory_gb", "memory_gb"),
+)
+
+
+@dataclass(frozen=True)
+class RankingWeights:
+    confidence: float = 1.0
+    side_effects: float = 0.5
+    requires_approval: float = 0.25
+    resource_fit: float = 0.5
+
+
+@dataclass(frozen=True)
+class RankedCapability:
+    responder_id: str
+    capability: Dict[str, Any]
+    score: float
+
+
+def _effective_requirements(capability: Dict[str, Any], capability_msg: Dict[str, Any]) -> Dict[str, Any]:
+    # A capability's own requirements take precedence over the message-level ones.
+    return capability.get("resource_requirements") or capability_msg.get("resource_requirements") or {}
+
+
+class CapabilityRanker:
+    """Column store of capability records, scored in bulk per intent."""
+
+    def __init__(self, disclosures: Iterable[Dict[str, Any]]):
+        self.responder_ids: List[str] = []
+        self.capabilities: List[Dict[str, Any]] = []
+        confidence: List[float] = []
+        side_effects: List[float] = []
+        requires_approval: List[bool] = []
+        requirements: Dict[str, List[float]] = {req: [] for _, req in RESOURCE_LIMITS}
+        actions: List[str] = []
+        self._scope_rows: Dict[str, List[int]] = {}
+
+        for msg in disclosures:
+            responder_id = msg["responder"]["id"]
+            for cap in msg["capabilities"]:
+                row = len(self.capabilities)
+                self.responder_ids.append(responder_id)
+                self.capabilities.append(cap)
+                confidence.append(cap["confidence"])
+                side_effects.append(SIDE_EFFECT_PENALTY[cap.get("side_effects", "none")])
+                requires_approval.append(cap.get("requires_approval", False))
+                compute = _effective_requirements(cap, msg).get("compute", {})
+                for _, req in RESOURCE_LIMITS:
+                    requirements[req].append(compute.get(req, np.nan))
+                actions.append(cap["action"])
+                scopes = [cap["scope"]] if isinstance(cap["scope"], str) else cap["scope"]
+                for scope in set(scopes):
+                    self._scope_rows.setdefault(scope, []).append(row)
+
+        self.confidence = np.asarray(confidence, dtype=np.float64)
+        self.side_effects = np.asarray(side_effects, dtype=np.float64)
+        self.requires_approval = np.asarray(requires_approval, dtype=bool)
+        self.requirements = {req: np.asarray(vals, dtype=np.float64) for req, vals in requirements.items()}
+        self._action_names, self._action_codes = np.unique(np.asarray(actions, dtype=object), return_inverse=True)
+
+    def __len__(self) -> int:
+        return len(self.capabilities)
+
+    def _mask(self, action: Optional[str], scope: Optional[str]) -> np.ndarray:
+        mask = np.ones(len(self), dtype=bool)
+        if action is not None:
+            code = np.searchsorted(self._action_names, action)
+            if code >= len(self._action_names) or self._action_names[code] != action:
+                return np.zeros(len(self), dtype=bool)
+            mask &= self._action_codes == code
+        if scope is not None:
+            in_scope = np.zeros(len(self), dtype=bool)
+            in_scope[self._scope_rows.get(scope, [])] = True
+            mask &= in_scope
+        return mask
+
+    def resource_fit(self, intent: Dict[str, Any]) -> np.ndarray:
+        """Per-candidate fit in [0, 1], or ``-inf`` where a limit is exceeded.
+
+        Fit is the mean remaining headroom across the intent's resource limits;
+        a requirement the candidate did not disclose counts as 0.5 (unknown).
+        With no limits every candidate scores 1.
+        """
+        limits = intent.get("constraints", {}).get("resources", {})
+        parts = []
+        for limit_key, req_key in RESOURCE_LIMITS:
+            if limit_key not in limits:
+                continue
+            limit = float(limits[limit_key])
+            req = self.requirements[req_key]
+            headroom = 1.0 - req / limit if limit > 0 else np.ones(len(self))
+            headroom = np.where(req > limit, -np.inf, headroom)
+            parts.append(np.where(np.isnan(req), 0.5, headroom))
+        if not parts:
+            return np.ones(len(self))
+        return np.mean(parts, axis=0)
+
+    def scores(
+        self,
+        intent: Dict[str, Any],
+        *,
+        weights: RankingWeights = RankingWeights(),
+        action: Optional[str] = None,
+        scope: Optional[str] = None,
+    ) -> np.ndarray:
+        """Score every candidate; filtered-out or infeasible candidates get ``-inf``."""
+        score = (
+            weights.confidence * self.confidence
+            - weights.side_effects * self.side_effects
+            - weights.requires_approval * self.requires_approval
+            + weights.resource_fit * self.resource_fit(intent)
+        )
+        return np.where(self._mask(action, scope), score, -np.inf)
+
+    def top_k(
+        self,
+        intent: Dict[str, Any],
+        k: int,
+        *,
+        weights: RankingWeights = RankingWeights(),
+        action: Optional[str] = None,
+        scope: Optional[str] = None,
+    ) -> List[RankedCapability]:
+        """Best ``k`` feasible candidates, highest score first."""
+        if k <= 0 or not len(self):
+            return []
+        score = self.scores(intent, weights=weights, action=action, scope=scope)
+        k = min(k, len(score))
+        top = np.argpartition(-score, k - 1)[:k]
+        top = top[np.argsort(-score[top], kind="stable")]
+        return [
+            RankedCapability(self.responder_ids[i], self.capabilities[i], float(score[i]))
+            for i in top
+            if np.isfinite(score[i])
+        ]
@@ -0,0 +1,184 @@
+"""Execution token revocation, checked during token verification.
+
+:class:`RevocationList` keeps revoked token ids in an exact dict (id ->
+``not_after`` epoch seconds, or None if unknown) with a Bloom filter in front,
+so the common "not revoked" answer is a few bit probes in a compact bitmap.
+Revocations can be added while agents are running, snapshotted to a JSON file
+and merged back in from it, which lets several agent processes follow one
+revocation file that an operator updates.
+"""
+from __future__ import annotations
+
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional, Union
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings, sized for ``capacity`` items."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate must be between 0 and 1")
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str) -> range:
+        # Kirsch-Mitzenmacher: k probes from two hashes. str hashes are cached
+        # on the object and salted per process; the bits are never persisted.
+        h1 = hash(key)
+        h2 = hash((key, 1)) | 1
+        return range(h1, h1 + self.hashes * h2, h2)
+
+    def add(self, key: str) -> None:
+        bits, size = self._bits, self.size
+        for h in self._positions(key):
+            pos = h % size
+            bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: str) -> bool:
+        bits, size = self._bits, self.size
+        for h in self._positions(key):
+            pos = h % size
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def __sizeof__(self) -> int:
+        return object.__sizeof__(self) + self._bits.__sizeof__()
+
+
+class RevocationList:
+    """Revoked execution token ids: a Bloom filter backed by an exact dict.
+
+    Lookups take no lock. Writers build a new filter when the current one is
+    full and swap it in, so a reader always sees a filter that contains every
+    id already visible in the exact dict.
+    """
+
+    def __init__(
+        self,
+        *,
+        capacity: int = 10_000,
+        error_rate: float = 0.001,
+        clock: Callable[[], float] = time.time,
+    ):
+        self._error_rate = error_rate
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._revoked: Dict[str, Optional[int]] = {}
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._mtime_ns: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+    def __contains__(self, token_id: str) -> bool:
+        return self.is_revoked(token_id)
+
+    def is_revoked(self, token_id: str) -> bool:
+        if not self._revoked or token_id not in self._bloom:
+            return False
+        return token_id in self._revoked
+
+    def revoke(self, token_id: str, *, not_after: Optional[int] = None) -> None:
+        """Revoke a token; ``not_after`` lets :meth:`purge_expired` drop it later."""
+        self.revoke_many({token_id: not_after})
+
+    def revoke_many(self, revoked: Union[Dict[str, Optional[int]], Iterable[str]]) -> int:
+        """Add several revocations at once; returns how many were new."""
+        entries = revoked if isinstance(revoked, dict) else dict.fromkeys(revoked)
+        with self._lock:
+            new = [tid for tid in entries if tid not in self._revoked]
+            if len(self._revoked) + len(new) > self._bloom.capacity:
+                self._rebuild(len(self._revoked) + len(new))
+            # Filter first: an id must never be in the dict but missing from the filter.
+            for tid in new:
+                self._bloom.add(tid)
+            for tid, not_after in entries.items():
+                if tid not in self._revoked:
+                    self._revoked[tid] = not_after
+                else:
+                    # Keep the later expiry; None (unknown) is never purged.
+                    current = self._revoked[tid]
+                    if current is not None and (not_after is None or not_after > current):
+                        self._revoked[tid] = not_after
+        return len(new)
+
+    def _rebuild(self, needed: int) -> None:
+        capacity = self._bloom.capacity
+        while capacity < needed:
+            capacity *= 2
+        bloom = BloomFilter(capacity, self._error_rate)
+        for tid in self._revoked:
+            bloom.add(tid)
+        self._bloom = bloom
+
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        """Forget revocations of tokens past ``not_after``; they fail verification anyway."""
+        now = self._clock() if now is None else now
+        with self._lock:
+            expired = [tid for tid, na in self._revoked.items() if na is not None and na <= now]
+            if not expired:
+                return 0
+            for tid in expired:
+                del self._revoked[tid]
+            bloom = BloomFilter(self._bloom.capacity, self._error_rate)
+            for tid in self._revoked:
+                bloom.add(tid)
+            self._bloom = bloom
+        return len(expired)
+
+    def snapshot(self, path: Union[str, Path]) -> None:
+        """Write every revocation to ``path`` atomically."""
+        path = Path(path)
+        with self._lock:
+            data = {"version": 1, "revoked": dict(self._revoked)}
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                json.dump(data, fh, sort_keys=True)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        self._mtime_ns = path.stat().st_mtime_ns
+
+    def merge_file(self, path: Union[str, Path]) -> int:
+        """Add the revocations in a snapshot file; returns how many were new."""
+        path = Path(path)
+        mtime_ns = path.stat().st_mtime_ns
+        with open(path, "r", encoding="utf-8") as fh:
+            data = json.load(fh)
+        if data.get("version") != 1 or not isinstance(data.get("revoked"), dict):
+            raise ValueError(f"Not a revocation snapshot: {path}")
+        added = self.revoke_many(data["revoked"])
+        self._mtime_ns = mtime_ns
+        return added
+
+    def refresh(self, path: Union[str, Path]) -> int:
+        """Merge ``path`` if it changed since it was last read or written here."""
+        try:
+            mtime_ns = Path(path).stat().st_mtime_ns
+        except FileNotFoundError:
+            return 0
+        if mtime_ns == self._mtime_ns:
+            return 0
+        return self.merge_file(path)
+
+    @classmethod
+    def load(cls, path: Union[str, Path], **kwargs: Any) -> "RevocationList":
+        revocations = cls(**kwargs)
+        revocations.merge_file(path)
+        return revocations
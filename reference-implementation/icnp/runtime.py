@@ -7,11 +7,29 @@ import json
 import secrets
 import uuid
 from dataclasses import dataclass
-from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional, Tuple
+from datetime import date, datetime, time, timezone
+from enum import Enum
+from itertools import islice
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple, Union
 
 from jsonschema import Draft7Validator
 
+if TYPE_CHECKING:
+    from .digests import DigestCache
+
+try:  # Optional fast encoder: pip install 'icnp-reference-implementation[fast]'
+    import orjson as _orjson
+except ImportError:  # pragma: no cover - depends on environment
+    _orjson = None
+
+
+PHASE_SCHEMAS: Dict[str, str] = {
+    "intent_declaration": "intent.schema.json",
+    "capability_disclosure": "capability.schema.json",
+    "contract_negotiation": "contract.schema.json",
+    "execution_token": "execution-token.schema.json",
+}
+
 
 def utc_now_iso() -> str:
     return datetime.now(timezone.utc).replace(microsecond=0).isoformat().replace("+00:00", "Z")
@@ -21,17 +39,90 @@ def new_uuid() -> str:
     return str(uuid.uuid4())
 
 
+# orjson writes floats below 1e-4 differently from json.dumps ("0.00001" or
+# "1e-7" vs "1e-05"/"1e-07"), and writes NaN/Infinity as null, which the
+# stdlib path rejects. Any output that might contain either is re-encoded with
+# the stdlib so both encoders produce identical bytes or the same error.
+def _may_differ_from_stdlib(data: bytes) -> bool:
+    if data[:1] not in b'{["tf':
+        return True  # top-level number or null
+    for needle in (b"e-", b"0.0000", b"null"):
+        i = data.find(needle)
+        while i != -1:
+            # Only a number token counts: a run of digits/dots after a delimiter.
+            j = i
+            while j > 0 and data[j - 1] in b"0123456789.":
+                j -= 1
+            if (j < i or needle != b"e-") and data[j - 1 : j] in (b":", b",", b"[", b"-"):
+                return True
+            i = data.find(needle, i + 1)
+    return False
+
+
+# orjson encodes UUIDs and enums natively and hands datetimes here
+# (OPT_PASSTHROUGH_DATETIME), so both encoders write these types the same way.
+def _json_default(obj: Any) -> Any:
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, Enum):
+        return obj.value
+    # Typed messages (icnp.messages) nested inside plain containers.
+    to_dict = getattr(obj, "to_dict", None)
+    if to_dict is None:
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+    return to_dict()
+
+
+def canonical_json_bytes(obj: Any) -> bytes:
+    """Canonical JSON as UTF-8 bytes: stable key order, no whitespace.
+
+    Uses orjson when it is installed; the output is byte-identical either way.
+    NaN and infinities have no JSON form and raise ValueError on both paths.
+    UUIDs, enums and ``datetime``/``date``/``time`` values are written as
+    ``str(uuid)``, ``enum.value`` and ``isoformat()`` on both paths.
+    Typed messages return their cached canonical form.
+    """
+    if not isinstance(obj, (dict, list)) and hasattr(obj, "canonical_bytes"):
+        return obj.canonical_bytes()
+    if _orjson is not None:
+        try:
+            data = _orjson.dumps(
+                obj,
+                default=_json_default,
+                option=_orjson.OPT_SORT_KEYS | _orjson.OPT_PASSTHROUGH_DATACLASS | _orjson.OPT_PASSTHROUGH_DATETIME,
+            )
+        except TypeError:
+            pass  # e.g. non-str keys or >64-bit ints: let the stdlib handle them
+        else:
+            if not _may_differ_from_stdlib(data):
+                return data
+    return json.dumps(
+        obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False, allow_nan=False, default=_json_default
+    ).encode("utf-8")
+
+
 def canonical_json(obj: Any) -> str:
     """Canonical JSON for hashing/signing: stable key order, no whitespace."""
-    return json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    if _orjson is None and isinstance(obj, (dict, list)):
+        return json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False, allow_nan=False, default=_json_default)
+    return canonical_json_bytes(obj).decode("utf-8")
+
+
+def as_message_dict(message: Any) -> Dict[str, Any]:
+    """The dict form of a message given either as a dict or a typed message."""
+    return message if isinstance(message, dict) else message.to_dict()
 
 
 def sha256_hex(obj: Any) -> str:
-    return hashlib.sha256(canonical_json(obj).encode("utf-8")).hexdigest()
+    return hashlib.sha256(canonical_json_bytes(obj)).hexdigest()
 
 
-def hmac_sha256_b64(secret: bytes, message: str) -> str:
-    sig = hmac.new(secret, message.encode("utf-8"), hashlib.sha256).digest()
+def hmac_sha256_b64(secret: bytes, message: Union[str, bytes]) -> str:
+    if isinstance(message, str):
+        message = message.encode("utf-8")
+    sig = hmac.new(secret, message, hashlib.sha256).digest()
     return base64.b64encode(sig).decode("ascii")
 
 
@@ -66,21 +157,61 @@ class Responder:
 class SchemaRegistry:
     """Loads and validates messages against the provided JSON schemas."""
 
-    def __init__(self, schemas_path: str):
+    def __init__(self, schemas_path: str, *, compiled: bool = False, cache_dir: Optional[str] = None):
         from pathlib import Path
 
         self.schemas_path = Path(schemas_path)
         self._schemas: Dict[str, Dict[str, Any]] = {}
         self._validators: Dict[str, Draft7Validator] = {}
+        self._compiled: Dict[str, Callable[[Any], bool]] = {}
 
         for p in self.schemas_path.glob("*.schema.json"):
             schema = json.loads(p.read_text(encoding="utf-8"))
             self._schemas[p.name] = schema
             self._validators[p.name] = Draft7Validator(schema)
-
-    def validate(self, schema_filename: str, message: Dict[str, Any]) -> Tuple[bool, List[str]]:
+            if compiled:
+                from .schema_compiler import SchemaCompileError, load_compiled_validator
+
+                try:
+                    self._compiled[p.name] = load_compiled_validator(schema, cache_dir=cache_dir)
+                except SchemaCompileError:
+                    # Keywords outside the compiler's subset stay on Draft7Validator.
+                    pass
+
+    def is_valid(self, schema_filename: str, message: Dict[str, Any]) -> bool:
+        """Boolean fast path: stops at the first error and builds no report."""
+        message = as_message_dict(message)
+        fn = self._compiled.get(schema_filename)
+        if fn is not None:
+            return fn(message)
+        return next(self._validators[schema_filename].iter_errors(message), None) is None
+
+    def validate(
+        self,
+        schema_filename: str,
+        message: Dict[str, Any],
+        *,
+        max_errors: Optional[int] = None,
+    ) -> Tuple[bool, List[str]]:
+        """Validate a message, returning ``(ok, errors)``.
+
+        With ``max_errors`` set, the error walk stops after that many errors and
+        the errors are reported in discovery order rather than sorted by path.
+        Compiled registries accept valid messages without touching
+        ``Draft7Validator``; it is only used to explain failures.
+        Typed messages from :mod:`icnp.messages` are accepted too.
+        """
+        message = as_message_dict(message)
+        fn = self._compiled.get(schema_filename)
+        if fn is not None and fn(message):
+            return True, []
         v = self._validators[schema_filename]
-        errors = [e.message for e in sorted(v.iter_errors(message), key=lambda e: e.path)]
+        if max_errors is None:
+            errors = [e.message for e in sorted(v.iter_errors(message), key=lambda e: e.path)]
+        elif max_errors < 1:
+            raise ValueError("max_errors must be at least 1")
+        else:
+            errors = [e.message for e in islice(v.iter_errors(message), max_errors)]
         return (len(errors) == 0), errors
 
 
@@ -172,32 +303,50 @@ def make_execution_token_message(
 
 
 def sign_token_hmac(token_body: Dict[str, Any], *, secret: bytes) -> str:
-    return hmac_sha256_b64(secret, canonical_json(token_body))
+    return hmac_sha256_b64(secret, canonical_json_bytes(token_body))
 
 
 def verify_token_hmac(token_body: Dict[str, Any], signature: str, *, secret: bytes) -> bool:
-    expected = hmac_sha256_b64(secret, canonical_json(token_body))
+    expected = hmac_sha256_b64(secret, canonical_json_bytes(token_body))
     return hmac.compare_digest(signature, expected)
 
 
-def make_demo_token(token_body: Dict[str, Any], *, secret: bytes) -> str:
-    payload = base64.urlsafe_b64encode(canonical_json(token_body).encode("utf-8")).decode("ascii").rstrip("=")
-    signature = sign_token_hmac(token_body, secret=secret)
+def format_demo_token(body: bytes, signature: str) -> str:
+    """``demo.<base64url canonical JSON>.<signature>`` from already-encoded parts."""
+    payload = base64.urlsafe_b64encode(body).decode("ascii").rstrip("=")
     return f"demo.{payload}.{signature}"
 
 
+def make_signed_token(token_body: Dict[str, Any], *, secret: bytes) -> Tuple[str, str]:
+    """Return ``(token, signature)``, serialising the body exactly once."""
+    body = canonical_json_bytes(token_body)
+    signature = hmac_sha256_b64(secret, body)
+    return format_demo_token(body, signature), signature
+
+
+def make_demo_token(token_body: Dict[str, Any], *, secret: bytes) -> str:
+    return make_signed_token(token_body, secret=secret)[0]
+
+
+def binding_digest(obj: Any, digests: Optional[DigestCache] = None) -> str:
+    """``sha256:<hex>`` of ``obj``'s canonical JSON, memoised through ``digests`` if given."""
+    if digests is not None:
+        return digests.digest(obj)
+    return f"sha256:{sha256_hex(obj)}"
+
+
 def make_binding_hashes(
     intent: Dict[str, Any],
     contract: Dict[str, Any],
     capabilities: List[Dict[str, Any]],
+    *,
+    digests: Optional[DigestCache] = None,
 ) -> Dict[str, Any]:
-    def wrap(obj: Any) -> str:
-        return f"sha256:{sha256_hex(obj)}"
-
+    """Binding hashes for an execution token; pass ``digests`` to memoise them."""
     return {
-        "intent_hash": wrap(intent),
-        "contract_hash": wrap(contract),
-        "capability_hashes": [wrap(cap) for cap in capabilities],
+        "intent_hash": binding_digest(intent, digests),
+        "contract_hash": binding_digest(contract, digests),
+        "capability_hashes": [binding_digest(cap, digests) for cap in capabilities],
     }
 
 
@@ -0,0 +1,211 @@
+"""Model-affinity scheduling of chat requests to a local Ollama.
+
+A local Ollama keeps only a few models in memory; interleaving requests for
+different models makes it unload one set of weights and load another, which
+takes far longer than the inference itself. :class:`ModelScheduler` sits in
+front of :class:`~icnp.ollama.OllamaClient` and queues the chat requests that
+are ready to run (the pipeline has already resolved their dependencies). It
+keeps serving the model that is loaded while requests for it are waiting, caps
+how many requests run per model, and only moves to another model once the
+current one has nothing queued, or after ``max_consecutive`` requests so
+other models are not starved.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Mapping, Optional, Union
+
+from .ollama import ChatMetrics, OllamaClient
+
+
+@dataclass
+class _Ticket:
+    model: str
+    seq: int
+    enqueued_s: float
+    granted: bool = False
+
+
+@dataclass
+class SchedulerStats:
+    """Counters since the scheduler was created."""
+
+    dispatched: int = 0
+    cache_hits: int = 0
+    switches: int = 0
+    fifo_switches: int = 0
+    max_queue_depth: int = 0
+    wait_s: float = 0.0
+    per_model: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def switches_avoided(self) -> int:
+        """Model changes that serving requests in arrival order would have made, minus actual ones."""
+        return max(0, self.fifo_switches - self.switches)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "dispatched": self.dispatched,
+            "cache_hits": self.cache_hits,
+            "switches": self.switches,
+            "switches_avoided": self.switches_avoided,
+            "max_queue_depth": self.max_queue_depth,
+            "mean_wait_s": self.wait_s / self.dispatched if self.dispatched else None,
+            "per_model": dict(self.per_model),
+        }
+
+
+class ModelScheduler:
+    """Drop-in for :meth:`OllamaClient.chat` that batches requests by model.
+
+    ``per_model_concurrency`` is an int for every model or a mapping with a
+    ``"*"`` default. ``max_loaded_models`` is how many models may run at once
+    (Ollama's ``OLLAMA_MAX_LOADED_MODELS``). Safe to call from many threads;
+    each caller blocks until its request is dispatched and answered.
+    """
+
+    def __init__(
+        self,
+        client: OllamaClient,
+        *,
+        per_model_concurrency: Union[int, Mapping[str, int]] = 1,
+        max_loaded_models: int = 1,
+        max_consecutive: int = 16,
+    ):
+        if max_loaded_models < 1 or max_consecutive < 1:
+            raise ValueError("max_loaded_models and max_consecutive must be at least 1")
+        limits = per_model_concurrency if isinstance(per_model_concurrency, Mapping) else {"*": per_model_concurrency}
+        if any(n < 1 for n in limits.values()):
+            raise ValueError("per-model concurrency must be at least 1")
+        self.client = client
+        self.max_loaded_models = max_loaded_models
+        self.max_consecutive = max_consecutive
+        self.stats = SchedulerStats()
+        self._limits = dict(limits)
+        self._cond = threading.Condition()
+        self._queues: Dict[str, Deque[_Ticket]] = {}
+        self._running: Dict[str, int] = {}
+        self._streak: Dict[str, int] = {}
+        self._seq = 0
+        self._last_dispatched: Optional[str] = None
+        self._last_arrived: Optional[str] = None
+
+    @property
+    def cache(self) -> Any:
+        return self.client.cache
+
+    def limit(self, model: str) -> int:
+        return self._limits.get(model, self._limits.get("*", 1))
+
+    @property
+    def queue_depth(self) -> int:
+        with self._cond:
+            return sum(len(q) for q in self._queues.values())
+
+    def depth_by_model(self) -> Dict[str, int]:
+        with self._cond:
+            return {m: len(q) for m, q in self._queues.items() if q}
+
+    def running(self) -> Dict[str, int]:
+        with self._cond:
+            return {m: n for m, n in self._running.items() if n}
+
+    def chat(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        *,
+        on_chunk: Optional[Callable[[str], None]] = None,
+        metrics: Optional[ChatMetrics] = None,
+        bypass_cache: bool = False,
+    ) -> str:
+        """See :meth:`OllamaClient.chat`; cache hits skip the queue."""
+        if bypass_cache and self.client.cache is not None:
+            self.client.cache.note_bypass()
+        elif not bypass_cache:
+            cached = self.client.cached_reply(model, messages, on_chunk=on_chunk, metrics=metrics)
+            if cached is not None:
+                with self._cond:
+                    self.stats.cache_hits += 1
+                return cached
+        self._acquire(model)
+        try:
+            return self.client.fetch(model, messages, on_chunk=on_chunk, metrics=metrics)
+        finally:
+            self._release(model)
+
+    def _acquire(self, model: str) -> None:
+        with self._cond:
+            self._seq += 1
+            ticket = _Ticket(model, self._seq, time.perf_counter())
+            self._queues.setdefault(model, deque()).append(ticket)
+            if self._last_arrived is not None and self._last_arrived != model:
+                self.stats.fifo_switches += 1
+            self._last_arrived = model
+            depth = sum(len(q) for q in self._queues.values())
+            self.stats.max_queue_depth = max(self.stats.max_queue_depth, depth)
+            self._dispatch()
+            while not ticket.granted:
+                self._cond.wait()
+            self.stats.wait_s += time.perf_counter() - ticket.enqueued_s
+
+    def _release(self, model: str) -> None:
+        with self._cond:
+            self._running[model] -= 1
+            self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Grant queued tickets, preferring models that are already loaded."""
+        granted = False
+        while True:
+            model = self._pick()
+            if model is None:
+                break
+            ticket = self._queues[model].popleft()
+            ticket.granted = True
+            granted = True
+            self._running[model] = self._running.get(model, 0) + 1
+            self._streak[model] = self._streak.get(model, 0) + 1
+            stats = self.stats
+            stats.dispatched += 1
+            stats.per_model[model] = stats.per_model.get(model, 0) + 1
+            if self._last_dispatched is not None and self._last_dispatched != model:
+                stats.switches += 1
+            self._last_dispatched = model
+        if granted:
+            self._cond.notify_all()
+
+    def _pick(self) -> Optional[str]:
+        waiting = [m for m, q in self._queues.items() if q]
+        if not waiting:
+            return None
+        active = [m for m, n in self._running.items() if n]
+        others_waiting = len(waiting) > 1
+
+        # Keep feeding a loaded model, unless it has had its turn and others wait.
+        for m in active:
+            if self._queues.get(m) and self._running[m] < self.limit(m):
+                if not (others_waiting and self._streak.get(m, 0) >= self.max_consecutive):
+                    return m
+        if len(active) >= self.max_loaded_models:
+            return None
+
+        # Load another model: the one with the oldest waiting request, preferring
+        # the last one served if it is still warm.
+        candidates = [m for m in waiting if m not in active]
+        if not candidates:
+            return None
+        if self._last_dispatched in candidates and not (
+            others_waiting and self._streak.get(self._last_dispatched, 0) >= self.max_consecutive
+        ):
+            model = self._last_dispatched
+        else:
+            fresh = [m for m in candidates if m != self._last_dispatched] or candidates
+            model = min(fresh, key=lambda m: self._queues[m][0].seq)
+        for m in list(self._streak):
+            if m != model:
+                self._streak[m] = 0
+        return model
@@ -0,0 +1,415 @@
+"""Ahead-of-time compiler from ICNP JSON schemas to plain Python validators.
+
+Each schema is translated into the source of a small Python module exposing
+``is_valid(instance) -> bool``. The generated source is cached on disk keyed
+by the schema hash, so the translation only runs once per schema revision.
+A cached file is only executed if its header carries the schema hash and the
+SHA-256 of the source below it, and (on POSIX) if neither it nor its directory
+is writable by other users; anything else is recompiled.
+
+Compiled validators only answer "valid or not"; error reports are still built
+by ``Draft7Validator`` (see ``SchemaRegistry.validate``). Like a plain
+``Draft7Validator``, ``format`` is ignored unless ``check_formats`` is set; when
+it is, ``uuid`` and ``date-time`` are always enforced, whereas jsonschema skips
+``date-time`` if ``rfc3339-validator`` is not installed.
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+COMPILER_VERSION = "1"
+
+# Keywords that carry no validation semantics.
+_ANNOTATIONS = frozenset({"$schema", "$id", "$comment", "title", "description", "default", "examples", "definitions"})
+
+_TYPE_CHECKS = {
+    "object": "isinstance({v}, dict)",
+    "array": "isinstance({v}, list)",
+    "string": "isinstance({v}, str)",
+    "boolean": "isinstance({v}, bool)",
+    "null": "{v} is None",
+    "number": "_is_number({v})",
+    "integer": "_is_integer({v})",
+}
+
+_PRELUDE = '''\
+import re
+from datetime import datetime
+from uuid import UUID
+
+
+def _is_number(v):
+    return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+
+def _is_integer(v):
+    if isinstance(v, bool):
+        return False
+    return isinstance(v, int) or (isinstance(v, float) and v.is_integer())
+
+
+def _json_equal(a, b):
+    if isinstance(a, bool) or isinstance(b, bool):
+        return isinstance(a, bool) and isinstance(b, bool) and a == b
+    if _is_number(a) and _is_number(b):
+        return a == b
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, list):
+        return len(a) == len(b) and all(_json_equal(x, y) for x, y in zip(a, b))
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(_json_equal(a[k], b[k]) for k in a)
+    return a == b
+
+
+_DATE_TIME = re.compile(
+    r"^\\d{4}-\\d{2}-\\d{2}[Tt]\\d{2}:\\d{2}:\\d{2}(\\.\\d+)?([Zz]|[+-]\\d{2}:\\d{2})$"
+)
+
+
+def _is_date_time(v):
+    if not _DATE_TIME.match(v):
+        return False
+    try:
+        datetime.fromisoformat(v.upper().replace("Z", "+00:00"))
+    except ValueError:
+        return False
+    return True
+
+
+def _is_uuid(v):
+    try:
+        UUID(v)
+    except ValueError:
+        return False
+    return all(v[i] == "-" for i in (8, 13, 18, 23))
+'''
+
+_FORMAT_CHECKS = {
+    "date-time": "_is_date_time",
+    "uuid": "_is_uuid",
+}
+
+
+def _close_block(out: List[str], pad: str) -> None:
+    if out[-1].endswith(":"):
+        out.append(f"{pad}pass")
+
+
+class SchemaCompileError(ValueError):
+    """Raised when a schema uses a keyword the compiler does not support."""
+
+
+def schema_hash(schema: Dict[str, Any], *, check_formats: bool = False) -> str:
+    """Cache key for a schema: covers the schema, format mode and compiler version."""
+    key = {"compiler": COMPILER_VERSION, "check_formats": check_formats, "schema": schema}
+    return hashlib.sha256(json.dumps(key, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+class _Compiler:
+    def __init__(self, root: Dict[str, Any], *, check_formats: bool):
+        self.root = root
+        self.check_formats = check_formats
+        self.constants: List[str] = []
+        self.functions: List[List[str]] = []
+        self.ref_names: Dict[str, str] = {}
+        self.counter = 0
+
+    def fresh(self, prefix: str) -> str:
+        self.counter += 1
+        return f"{prefix}{self.counter}"
+
+    def constant(self, prefix: str, expr: str) -> str:
+        name = self.fresh(prefix)
+        self.constants.append(f"{name} = {expr}")
+        return name
+
+    def function(self, schema: Any, name: Optional[str] = None) -> str:
+        name = name or self.fresh("_s")
+        body: List[str] = []
+        self.functions.append(body)
+        body.append(f"def {name}(x):")
+        self.emit(schema, "x", body, 1, known_type=None)
+        body.append("    return True")
+        return name
+
+    def ref(self, ref: str) -> str:
+        if ref == "#":
+            return "is_valid"
+        if ref in self.ref_names:
+            return self.ref_names[ref]
+        if not ref.startswith("#/"):
+            raise SchemaCompileError(f"Unsupported $ref: {ref}")
+        target: Any = self.root
+        for part in ref[2:].split("/"):
+            part = part.replace("~1", "/").replace("~0", "~")
+            if not isinstance(target, dict) or part not in target:
+                raise SchemaCompileError(f"Unresolvable $ref: {ref}")
+            target = target[part]
+        name = "_ref_" + "".join(c if c.isalnum() else "_" for c in ref[2:])
+        self.ref_names[ref] = name
+        self.function(target, name)
+        return name
+
+    def emit(self, schema: Any, v: str, out: List[str], depth: int, *, known_type: Optional[str]) -> None:
+        pad = "    " * depth
+
+        def fail_if(cond: str) -> None:
+            out.append(f"{pad}if {cond}:")
+            out.append(f"{pad}    return False")
+
+        if schema is True or schema == {}:
+            return
+        if schema is False:
+            out.append(f"{pad}return False")
+            return
+        if not isinstance(schema, dict):
+            raise SchemaCompileError(f"Schema must be an object or boolean, got {schema!r}")
+
+        # Draft 7: $ref overrides any sibling keywords.
+        if "$ref" in schema:
+            fail_if(f"not {self.ref(schema['$ref'])}({v})")
+            return
+
+        unknown = set(schema) - _ANNOTATIONS - {
+            "type", "enum", "const", "required", "properties", "additionalProperties", "items",
+            "minItems", "maxItems", "uniqueItems", "minLength", "maxLength", "pattern", "format",
+            "minimum", "maximum", "exclusiveMinimum", "exclusiveMaximum", "multipleOf",
+            "oneOf", "anyOf", "allOf", "not",
+        }
+        if unknown:
+            raise SchemaCompileError(f"Unsupported keywords: {sorted(unknown)}")
+
+        if "type" in schema:
+            types = schema["type"] if isinstance(schema["type"], list) else [schema["type"]]
+            checks = [_TYPE_CHECKS[t].format(v=v) for t in types]
+            fail_if(" and ".join(f"not ({c})" for c in checks))
+            if len(types) == 1:
+                known_type = types[0]
+
+        if "enum" in schema:
+            values = schema["enum"]
+            if all(isinstance(e, str) for e in values):
+                name = self.constant("_enum", f"frozenset({sorted(values)!r})")
+                fail_if(f"not (isinstance({v}, str) and {v} in {name})")
+            else:
+                name = self.constant("_enum", repr(values))
+                fail_if(f"not any(_json_equal({v}, e) for e in {name})")
+        if "const" in schema:
+            name = self.constant("_const", repr(schema["const"]))
+            fail_if(f"not _json_equal({v}, {name})")
+
+        def guarded(json_type: str) -> tuple:
+            """Open an ``if <type check>:`` block unless the type is already known."""
+            if known_type == json_type or (json_type == "number" and known_type == "integer"):
+                return pad, depth
+            out.append(f"{pad}if {_TYPE_CHECKS[json_type].format(v=v)}:")
+            return pad + "    ", depth + 1
+
+        object_keys = ("required", "properties", "additionalProperties")
+        if any(k in schema for k in object_keys):
+            ipad, idepth = guarded("object")
+            for key in schema.get("required", []):
+                out.append(f"{ipad}if {key!r} not in {v}:")
+                out.append(f"{ipad}    return False")
+            properties = schema.get("properties", {})
+            for key, sub in properties.items():
+                if sub is True or sub == {}:
+                    continue
+                child = self.fresh("v")
+                out.append(f"{ipad}if {key!r} in {v}:")
+                out.append(f"{ipad}    {child} = {v}[{key!r}]")
+                self.emit(sub, child, out, idepth + 1, known_type=None)
+            additional = schema.get("additionalProperties", True)
+            if additional is not True and additional != {}:
+                names = self.constant("_props", f"frozenset({sorted(properties)!r})")
+                key_var, child = self.fresh("k"), self.fresh("v")
+                out.append(f"{ipad}for {key_var}, {child} in {v}.items():")
+                out.append(f"{ipad}    if {key_var} not in {names}:")
+                self.emit(additional, child, out, idepth + 2, known_type=None)
+            _close_block(out, ipad)
+
+        array_keys = ("items", "minItems", "maxItems", "uniqueItems")
+        if any(k in schema for k in array_keys):
+            ipad, idepth = guarded("array")
+            if "minItems" in schema:
+                out.append(f"{ipad}if len({v}) < {int(schema['minItems'])}:")
+                out.append(f"{ipad}    return False")
+            if "maxItems" in schema:
+                out.append(f"{ipad}if len({v}) > {int(schema['maxItems'])}:")
+                out.append(f"{ipad}    return False")
+            if schema.get("uniqueItems"):
+                out.append(
+                    f"{ipad}if any(_json_equal(a, b) for i, a in enumerate({v}) for b in {v}[i + 1:]):"
+                )
+                out.append(f"{ipad}    return False")
+            items = schema.get("items", True)
+            if isinstance(items, list):
+                raise SchemaCompileError("Tuple-form 'items' is not supported")
+            if items is not True and items != {}:
+                child = self.fresh("v")
+                out.append(f"{ipad}for {child} in {v}:")
+                self.emit(items, child, out, idepth + 1, known_type=None)
+            _close_block(out, ipad)
+
+        string_keys = ("minLength", "maxLength", "pattern", "format")
+        if any(k in schema for k in string_keys):
+            ipad, _ = guarded("string")
+            if "minLength" in schema:
+                out.append(f"{ipad}if len({v}) < {int(schema['minLength'])}:")
+                out.append(f"{ipad}    return False")
+            if "maxLength" in schema:
+                out.append(f"{ipad}if len({v}) > {int(schema['maxLength'])}:")
+                out.append(f"{ipad}    return False")
+            if "pattern" in schema:
+                name = self.constant("_pattern", f"re.compile({schema['pattern']!r})")
+                out.append(f"{ipad}if not {name}.search({v}):")
+                out.append(f"{ipad}    return False")
+            fmt = schema.get("format")
+            if self.check_formats and fmt in _FORMAT_CHECKS:
+                out.append(f"{ipad}if not {_FORMAT_CHECKS[fmt]}({v}):")
+                out.append(f"{ipad}    return False")
+            _close_block(out, ipad)
+
+        numeric = {
+            "minimum": "{v} < {b}",
+            "maximum": "{v} > {b}",
+            "exclusiveMinimum": "{v} <= {b}",
+            "exclusiveMaximum": "{v} >= {b}",
+        }
+        if any(k in schema for k in numeric) or "multipleOf" in schema:
+            ipad, _ = guarded("number")
+            for key, cond in numeric.items():
+                if key in schema:
+                    out.append(f"{ipad}if {cond.format(v=v, b=repr(schema[key]))}:")
+                    out.append(f"{ipad}    return False")
+            if "multipleOf" in schema:
+                out.append(f"{ipad}if not ({v} / {schema['multipleOf']!r}).is_integer():")
+                out.append(f"{ipad}    return False")
+            _close_block(out, ipad)
+
+        for sub in schema.get("allOf", []):
+            self.emit(sub, v, out, depth, known_type=known_type)
+        if "anyOf" in schema:
+            calls = [f"{self.function(sub)}({v})" for sub in schema["anyOf"]]
+            fail_if(f"not ({' or '.join(calls)})")
+        if "oneOf" in schema:
+            calls = [f"{self.function(sub)}({v})" for sub in schema["oneOf"]]
+            fail_if(f"({' + '.join(calls)}) != 1")
+        if "not" in schema:
+            fail_if(f"{self.function(schema['not'])}({v})")
+
+    def source(self) -> str:
+        self.function(self.root, "is_valid")
+        parts = [
+            f"# Generated by icnp.schema_compiler (version {COMPILER_VERSION}). Do not edit.",
+            _PRELUDE,
+        ]
+        parts.extend(self.constants)
+        parts.append("")
+        for body in self.functions:
+            parts.append("")
+            parts.append("\n".join(body))
+        return "\n".join(parts) + "\n"
+
+
+def compile_schema_source(schema: Dict[str, Any], *, check_formats: bool = False) -> str:
+    """Translate a schema into Python source defining ``is_valid(instance)``."""
+    return _Compiler(schema, check_formats=check_formats).source()
+
+
+_HEADER_PREFIX = "# icnp-schema "
+
+
+def _with_header(source: str, key: str) -> str:
+    digest = hashlib.sha256(source.encode("utf-8")).hexdigest()
+    return f"{_HEADER_PREFIX}{key} sha256:{digest}\n{source}"
+
+
+def _verified_source(text: str, key: str) -> Optional[str]:
+    """The generated source in a cache file, or None if its header does not match."""
+    header, sep, source = text.partition("\n")
+    if not sep or header != _with_header(source, key).partition("\n")[0]:
+        return None
+    return source
+
+
+def _trusted_path(path: Path) -> bool:
+    """False if ``path`` or its directory could have been written by another user."""
+    if os.name != "posix":
+        return True
+    uid = os.getuid()
+    for p in (path.parent, path):
+        st = p.stat()
+        if st.st_uid != uid or st.st_mode & 0o022:
+            return False
+    return True
+
+
+def _load_source(source: str, filename: str) -> Callable[[Any], bool]:
+    namespace: Dict[str, Any] = {"__name__": "icnp_compiled_schema"}
+    exec(compile(source, filename, "exec"), namespace)
+    return namespace["is_valid"]
+
+
+def default_cache_dir() -> Path:
+    env = os.environ.get("ICNP_SCHEMA_CACHE")
+    if env:
+        return Path(env)
+    return Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "icnp" / "validators"
+
+
+def load_compiled_validator(
+    schema: Dict[str, Any],
+    *,
+    cache_dir: Optional[str] = None,
+    check_formats: bool = False,
+) -> Callable[[Any], bool]:
+    """Return a compiled ``is_valid`` function, reusing the on-disk cache when possible."""
+    directory = Path(cache_dir) if cache_dir else default_cache_dir()
+    key = schema_hash(schema, check_formats=check_formats)
+    path = directory / f"{key}.py"
+    try:
+        if _trusted_path(path):
+            source = _verified_source(path.read_text(encoding="utf-8"), key)
+            if source is not None:
+                return _load_source(source, str(path))
+    except Exception:
+        # Missing, unreadable or corrupt (including errors raised while executing it).
+        pass
+
+    source = compile_schema_source(schema, check_formats=check_formats)
+    try:
+        directory.mkdir(parents=True, exist_ok=True, mode=0o700)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            fh.write(_with_header(source, key))
+        os.replace(tmp, path)
+    except OSError:
+        # A read-only cache only costs us the recompile next time.
+        pass
+    return _load_source(source, str(path))
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Precompile ICNP schemas into cached Python validators.")
+    ap.add_argument("schemas_path", help="Directory containing *.schema.json files.")
+    ap.add_argument("--cache-dir", default=None)
+    ap.add_argument("--check-formats", action="store_true")
+    args = ap.parse_args()
+
+    for p in sorted(Path(args.schemas_path).glob("*.schema.json")):
+        schema = json.loads(p.read_text(encoding="utf-8"))
+        load_compiled_validator(schema, cache_dir=args.cache_dir, check_formats=args.check_formats)
+        print(f"{p.name}: {schema_hash(schema, check_formats=args.check_formats)}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,252 @@
+"""Compact binary encoding of execution token bodies.
+
+The ``demo.<base64 canonical JSON>.<signature>`` token spells out UUIDs, ISO
+timestamps and ``sha256:`` digests as text. This codec packs the same body
+into a fixed layout instead: UUIDs and digests as raw bytes, times as epoch
+seconds and enforcement enums as single bytes. Decoding returns a dict equal
+to the original body, so its canonical JSON (and therefore the HMAC signature
+over it) is unchanged.
+
+Layout, little-endian::
+
+    version:u8  flags:u8  token_id:16s  contract_id:16s  not_before:i64  not_after:i64
+    [max_invocations:u32]  intent_hash:32s  contract_hash:32s
+    [count:u16 capability_hash:32s * count]  [capability_root:32s]
+    mode:u8  [violation_action:u8]
+
+Only bodies that round-trip exactly can be encoded: canonical lowercase UUIDs,
+``YYYY-MM-DDTHH:MM:SSZ`` timestamps, ``sha256:`` digests and no extra keys.
+Anything else raises :class:`TokenCodecError`; keep the JSON form for those.
+"""
+from __future__ import annotations
+
+import base64
+import re
+import struct
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+
+VERSION = 1
+
+MODES = ("strict", "permissive", "audit-only")
+VIOLATION_ACTIONS = ("abort", "abort_and_rollback", "warn", "log")
+
+_HAS_MAX_INVOCATIONS = 0x01
+_HAS_CAPABILITY_HASHES = 0x02
+_HAS_CAPABILITY_ROOT = 0x04
+_HAS_VIOLATION_ACTION = 0x08
+_HAS_ALERT = 0x10
+_ALERT = 0x20
+_KNOWN_FLAGS = (
+    _HAS_MAX_INVOCATIONS | _HAS_CAPABILITY_HASHES | _HAS_CAPABILITY_ROOT | _HAS_VIOLATION_ACTION | _HAS_ALERT | _ALERT
+)
+
+_HEADER = struct.Struct("<BB16s16sqq")
+_U8 = struct.Struct("<B")
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+_SIGNATURE_SIZE = 32
+
+_UUID_RE = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+_TIME_RE = re.compile(r"\d{4}-\d\d-\d\dT\d\d:\d\d:\d\dZ")
+_DIGEST_RE = re.compile(r"sha256:[0-9a-f]{64}")
+
+_BODY_KEYS = {"token_id", "contract_id", "validity", "binding", "enforcement"}
+_VALIDITY_KEYS = {"not_before", "not_after", "max_invocations"}
+_BINDING_KEYS = {"intent_hash", "contract_hash", "capability_hashes", "capability_root"}
+_ENFORCEMENT_KEYS = {"mode", "violation_action", "alert_on_violation"}
+
+
+class TokenCodecError(ValueError):
+    """Raised when a token body cannot be encoded losslessly, or bytes cannot be decoded."""
+
+
+def _check_keys(name: str, obj: Any, allowed: set) -> None:
+    if not isinstance(obj, dict):
+        raise TokenCodecError(f"{name} must be an object")
+    extra = set(obj) - allowed
+    if extra:
+        raise TokenCodecError(f"{name} has fields the binary form cannot carry: {sorted(extra)}")
+
+
+def _uuid_bytes(value: Any, name: str) -> bytes:
+    if not isinstance(value, str) or not _UUID_RE.fullmatch(value):
+        raise TokenCodecError(f"{name} is not a canonical lowercase UUID")
+    return bytes.fromhex(value.replace("-", ""))
+
+
+def _uuid_str(raw: bytes) -> str:
+    h = raw.hex()
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+
+# Tokens issued together share their validity window, so conversions repeat.
+@lru_cache(maxsize=1024)
+def _epoch_of(value: str) -> int:
+    return int(datetime.fromisoformat(value[:-1] + "+00:00").timestamp())
+
+
+@lru_cache(maxsize=1024)
+def _iso(epoch: int) -> str:
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _epoch(value: Any, name: str) -> int:
+    if not isinstance(value, str) or not _TIME_RE.fullmatch(value):
+        raise TokenCodecError(f"{name} is not a YYYY-MM-DDTHH:MM:SSZ timestamp")
+    try:
+        return _epoch_of(value)
+    except ValueError as e:
+        raise TokenCodecError(f"{name}: {e}") from None
+
+
+def _digest_bytes(value: Any, name: str) -> bytes:
+    if not isinstance(value, str) or not _DIGEST_RE.fullmatch(value):
+        raise TokenCodecError(f"{name} is not a sha256:<64 hex> digest")
+    return bytes.fromhex(value[7:])
+
+
+def _enum_index(value: Any, options: Tuple[str, ...], name: str) -> int:
+    try:
+        return options.index(value)
+    except ValueError:
+        raise TokenCodecError(f"{name} must be one of {list(options)}") from None
+
+
+def encode_token_body(body: Dict[str, Any]) -> bytes:
+    _check_keys("token body", body, _BODY_KEYS)
+    missing = _BODY_KEYS - set(body)
+    if missing:
+        raise TokenCodecError(f"token body is missing {sorted(missing)}")
+    validity, binding, enforcement = body["validity"], body["binding"], body["enforcement"]
+    _check_keys("validity", validity, _VALIDITY_KEYS)
+    _check_keys("binding", binding, _BINDING_KEYS)
+    _check_keys("enforcement", enforcement, _ENFORCEMENT_KEYS)
+
+    flags = 0
+    tail: List[bytes] = []
+    if "max_invocations" in validity:
+        n = validity["max_invocations"]
+        if type(n) is not int or not 0 <= n < 2**32:
+            raise TokenCodecError("validity.max_invocations must be an integer in [0, 2**32)")
+        flags |= _HAS_MAX_INVOCATIONS
+        tail.append(_U32.pack(n))
+    tail.append(_digest_bytes(binding.get("intent_hash"), "binding.intent_hash"))
+    tail.append(_digest_bytes(binding.get("contract_hash"), "binding.contract_hash"))
+    if "capability_hashes" in binding:
+        hashes = binding["capability_hashes"]
+        if not isinstance(hashes, list) or len(hashes) >= 2**16:
+            raise TokenCodecError("binding.capability_hashes must be a list of fewer than 65536 digests")
+        flags |= _HAS_CAPABILITY_HASHES
+        tail.append(_U16.pack(len(hashes)))
+        tail.extend(_digest_bytes(h, "binding.capability_hashes[]") for h in hashes)
+    if "capability_root" in binding:
+        flags |= _HAS_CAPABILITY_ROOT
+        tail.append(_digest_bytes(binding["capability_root"], "binding.capability_root"))
+    tail.append(_U8.pack(_enum_index(enforcement.get("mode"), MODES, "enforcement.mode")))
+    if "violation_action" in enforcement:
+        flags |= _HAS_VIOLATION_ACTION
+        action = _enum_index(enforcement["violation_action"], VIOLATION_ACTIONS, "enforcement.violation_action")
+        tail.append(_U8.pack(action))
+    if "alert_on_violation" in enforcement:
+        alert = enforcement["alert_on_violation"]
+        if not isinstance(alert, bool):
+            raise TokenCodecError("enforcement.alert_on_violation must be a boolean")
+        flags |= _HAS_ALERT | (_ALERT if alert else 0)
+
+    not_before = _epoch(validity.get("not_before"), "validity.not_before")
+    not_after = _epoch(validity.get("not_after"), "validity.not_after")
+    header = _HEADER.pack(
+        VERSION,
+        flags,
+        _uuid_bytes(body["token_id"], "token_id"),
+        _uuid_bytes(body["contract_id"], "contract_id"),
+        not_before,
+        not_after,
+    )
+    return header + b"".join(tail)
+
+
+def _digests(data: bytes, offset: int, count: int) -> List[str]:
+    raw = data[offset : offset + 32 * count]
+    if len(raw) != 32 * count:
+        raise TokenCodecError("Truncated binary token")
+    h = raw.hex()
+    return [f"sha256:{h[i : i + 64]}" for i in range(0, len(h), 64)]
+
+
+def _decode_body(data: bytes) -> Tuple[Dict[str, Any], int]:
+    try:
+        version, flags, token_id, contract_id, not_before, not_after = _HEADER.unpack_from(data, 0)
+        if version != VERSION:
+            raise TokenCodecError(f"Unsupported binary token version: {version}")
+        if flags & ~_KNOWN_FLAGS or (flags & _ALERT and not flags & _HAS_ALERT):
+            raise TokenCodecError(f"Unknown binary token flags: {flags:#04x}")
+        offset = _HEADER.size
+
+        validity: Dict[str, Any] = {"not_before": _iso(not_before), "not_after": _iso(not_after)}
+        if flags & _HAS_MAX_INVOCATIONS:
+            (validity["max_invocations"],) = _U32.unpack_from(data, offset)
+            offset += 4
+
+        intent_hash, contract_hash = _digests(data, offset, 2)
+        offset += 64
+        binding: Dict[str, Any] = {"intent_hash": intent_hash, "contract_hash": contract_hash}
+        if flags & _HAS_CAPABILITY_HASHES:
+            (count,) = _U16.unpack_from(data, offset)
+            binding["capability_hashes"] = _digests(data, offset + 2, count)
+            offset += 2 + 32 * count
+        if flags & _HAS_CAPABILITY_ROOT:
+            (binding["capability_root"],) = _digests(data, offset, 1)
+            offset += 32
+
+        (mode,) = _U8.unpack_from(data, offset)
+        offset += 1
+        enforcement: Dict[str, Any] = {"mode": MODES[mode]}
+        if flags & _HAS_VIOLATION_ACTION:
+            (action,) = _U8.unpack_from(data, offset)
+            offset += 1
+            enforcement["violation_action"] = VIOLATION_ACTIONS[action]
+        if flags & _HAS_ALERT:
+            enforcement["alert_on_violation"] = bool(flags & _ALERT)
+    except TokenCodecError:
+        raise
+    except (struct.error, IndexError, OverflowError, OSError, ValueError):
+        # Out-of-range epochs surface as ValueError from datetime.fromtimestamp.
+        raise TokenCodecError("Malformed binary token") from None
+
+    body = {
+        "token_id": _uuid_str(token_id),
+        "contract_id": _uuid_str(contract_id),
+        "validity": validity,
+        "binding": binding,
+        "enforcement": enforcement,
+    }
+    return body, offset
+
+
+def decode_token_body(data: bytes) -> Dict[str, Any]:
+    body, offset = _decode_body(data)
+    if offset != len(data):
+        raise TokenCodecError("Trailing bytes after binary token body")
+    return body
+
+
+def encode_binary_token(body: Dict[str, Any], signature: str) -> bytes:
+    """Encoded body followed by the raw 32-byte HMAC-SHA256 signature."""
+    try:
+        raw = base64.b64decode(signature, validate=True)
+    except ValueError:
+        raw = b""
+    if len(raw) != _SIGNATURE_SIZE:
+        raise TokenCodecError("signature must be a base64 HMAC-SHA256 digest")
+    return encode_token_body(body) + raw
+
+
+def decode_binary_token(data: bytes) -> Tuple[Dict[str, Any], str]:
+    """``(token body, base64 signature)``, ready for :class:`~icnp.tokens.TokenVerifier`."""
+    body, offset = _decode_body(data)
+    if len(data) - offset != _SIGNATURE_SIZE:
+        raise TokenCodecError("Binary token must end with a 32-byte signature")
+    return body, base64.b64encode(data[offset:]).decode("ascii")
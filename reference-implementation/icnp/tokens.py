@@ -0,0 +1,267 @@
+"""Execution token issuance and verification.
+
+:class:`Keyring` holds HMAC keys by key id with precomputed HMAC state,
+:class:`TokenIssuer` signs batches of token bodies with the active key, and
+:class:`TokenVerifier` checks them with a bounded cache of verified tokens.
+"""
+from __future__ import annotations
+
+import base64
+import copy
+import hashlib
+import hmac
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from .revocation import RevocationList
+from .runtime import canonical_json_bytes, format_demo_token, verify_token_hmac
+
+
+class TokenVerificationError(ValueError):
+    """Raised when a token fails signature or validity-window checks."""
+
+
+def iso_to_epoch(value: str) -> int:
+    return int(datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp())
+
+
+@dataclass(frozen=True)
+class VerifiedToken:
+    """A token whose signature has been checked, with its window as epoch seconds."""
+
+    token_id: str
+    contract_id: str
+    not_before: int
+    not_after: int
+    max_invocations: int
+    body: Dict[str, Any]
+    key_id: Optional[str] = None
+
+    def is_live(self, now: float) -> bool:
+        return self.not_before <= now < self.not_after
+
+
+class Keyring:
+    """HMAC-SHA256 signing keys by key id, one of which signs new tokens.
+
+    Each key's HMAC object is built once, so signing only copies the
+    precomputed inner/outer state instead of re-deriving it from the secret.
+    Keys can be added, activated and retired while issuers and verifiers
+    share the keyring; tokens signed with a retired key stop verifying.
+    """
+
+    def __init__(self, keys: Optional[Dict[str, bytes]] = None, *, active: Optional[str] = None):
+        self._lock = threading.Lock()
+        # Replaced wholesale on every change so readers never need the lock.
+        self._keys: Dict[str, Any] = {}
+        self._active: Optional[str] = None
+        for key_id, secret in (keys or {}).items():
+            self.add(key_id, secret)
+        if active is not None:
+            self.activate(active)
+
+    def __contains__(self, key_id: object) -> bool:
+        return key_id in self._keys
+
+    def key_ids(self) -> List[str]:
+        return list(self._keys)
+
+    @property
+    def active_key_id(self) -> Optional[str]:
+        return self._active
+
+    def add(self, key_id: str, secret: bytes, *, activate: bool = False) -> None:
+        """Add a key; the first key added becomes active."""
+        state = hmac.new(secret, digestmod=hashlib.sha256)
+        with self._lock:
+            if key_id in self._keys:
+                raise ValueError(f"Duplicate key id: {key_id}")
+            self._keys = {**self._keys, key_id: state}
+            if activate or self._active is None:
+                self._active = key_id
+
+    def activate(self, key_id: str) -> None:
+        with self._lock:
+            if key_id not in self._keys:
+                raise ValueError(f"Unknown key id: {key_id}")
+            self._active = key_id
+
+    def retire(self, key_id: str) -> None:
+        with self._lock:
+            if key_id == self._active:
+                raise ValueError("Cannot retire the active key; activate another key first")
+            self._keys = {k: v for k, v in self._keys.items() if k != key_id}
+
+    def signing_state(self, key_id: Optional[str] = None) -> Tuple[str, Any]:
+        """``(key id, precomputed HMAC object)``; copy it before updating."""
+        kid = self._active if key_id is None else key_id
+        state = self._keys.get(kid) if kid is not None else None
+        if state is None:
+            raise ValueError(f"Unknown key id: {kid}")
+        return kid, state
+
+    def sign(self, message: bytes, *, key_id: Optional[str] = None) -> str:
+        h = self.signing_state(key_id)[1].copy()
+        h.update(message)
+        return base64.b64encode(h.digest()).decode("ascii")
+
+    def verify(self, message: bytes, signature: str, *, key_id: Optional[str] = None) -> bool:
+        try:
+            expected = self.sign(message, key_id=key_id)
+        except ValueError:
+            return False
+        return hmac.compare_digest(signature, expected)
+
+
+@dataclass(frozen=True)
+class IssuedToken:
+    token_id: str
+    key_id: str
+    token: str
+    signature: str
+
+
+class TokenIssuer:
+    """Signs execution token bodies with the keyring's active key.
+
+    Each body is serialised once; the bytes feed both the signature and the
+    ``demo.`` token string. Cumulative throughput is kept in
+    :attr:`tokens_per_s`.
+    """
+
+    def __init__(self, keyring: Keyring):
+        self.keyring = keyring
+        self._lock = threading.Lock()
+        self.issued = 0
+        self.busy_s = 0.0
+
+    @property
+    def tokens_per_s(self) -> Optional[float]:
+        return self.issued / self.busy_s if self.busy_s > 0 else None
+
+    def issue(self, token_body: Dict[str, Any]) -> IssuedToken:
+        return self.issue_batch([token_body])[0]
+
+    def issue_batch(self, token_bodies: Iterable[Dict[str, Any]]) -> List[IssuedToken]:
+        """Sign every body with the key that is active when the batch starts."""
+        started = time.perf_counter()
+        key_id, state = self.keyring.signing_state()
+        issued: List[IssuedToken] = []
+        for token_body in token_bodies:
+            body = canonical_json_bytes(token_body)
+            h = state.copy()
+            h.update(body)
+            signature = base64.b64encode(h.digest()).decode("ascii")
+            issued.append(IssuedToken(token_body["token_id"], key_id, format_demo_token(body, signature), signature))
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.issued += len(issued)
+            self.busy_s += elapsed
+        return issued
+
+
+class TokenVerifier:
+    """Verifies demo HMAC tokens, caching verified tokens by signature.
+
+    A repeat invocation under the same token skips canonical JSON, the HMAC and
+    the ISO date parsing: the cached entry is reused as long as the presented
+    body compares equal to a private copy of the one that was verified (so a
+    valid signature cannot be replayed with an altered body). Entries are
+    evicted LRU beyond ``max_entries`` and dropped once ``not_after`` passes.
+
+    ``secret`` may be a :class:`Keyring`; ``verify`` then checks against the
+    given ``key_id`` (the active key if omitted), and cached tokens stop
+    verifying once their key is retired. With ``revocations``, every call
+    (cached or not) also rejects tokens whose id has been revoked.
+    """
+
+    def __init__(
+        self,
+        secret: Union[bytes, Keyring],
+        *,
+        max_entries: int = 1024,
+        clock: Callable[[], float] = time.time,
+        revocations: Optional[RevocationList] = None,
+    ):
+        self._secret = secret
+        self.revocations = revocations
+        self._keyring = secret if isinstance(secret, Keyring) else None
+        self._max_entries = max_entries
+        self._clock = clock
+        self._cache: "OrderedDict[str, VerifiedToken]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def verify(
+        self, token_body: Dict[str, Any], signature: str, *, key_id: Optional[str] = None
+    ) -> VerifiedToken:
+        if self.revocations is not None and self.revocations.is_revoked(token_body.get("token_id", "")):
+            with self._lock:
+                self._cache.pop(signature, None)
+            raise TokenVerificationError("Token revoked")
+        keyring = self._keyring
+        if keyring is not None and key_id is None:
+            key_id = keyring.active_key_id
+        now = self._clock()
+        with self._lock:
+            cached = self._cache.get(signature)
+            if cached is not None:
+                if now >= cached.not_after or (keyring is not None and cached.key_id not in keyring):
+                    del self._cache[signature]
+                    raise TokenVerificationError(
+                        "Token expired or not yet valid" if now >= cached.not_after else "Token signature invalid"
+                    )
+                if cached.body == token_body and cached.key_id == key_id:
+                    self._cache.move_to_end(signature)
+                    self.hits += 1
+                    if now < cached.not_before:
+                        raise TokenVerificationError("Token expired or not yet valid")
+                    return cached
+            self.misses += 1
+
+        if keyring is not None:
+            valid = keyring.verify(canonical_json_bytes(token_body), signature, key_id=key_id)
+        else:
+            valid = verify_token_hmac(token_body, signature, secret=self._secret)
+        if not valid:
+            raise TokenVerificationError("Token signature invalid")
+
+        validity = token_body["validity"]
+        verified = VerifiedToken(
+            token_id=token_body["token_id"],
+            contract_id=token_body["contract_id"],
+            not_before=iso_to_epoch(validity["not_before"]),
+            not_after=iso_to_epoch(validity["not_after"]),
+            max_invocations=validity.get("max_invocations", 1),
+            body=copy.deepcopy(token_body),
+            key_id=key_id,
+        )
+        if now >= verified.not_after:
+            raise TokenVerificationError("Token expired or not yet valid")
+
+        with self._lock:
+            self._cache[signature] = verified
+            self._cache.move_to_end(signature)
+            while len(self._cache) > self._max_entries:
+                self._cache.popitem(last=False)
+
+        if now < verified.not_before:
+            raise TokenVerificationError("Token expired or not yet valid")
+        return verified
+
+    def evict_expired(self) -> int:
+        """Drop every entry past ``not_after``; returns how many were removed."""
+        now = self._clock()
+        with self._lock:
+            expired = [sig for sig, tok in self._cache.items() if now >= tok.not_after]
+            for sig in expired:
+                del self._cache[sig]
+        return len(expired)
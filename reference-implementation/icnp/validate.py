@@ -0,0 +1,173 @@
+"""Bulk validation of ICNP message logs stored as JSONL.
+
+Usage::
+
+    python -m icnp.validate messages.jsonl [--workers N] [--chunk-size N]
+
+Each line is dispatched to the schema for its ``phase`` field. Lines are read
+lazily in chunks and at most ``2 * workers`` chunks are in flight, so memory
+stays bounded regardless of file size.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice
+from pathlib import Path
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from .runtime import PHASE_SCHEMAS, SchemaRegistry
+
+INVALID_JSON = "<invalid-json>"
+UNKNOWN_PHASE = "<unknown-phase>"
+
+DEFAULT_SCHEMAS_PATH = Path(__file__).resolve().parent.parent.parent / "schemas"
+
+# (line number, phase, first error or None)
+LineResult = Tuple[int, str, Optional[str]]
+
+_registry: Optional[SchemaRegistry] = None
+
+
+def _init_worker(schemas_path: str, compiled: bool) -> None:
+    global _registry
+    _registry = SchemaRegistry(schemas_path, compiled=compiled)
+
+
+def validate_chunk(chunk: List[Tuple[int, str]]) -> List[LineResult]:
+    """Validate ``(line number, raw line)`` pairs with the worker's registry."""
+    assert _registry is not None, "worker not initialised"
+    results: List[LineResult] = []
+    for lineno, line in chunk:
+        try:
+            message = json.loads(line)
+        except ValueError as e:
+            results.append((lineno, INVALID_JSON, str(e)))
+            continue
+        phase = message.get("phase") if isinstance(message, dict) else None
+        schema_filename = PHASE_SCHEMAS.get(phase) if isinstance(phase, str) else None
+        if schema_filename is None:
+            results.append((lineno, UNKNOWN_PHASE, f"unrecognised phase: {phase!r}"))
+            continue
+        if _registry.is_valid(schema_filename, message):
+            results.append((lineno, phase, None))
+        else:
+            _, errors = _registry.validate(schema_filename, message, max_errors=1)
+            results.append((lineno, phase, errors[0] if errors else "invalid"))
+    return results
+
+
+@dataclass
+class PhaseStats:
+    passed: int = 0
+    failed: int = 0
+    failures: List[Tuple[int, str]] = field(default_factory=list)
+
+
+@dataclass
+class Report:
+    max_failures: int = 20
+    phases: Dict[str, PhaseStats] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return all(s.failed == 0 for s in self.phases.values())
+
+    def add(self, results: Iterable[LineResult]) -> None:
+        for lineno, phase, error in results:
+            stats = self.phases.setdefault(phase, PhaseStats())
+            if error is None:
+                stats.passed += 1
+                continue
+            stats.failed += 1
+            if len(stats.failures) < self.max_failures:
+                stats.failures.append((lineno, error))
+
+    def render(self, out: TextIO) -> None:
+        for phase in sorted(self.phases):
+            stats = self.phases[phase]
+            print(f"{phase}: {stats.passed} passed, {stats.failed} failed", file=out)
+            for lineno, error in stats.failures:
+                print(f"  line {lineno}: {error}", file=out)
+            hidden = stats.failed - len(stats.failures)
+            if hidden > 0:
+                print(f"  ... {hidden} more", file=out)
+
+
+def iter_chunks(lines: Iterable[str], chunk_size: int) -> Iterator[List[Tuple[int, str]]]:
+    """Yield ``(line number, line)`` chunks, skipping blank lines."""
+    numbered = ((n, line) for n, line in enumerate(lines, start=1) if line.strip())
+    while True:
+        chunk = list(islice(numbered, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def validate_stream(
+    lines: Iterable[str],
+    *,
+    schemas_path: str,
+    workers: int,
+    chunk_size: int = 1000,
+    compiled: bool = False,
+    max_failures: int = 20,
+) -> Report:
+    report = Report(max_failures=max_failures)
+    chunks = iter_chunks(lines, chunk_size)
+
+    if workers <= 0:
+        _init_worker(schemas_path, compiled)
+        for chunk in chunks:
+            report.add(validate_chunk(chunk))
+        return report
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(schemas_path, compiled),
+    ) as pool:
+        in_flight: Deque[Future] = deque()
+        for chunk in chunks:
+            in_flight.append(pool.submit(validate_chunk, chunk))
+            if len(in_flight) >= 2 * workers:
+                report.add(in_flight.popleft().result())
+        while in_flight:
+            report.add(in_flight.popleft().result())
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m icnp.validate", description=__doc__.splitlines()[0])
+    ap.add_argument("path", help="JSONL file of ICNP messages ('-' for stdin).")
+    ap.add_argument("--schemas", default=str(DEFAULT_SCHEMAS_PATH))
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="0 validates in-process.")
+    ap.add_argument("--chunk-size", type=int, default=1000)
+    ap.add_argument("--compiled", action="store_true", help="Use compiled schema validators.")
+    ap.add_argument("--max-failures", type=int, default=20, help="Failing lines listed per phase.")
+    args = ap.parse_args(argv)
+
+    kwargs = dict(
+        schemas_path=args.schemas,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        compiled=args.compiled,
+        max_failures=args.max_failures,
+    )
+    if args.path == "-":
+        report = validate_stream(sys.stdin, **kwargs)
+    else:
+        with open(args.path, encoding="utf-8") as fh:
+            report = validate_stream(fh, **kwargs)
+
+    report.render(sys.stdout)
+    return 0 if report.ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,51 @@
+"""AsyncOllamaClient keeps its concurrency cap when callers give up early."""
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from typing import Any, Dict, List
+
+from icnp.ollama import AsyncOllamaClient
+
+
+class _SlowClient:
+    cache = None
+
+    def __init__(self) -> None:
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def fetch(self, model: str, messages: List[Dict[str, str]], **kwargs: Any) -> str:
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(0.2)
+        with self._lock:
+            self.active -= 1
+        return "ok"
+
+    def close(self) -> None:
+        pass
+
+
+def test_cancelled_calls_hold_their_slot_until_the_thread_finishes() -> None:
+    slow = _SlowClient()
+
+    async def main() -> str:
+        client = AsyncOllamaClient(max_concurrency=2, client=slow)  # type: ignore[arg-type]
+
+        async def give_up() -> None:
+            try:
+                await asyncio.wait_for(client.chat("m", []), 0.05)
+            except asyncio.TimeoutError:
+                pass
+
+        await asyncio.gather(*(give_up() for _ in range(10)))
+        reply = await client.chat("m", [])
+        client.close()
+        return reply
+
+    assert asyncio.run(main()) == "ok"
+    assert slow.peak == 2
@@ -0,0 +1,65 @@
+"""Canonical JSON is byte-identical with and without orjson."""
+from __future__ import annotations
+
+import enum
+import math
+import uuid
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any
+
+import pytest
+
+from icnp import runtime
+
+
+class _Color(enum.Enum):
+    RED = "red"
+    NESTED = {"b": 1, "a": [2]}
+
+
+class _Level(enum.IntEnum):
+    HIGH = 1
+
+
+_CASES = [
+    {"token_id": uuid.UUID("123e4567-e89b-12d3-a456-426614174000"), "t": datetime(2026, 1, 1, 12, 0, 0)},
+    {"aware": datetime(2026, 1, 1, 12, 0, 0, 4500, tzinfo=timezone.utc)},
+    {"offset": datetime(2026, 1, 1, tzinfo=timezone(timedelta(hours=-5, minutes=-30)))},
+    {"day": date(2026, 1, 1), "clock": time(1, 2, 3), "micro": time(1, 2, 3, 7)},
+    {"color": _Color.RED, "nested": _Color.NESTED, "level": _Level.HIGH},
+    [uuid.uuid4(), {"z": [date(1999, 12, 31)], "a": "ü"}],
+    {"small": 1e-7, "n": 2**70, "text": "x"},
+]
+
+
+def _stdlib(obj: Any, monkeypatch: pytest.MonkeyPatch) -> bytes:
+    with monkeypatch.context() as m:
+        m.setattr(runtime, "_orjson", None)
+        return runtime.canonical_json_bytes(obj)
+
+
+@pytest.mark.parametrize("obj", _CASES)
+def test_orjson_and_stdlib_agree(obj: Any, monkeypatch: pytest.MonkeyPatch) -> None:
+    expected = _stdlib(obj, monkeypatch)
+    assert runtime.canonical_json_bytes(obj) == expected
+    assert runtime.canonical_json(obj) == expected.decode("utf-8")
+
+
+def test_stdlib_encoding_of_extra_types(monkeypatch: pytest.MonkeyPatch) -> None:
+    obj = {"id": uuid.UUID(int=1), "at": date(2026, 1, 2), "c": _Color.RED}
+    assert _stdlib(obj, monkeypatch) == b'{"at":"2026-01-02","c":"red","id":"00000000-0000-0000-0000-000000000001"}'
+
+
+@pytest.mark.parametrize("value", [math.nan, math.inf])
+def test_non_finite_floats_rejected(value: float, monkeypatch: pytest.MonkeyPatch) -> None:
+    with pytest.raises(ValueError):
+        runtime.canonical_json_bytes({"x": value})
+    with pytest.raises(ValueError):
+        _stdlib({"x": value}, monkeypatch)
+
+
+def test_unknown_types_rejected(monkeypatch: pytest.MonkeyPatch) -> None:
+    with pytest.raises(TypeError):
+        runtime.canonical_json_bytes({"x": object()})
+    with pytest.raises(TypeError):
+        _stdlib({"x": object()}, monkeypatch)
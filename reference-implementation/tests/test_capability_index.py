@@ -0,0 +1,48 @@
+"""CapabilityIndex bookkeeping when responders reuse capability ids."""
+from __future__ import annotations
+
+from typing import Any, Dict
+
+from icnp.capability_index import CapabilityIndex
+
+
+def _cap(cap_id: str, action: str = "analyze", scope: Any = "code") -> Dict[str, Any]:
+    return {"id": cap_id, "action": action, "scope": scope}
+
+
+def test_same_id_from_two_owners_keeps_both() -> None:
+    index: CapabilityIndex[str] = CapabilityIndex()
+    index.add("agent-a", _cap("cap-1"))
+    index.add("agent-b", _cap("cap-1"))
+
+    assert len(index) == 2
+    assert ("agent-a", "cap-1") in index and ("agent-b", "cap-1") in index
+    assert index.match("analyze", "code") == ["agent-a", "agent-b"]
+    assert index.partition("analyze", "code") == (["agent-a", "agent-b"], [])
+    assert len(list(index.capabilities("analyze", "code"))) == 2
+
+
+def test_remove_only_touches_its_owner() -> None:
+    index: CapabilityIndex[str] = CapabilityIndex()
+    index.add("agent-a", _cap("cap-1"))
+    index.add("agent-b", _cap("cap-1"))
+
+    index.remove("agent-a", "cap-1")
+    assert index.match("analyze", "code") == ["agent-b"]
+    assert index.partition("analyze", "code") == (["agent-b"], ["agent-a"])
+
+    index.remove_owner("agent-b")
+    assert index.match("analyze", "code") == []
+    assert index.owners == ["agent-a"]
+    assert len(index) == 0
+
+
+def test_readding_an_id_replaces_that_owners_record() -> None:
+    index: CapabilityIndex[str] = CapabilityIndex()
+    index.add("agent-a", _cap("cap-1", scope=["code", "docs"]))
+    index.add("agent-b", _cap("cap-1", scope="code"))
+    index.add("agent-a", _cap("cap-1", scope="tests"))
+
+    assert index.match("analyze", "docs") == []
+    assert index.match("analyze", "code") == ["agent-b"]
+    assert index.match("analyze", "tests") == ["agent-a"]
@@ -0,0 +1,61 @@
+"""Cross-process invocation ledgers: lease sizing and large limits."""
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+
+from icnp.ledger import SharedMemoryInvocationLedger, SQLiteInvocationLedger, default_lease_size
+
+NOW = 1_000.0
+
+
+@pytest.fixture(params=["sqlite", "shm"])
+def ledger(request: pytest.FixtureRequest, tmp_path: Path) -> Iterator[object]:
+    if request.param == "sqlite":
+        led = SQLiteInvocationLedger(str(tmp_path / "ledger.sqlite"), clock=lambda: NOW)
+    else:
+        led = SharedMemoryInvocationLedger(256, clock=lambda: NOW)
+    yield led
+    led.close()
+
+
+def test_default_lease_size() -> None:
+    assert [default_lease_size(n) for n in (1, 15, 16, 80, 10**6)] == [1, 1, 2, 10, 64]
+
+
+def test_default_leases_batch_reservations(ledger: object, monkeypatch: pytest.MonkeyPatch) -> None:
+    calls = []
+    reserve = ledger._reserve  # type: ignore[attr-defined]
+
+    def counting(*args: object, **kwargs: object) -> int:
+        calls.append(args[1])
+        return reserve(*args, **kwargs)
+
+    monkeypatch.setattr(ledger, "_reserve", counting)
+    granted = sum(ledger.try_acquire("t", max_invocations=1000, not_after=2_000) for _ in range(1000))  # type: ignore[attr-defined]
+    assert granted == 1000
+    assert calls[0] == 64 and len(calls) == 16
+    assert not ledger.try_acquire("t", max_invocations=1000, not_after=2_000)  # type: ignore[attr-defined]
+
+
+def test_limit_holds_across_instances() -> None:
+    shm = SharedMemoryInvocationLedger(64, clock=lambda: NOW)
+    # A second attachment, as a worker process would hold.
+    other = SharedMemoryInvocationLedger(64, clock=lambda: NOW, _name=shm._shm.name, _lock=shm._lock)
+    try:
+        granted = 0
+        for _ in range(100):
+            granted += shm.try_acquire("t", max_invocations=40, not_after=2_000)
+            granted += other.try_acquire("t", max_invocations=40, not_after=2_000)
+        assert granted == 40
+    finally:
+        other.close()
+        shm.close()
+
+
+def test_limits_beyond_u32(ledger: object) -> None:
+    big = 2**32 + 5
+    assert ledger.try_acquire("t", max_invocations=big, not_after=2_000)  # type: ignore[attr-defined]
+    assert ledger.try_acquire("t", max_invocations=big, not_after=2_000)  # type: ignore[attr-defined]
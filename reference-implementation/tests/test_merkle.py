@@ -0,0 +1,23 @@
+"""Merkle capability proofs when responders reuse capability ids."""
+from __future__ import annotations
+
+from icnp.merkle import CapabilityMerkleTree, capability_proofs, verify_capability_in_proofs
+
+
+def test_shared_ids_get_a_proof_per_leaf() -> None:
+    caps = [
+        {"id": "cap-1", "action": "analyze", "scope": "code", "owner": "agent-a"},
+        {"id": "cap-1", "action": "analyze", "scope": "code", "owner": "agent-b"},
+        {"id": "cap-2", "action": "transform", "scope": "docs"},
+    ]
+    tree = CapabilityMerkleTree(caps)
+    proofs = capability_proofs(tree, caps)
+
+    assert [p["leaf_index"] for p in proofs] == [0, 1, 2]
+    assert proofs[0]["proof"] != proofs[1]["proof"]
+    for cap in caps:
+        assert verify_capability_in_proofs(cap, proofs, tree.root)
+
+    stranger = {"id": "cap-1", "action": "analyze", "scope": "code", "owner": "agent-c"}
+    assert not verify_capability_in_proofs(stranger, proofs, tree.root)
+    assert not verify_capability_in_proofs(caps[0], [proofs[1]], tree.root)
@@ -0,0 +1,41 @@
+"""Parsing received message dicts into typed messages."""
+from __future__ import annotations
+
+import pytest
+
+from icnp.messages import ContractNegotiation, IntentDeclaration, message_from_dict
+from icnp.runtime import make_contract_message, make_intent_message
+
+INTENT = {"action": "analyze", "target": {"type": "text", "identifier": "doc-1"}}
+SENDER = {"id": "orchestrator", "type": "agent"}
+
+
+def test_builder_dicts_round_trip() -> None:
+    intent = make_intent_message(intent=INTENT, sender=SENDER)
+    typed = message_from_dict(intent)
+    assert isinstance(typed, IntentDeclaration)
+    assert typed.to_dict() == intent
+
+    contract = make_contract_message(contract_id="c-1", agreed_actions=[], execution_constraints={})
+    assert isinstance(message_from_dict(contract), ContractNegotiation)
+    assert message_from_dict(contract).to_dict() == contract
+
+
+@pytest.mark.parametrize("field", ["message_id", "timestamp", "icnp_version"])
+def test_received_intent_must_carry_its_ids(field: str) -> None:
+    intent = make_intent_message(intent=INTENT, sender=SENDER)
+    del intent[field]
+    with pytest.raises(ValueError, match=field):
+        message_from_dict(intent)
+
+
+def test_missing_payload_is_a_value_error() -> None:
+    contract = make_contract_message(contract_id="c-1", agreed_actions=[], execution_constraints={})
+    del contract["contract_id"]
+    with pytest.raises(ValueError, match="contract_id"):
+        message_from_dict(contract)
+
+
+def test_constructors_still_generate_ids() -> None:
+    a, b = IntentDeclaration(intent=INTENT, sender=SENDER), IntentDeclaration(intent=INTENT, sender=SENDER)
+    assert a.message_id != b.message_id and a.timestamp
@@ -0,0 +1,157 @@
+"""Parity of compiled schema validators with ``Draft7Validator``.
+
+Every bundled example message, and thousands of random mutations of them, must
+get the same valid/invalid answer from both.
+"""
+from __future__ import annotations
+
+import copy
+import json
+import random
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+
+import pytest
+from jsonschema import Draft7Validator
+
+from icnp.schema_compiler import _with_header, load_compiled_validator, schema_hash
+
+ROOT = Path(__file__).resolve().parents[2]
+SCHEMAS = ROOT / "schemas"
+EXAMPLES = ROOT / "examples"
+
+# Example sections are named after their phase; map them to the phase schema.
+_SECTION_SCHEMAS = (
+    ("intent", "intent.schema.json"),
+    ("capability", "capability.schema.json"),
+    ("contract", "contract.schema.json"),
+    ("token", "execution-token.schema.json"),
+)
+
+_PALETTE: List[Any] = [
+    None,
+    True,
+    False,
+    0,
+    -1,
+    1.5,
+    2**40,
+    "",
+    "x",
+    "not-a-uuid",
+    "2024-01-01T00:00:00Z",
+    "3f1c2b9e-4d5a-4e6f-8a7b-9c0d1e2f3a4b",
+    "critical",
+    "strict",
+    [],
+    {},
+    [1, "a"],
+    {"id": "x"},
+]
+
+MUTATIONS_PER_MESSAGE = 400
+
+
+def _example_messages() -> List[Tuple[str, str, Dict[str, Any]]]:
+    out = []
+    for path in sorted(EXAMPLES.glob("*.json")):
+        data = json.loads(path.read_text(encoding="utf-8"))
+        for section, msg in data.items():
+            if not isinstance(msg, dict):
+                continue
+            for needle, schema_name in _SECTION_SCHEMAS:
+                if needle in section:
+                    out.append((f"{path.stem}:{section}", schema_name, msg))
+                    break
+    return out
+
+
+def _load_schema(name: str) -> Dict[str, Any]:
+    return json.loads((SCHEMAS / name).read_text(encoding="utf-8"))
+
+
+def _containers(obj: Any, path: Tuple = ()) -> Iterator[Tuple[Tuple, Any]]:
+    if isinstance(obj, (dict, list)):
+        yield path, obj
+        items = obj.items() if isinstance(obj, dict) else enumerate(obj)
+        for key, value in items:
+            yield from _containers(value, path + (key,))
+
+
+def _mutate(msg: Dict[str, Any], rng: random.Random) -> Dict[str, Any]:
+    msg = copy.deepcopy(msg)
+    for _ in range(rng.randint(1, 3)):
+        _, node = rng.choice(list(_containers(msg)))
+        op = rng.random()
+        if isinstance(node, dict):
+            if node and op < 0.3:
+                del node[rng.choice(list(node))]
+            elif node and op < 0.8:
+                node[rng.choice(list(node))] = copy.deepcopy(rng.choice(_PALETTE))
+            else:
+                node[rng.choice(["extra", "id", "priority", "mode"])] = copy.deepcopy(rng.choice(_PALETTE))
+        else:
+            if node and op < 0.3:
+                node.pop(rng.randrange(len(node)))
+            elif node and op < 0.6:
+                node[rng.randrange(len(node))] = copy.deepcopy(rng.choice(_PALETTE))
+            elif node and op < 0.8:
+                node.append(copy.deepcopy(rng.choice(node)))
+            else:
+                node.append(copy.deepcopy(rng.choice(_PALETTE)))
+    return msg
+
+
+MESSAGES = _example_messages()
+
+
+def test_examples_found() -> None:
+    assert {schema for _, schema, _ in MESSAGES} == {name for _, name in _SECTION_SCHEMAS}
+
+
+@pytest.mark.parametrize("label,schema_name,msg", MESSAGES, ids=[m[0] for m in MESSAGES])
+def test_parity_with_draft7(tmp_path: Path, label: str, schema_name: str, msg: Dict[str, Any]) -> None:
+    schema = _load_schema(schema_name)
+    compiled = load_compiled_validator(schema, cache_dir=str(tmp_path))
+    reference = Draft7Validator(schema)
+
+    assert compiled(msg) == reference.is_valid(msg), label
+    rng = random.Random(f"{label}:{schema_name}")
+    for i in range(MUTATIONS_PER_MESSAGE):
+        mutated = _mutate(msg, rng)
+        assert compiled(mutated) == reference.is_valid(mutated), f"{label} mutation {i}: {mutated!r}"
+
+
+def test_cached_source_is_reused(tmp_path: Path) -> None:
+    schema = _load_schema("intent.schema.json")
+    load_compiled_validator(schema, cache_dir=str(tmp_path))
+    path = tmp_path / f"{schema_hash(schema)}.py"
+    assert path.read_text(encoding="utf-8").startswith("# icnp-schema ")
+    mtime = path.stat().st_mtime_ns
+    load_compiled_validator(schema, cache_dir=str(tmp_path))
+    assert path.stat().st_mtime_ns == mtime
+
+
+def test_tampered_cache_is_not_executed(tmp_path: Path) -> None:
+    schema = _load_schema("intent.schema.json")
+    load_compiled_validator(schema, cache_dir=str(tmp_path))
+    path = tmp_path / f"{schema_hash(schema)}.py"
+    marker = tmp_path / "executed"
+    header, source = path.read_text(encoding="utf-8").split("\n", 1)
+    path.write_text(f"{header}\nopen({str(marker)!r}, 'w').close()\n{source}", encoding="utf-8")
+
+    is_valid = load_compiled_validator(schema, cache_dir=str(tmp_path))
+    assert not marker.exists()
+    assert is_valid({}) is False
+
+
+def test_corrupt_cache_is_recompiled(tmp_path: Path) -> None:
+    schema = _load_schema("intent.schema.json")
+    key = schema_hash(schema)
+    tmp_path.chmod(0o700)
+    # A correctly signed file that fails while executing.
+    (tmp_path / f"{key}.py").write_text(_with_header("undefined_name\n", key), encoding="utf-8")
+    (tmp_path / f"{key}.py").chmod(0o600)
+
+    is_valid = load_compiled_validator(schema, cache_dir=str(tmp_path))
+    assert is_valid({}) is False
@@ -0,0 +1,75 @@
+"""Binary token codec: round trips and malformed input."""
+from __future__ import annotations
+
+import base64
+import random
+import struct
+from typing import Any, Dict
+
+import pytest
+
+from icnp.token_codec import (
+    TokenCodecError,
+    decode_binary_token,
+    decode_token_body,
+    encode_binary_token,
+    encode_token_body,
+)
+
+_D = "sha256:" + "ab" * 32
+
+
+def _body(**binding: Any) -> Dict[str, Any]:
+    return {
+        "token_id": "123e4567-e89b-12d3-a456-426614174000",
+        "contract_id": "00000000-0000-4000-8000-00000000000f",
+        "validity": {"not_before": "2026-01-01T00:00:00Z", "not_after": "2026-01-01T01:00:00Z", "max_invocations": 7},
+        "binding": {"intent_hash": _D, "contract_hash": "sha256:" + "cd" * 32, **binding},
+        "enforcement": {"mode": "strict", "violation_action": "abort", "alert_on_violation": True},
+    }
+
+
+@pytest.mark.parametrize(
+    "binding",
+    [{"capability_hashes": [_D, "sha256:" + "01" * 32]}, {"capability_root": _D}, {}],
+)
+def test_round_trip(binding: Dict[str, Any]) -> None:
+    body = _body(**binding)
+    assert decode_token_body(encode_token_body(body)) == body
+    signature = base64.b64encode(bytes(range(32))).decode("ascii")
+    assert decode_binary_token(encode_binary_token(body, signature)) == (body, signature)
+
+
+def test_out_of_range_times_are_codec_errors() -> None:
+    data = bytearray(encode_token_body(_body()))
+    struct.pack_into("<q", data, 34, 10**12)  # year 33658
+    with pytest.raises(TokenCodecError):
+        decode_token_body(bytes(data))
+
+
+def test_unknown_flags_are_rejected() -> None:
+    data = bytearray(encode_token_body(_body()))
+    data[1] |= 0x80
+    with pytest.raises(TokenCodecError, match="flags"):
+        decode_token_body(bytes(data))
+
+
+def test_unsupported_version_is_not_rewrapped() -> None:
+    data = bytearray(encode_token_body(_body()))
+    data[0] = 99
+    with pytest.raises(TokenCodecError, match="version"):
+        decode_token_body(bytes(data))
+
+
+def test_mutations_only_raise_codec_errors() -> None:
+    rng = random.Random(18)
+    encoded = encode_token_body(_body(capability_hashes=[_D]))
+    for _ in range(5000):
+        data = bytearray(encoded)
+        for _ in range(rng.randint(1, 4)):
+            data[rng.randrange(len(data))] = rng.randrange(256)
+        data = data[: rng.randint(0, len(data))] if rng.random() < 0.2 else data
+        try:
+            decode_token_body(bytes(data))
+        except TokenCodecError:
+            pass